@@ -0,0 +1,168 @@
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+User = get_user_model()
+
+# per-user version stamp in the default cache, replaced whenever the user or profile changes
+VERSION_KEY = 'jwt-user-version:{}'
+
+class UserCache:
+    '''
+    Thread-safe, size-bounded LRU of resolved users (with their profile) keyed by token id.
+    Entries expire after `ttl` seconds. Within a process they are dropped as soon as the user or
+    profile is saved (see accounts/signals.py); other processes see the change through a per-user
+    version stamp in the default cache, stored with each entry and compared on every hit (one cache
+    read per request instead of a query). With a shared CACHE_BACKEND a change, e.g. a deactivated
+    user, is therefore seen by every process once it commits; with the default per-process cache
+    the TTL is the bound on how long other processes keep serving the old user.
+    '''
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict() # key -> (expires, version, user)
+        self._lock = threading.Lock()
+
+    def version(self, user_id):
+        '''
+        Returns the current version stamp of a user, to pass to get and set. Read it before loading
+        the user, so a change committed during the load is not cached as current.
+        '''
+        return cache.get(VERSION_KEY.format(user_id))
+
+    async def aversion(self, user_id):
+        return await cache.aget(VERSION_KEY.format(user_id))
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, entry_version, user = entry
+            if expires < time.monotonic() or entry_version != version:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return _copy_user(user)
+
+    def set(self, key, user, version):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, version, _copy_user(user))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        '''
+        Drops the user's entries in this process now, and replaces their version stamp for the
+        other processes once the change commits (before that, they would reload the old row).
+        The stamp outlives every entry stored before it, so its expiry cannot revive them.
+        '''
+        with self._lock:
+            for key in [key for key, (_, _, user) in self._entries.items() if user.pk == user_id]:
+                del self._entries[key]
+        transaction.on_commit(lambda: cache.set(VERSION_KEY.format(user_id), uuid.uuid4().hex, self.ttl + 60))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def _copy_user(user):
+    '''
+    Copies a user and its cached profile, so requests never share (and mutate) the cached instances.
+    '''
+    user = copy.copy(user)
+    profile = user._state.fields_cache.get('profile')
+    if profile is not None:
+        profile = copy.copy(profile)
+        profile._state.fields_cache['user'] = user
+        user._state.fields_cache['profile'] = profile
+    return user
+
+user_cache = UserCache(
+    max_size=settings.JWT_USER_CACHE['MAX_SIZE'],
+    ttl=settings.JWT_USER_CACHE['TTL'],
+)
+
+def _token_user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken("Token contained no recognizable user identification")
+
+def _token_cache_key(validated_token):
+    return validated_token.get(api_settings.JTI_CLAIM) or str(validated_token)
+
+def _check_user(user):
+    if not user.is_active:
+        raise AuthenticationFailed("User is inactive", code="user_inactive")
+    return user
+
+class CachedJWTAuthentication(JWTAuthentication):
+    '''
+    JWTAuthentication that caches the resolved user, with their profile, per token in `user_cache`.
+    A cache hit saves the user lookup and the later profile lookup (e.g. in UserProfileView or
+    calculate_calories); a miss loads both in a single query.
+    '''
+    def get_user(self, validated_token):
+        key = _token_cache_key(validated_token)
+        user_id = _token_user_id(validated_token)
+        version = user_cache.version(user_id)
+        user = user_cache.get(key, version)
+        if user is None:
+            try:
+                user = User.objects.select_related('profile').get(**{api_settings.USER_ID_FIELD: user_id})
+            except User.DoesNotExist:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            user_cache.set(key, user, version)
+        return _check_user(user)
+
+async def aauthenticate(request):
+    '''
+    Async counterpart of CachedJWTAuthentication.authenticate for async (ASGI) views.
+    Token parsing and validation are CPU-only; on a cache miss the user (with their profile)
+    is loaded with the async ORM.
+
+    Returns:
+    - user: the authenticated user, or None when the request carries no JWT.
+    Raises:
+    - InvalidToken / AuthenticationFailed: if the token is invalid or its user is unknown or inactive.
+    '''
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is None:
+        return None
+    raw_token = authentication.get_raw_token(header)
+    if raw_token is None:
+        return None
+    return await aauthenticate_token(raw_token)
+
+async def aauthenticate_token(raw_token):
+    '''
+    Resolves a raw JWT (bytes or str) to its user, through `user_cache` like aauthenticate.
+    Used where the token does not come from an Authorization header (e.g. WebSocket connections).
+    Raises:
+    - InvalidToken / AuthenticationFailed: if the token is invalid or its user is unknown or inactive.
+    '''
+    validated_token = JWTAuthentication().get_validated_token(raw_token)
+
+    key = _token_cache_key(validated_token)
+    user_id = _token_user_id(validated_token)
+    version = await user_cache.aversion(user_id)
+    user = user_cache.get(key, version)
+    if user is None:
+        try:
+            user = await User.objects.select_related('profile').aget(**{api_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        user_cache.set(key, user, version)
+    return _check_user(user)
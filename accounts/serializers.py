@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import Profile
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 
 User = get_user_model()
 
@@ -18,32 +19,37 @@ class CustomUserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'password', 'password2']
         extra_kwargs = {
             'email': {'required': False},  # Make email optional
+            'username': {'validators': []},  # Uniqueness is enforced by the database, see create()
         }
 
     def validate(self, data):
         '''
-        Custom validation to ensure that:
-        - Username is unique.
-        - Password and password confirmation match.
+        Custom validation to ensure that password and password confirmation match.
+        Username uniqueness is checked by the unique constraint on insert (see create).
         
         Raises:
-            serializers.ValidationError: If the username already exists or if passwords do not match
+            serializers.ValidationError: If passwords do not match
         '''
-        if User.objects.filter(username=data['username']).exists():
-            raise serializers.ValidationError({'username': "A user with this username already exists!"})
-        
         if data['password'] != data['password2']:
             raise serializers.ValidationError({'password': "Password fields do not match."})
         return data
     
     def create(self, validated_data):
-        user = User.objects.create_user(
-            username = validated_data['username'],
-            email = validated_data['email'],
-        )
-        user.set_password(validated_data['password'])
-        user.save()
-        return user
+        '''
+        Creates the user with its hashed password in a single insert.
+
+        Raises:
+            serializers.ValidationError: If the username already exists
+        '''
+        try:
+            with transaction.atomic():
+                return User.objects.create_user(
+                    username = validated_data['username'],
+                    email = validated_data.get('email'),
+                    password = validated_data['password'],
+                )
+        except IntegrityError:
+            raise serializers.ValidationError({'username': "A user with this username already exists!"})
     
 class ProfileSerializer(serializers.ModelSerializer):
     '''
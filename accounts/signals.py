@@ -1,17 +1,24 @@
 from .models import Profile, CustomUser
-from django.db.models.signals import post_save
+from .authentication import user_cache
+from fitness_api.db_routers import pin_to_primary
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.core.exceptions import ObjectDoesNotExist
 
-#signal to create user profile when a user is registered
+#signal to create user profile when a user is registered. Later user saves (e.g. last_login
+#updates on login) leave the profile alone: it is only written when its own fields change.
 @receiver(post_save, sender=CustomUser)
-def CreateUserProfile(sender, instance, created, **kwargs):
-    try:
-        instance.profile.save()
-    except ObjectDoesNotExist:
+def CreateUserProfile(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
         Profile.objects.create(user=instance)
 
-#signal to save user profile when user is updated
+#signal to drop cached JWT users whenever the user or their profile changes
 @receiver(post_save, sender=CustomUser)
-def SaveUserProfile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+@receiver(post_delete, sender=CustomUser)
+def InvalidateCachedUser(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def InvalidateCachedProfile(sender, instance, **kwargs):
+    user_cache.invalidate(instance.user_id)
+    pin_to_primary(instance.user_id) #read-your-writes on the profile view
@@ -1,3 +1,139 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from activity.models import Workout
+from .authentication import VERSION_KEY, user_cache
+from .models import Profile
 
-# Create your tests here.
+User = get_user_model()
+
+# Query budgets of the account endpoints (see activity/tests.py for how they are counted).
+@override_settings(SECURE_SSL_REDIRECT=False, DATABASE_REPLICAS=[], METRICS_CACHE_ENABLED=False)
+class AccountsTestCase(APITestCase):
+    '''
+    Served over plain HTTP, without replicas or a shared metrics cache, so counts are deterministic.
+    '''
+
+class UserRegisterQueryTests(AccountsTestCase):
+    def test_register(self):
+        # SAVEPOINT, INSERT user, INSERT profile, RELEASE
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse('register'), {
+                'username': 'runner', 'email': 'runner@example.com',
+                'password': 'secret-password', 'password2': 'secret-password'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Profile.objects.filter(user__username='runner').exists())
+
+class UserProfileQueryTests(AccountsTestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='runner', password='secret-password')
+        self.user = User.objects.select_related('profile').get(pk=user.pk)
+        start_time = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        Workout.objects.create(user_id=self.user, activity_type='Running', start_time=start_time,
+                               end_time=start_time + timedelta(hours=1), date=start_time)
+        self.client.force_authenticate(user=self.user)
+
+    def test_get(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('profile-update'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_reads_the_stored_profile(self):
+        Profile.objects.filter(user=self.user).update(weight=80.0) #not seen by the cached user
+        response = self.client.get(reverse('profile-update'))
+        self.assertEqual(response.data['weight'], 80.0)
+
+    def test_patch(self):
+        # SAVEPOINT, SELECT ... FOR UPDATE, UPDATE, RELEASE
+        with self.assertNumQueries(4):
+            response = self.client.patch(reverse('profile-update'), {'age': 30}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_patch_weight_recomputes_calories(self):
+        # SAVEPOINT, SELECT ... FOR UPDATE, UPDATE, then recompute_calories: workouts cursor,
+        # one bulk_update per batch (SAVEPOINT, UPDATE, RELEASE), rollup rebuild (SAVEPOINT, DELETE,
+        # aggregate, INSERT, RELEASE), and RELEASE
+        with self.assertNumQueries(3 + 1 + 3 + 5 + 1):
+            response = self.client.patch(reverse('profile-update'), {'weight': 70}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(Workout.objects.get(user_id=self.user).calories_burned, 9.8 * 3.5 * 70 * 60 / 200)
+
+    def test_patch_same_weight_does_not_recompute_calories(self):
+        Profile.objects.filter(user=self.user).update(weight=70.0)
+        # SAVEPOINT, SELECT ... FOR UPDATE, UPDATE, RELEASE
+        with self.assertNumQueries(4):
+            response = self.client.put(reverse('profile-update'), {'age': 31, 'weight': 70}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(Workout.objects.get(user_id=self.user).calories_burned)
+
+    def test_put_requires_both_fields(self):
+        response = self.client.put(reverse('profile-update'), {'age': 30}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+@override_settings(PASSWORD_HASHERS=settings.PASSWORD_HASHER_PROFILES['fast'])
+class LoginQueryTests(AccountsTestCase):
+    '''
+    Registration and login stay at a fixed number of queries; hashing is made cheap so the
+    tests do not spend their time in PBKDF2.
+    '''
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(username='runner', password='secret-password')
+
+    def test_register_duplicate_username(self):
+        # SAVEPOINT, failing INSERT, ROLLBACK TO SAVEPOINT: uniqueness is not checked with a SELECT first
+        with self.assertNumQueries(3):
+            response = self.client.post(reverse('register'), {
+                'username': 'runner', 'password': 'other-password', 'password2': 'other-password'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('username', response.data)
+
+    def test_user_save_does_not_write_the_profile(self):
+        self.user.last_login = timezone.now()
+        with self.assertNumQueries(1):
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(Profile.objects.filter(user=self.user).count(), 1)
+
+    def test_login(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('token_obtain_pair'), {'username': 'runner', 'password': 'secret-password'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+
+    def test_login_with_a_wrong_password(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('token_obtain_pair'), {'username': 'runner', 'password': 'wrong-password'}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_user_is_cached(self):
+        access = self.client.post(reverse('token_obtain_pair'), {'username': 'runner', 'password': 'secret-password'}, format='json').data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        # user with profile, then the profile read
+        with self.assertNumQueries(2):
+            self.client.get(reverse('profile-update'))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('profile-update'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_token_user_is_reloaded_after_a_change_elsewhere(self):
+        access = self.client.post(reverse('token_obtain_pair'), {'username': 'runner', 'password': 'secret-password'}, format='json').data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.client.get(reverse('profile-update'))
+        # another process deactivates the user: its signal replaces the shared version stamp
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.set(VERSION_KEY.format(self.user.pk), 'changed-elsewhere')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('profile-update'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_saving_the_user_replaces_the_version_on_commit(self):
+        version = user_cache.version(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['last_login'])
+            self.assertEqual(user_cache.version(self.user.pk), version)
+        self.assertNotEqual(user_cache.version(self.user.pk), version)
@@ -1,9 +1,14 @@
 from rest_framework import generics, permissions, status
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from django.db import transaction
+from .authentication import CachedJWTAuthentication
+from fitness_api.db_routers import ReplicaReadMixin
 from .serializers import CustomUserSerializer, ProfileSerializer
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
 from .models import Profile
+from activity.calories import recompute_calories
 
 
 User = get_user_model()
@@ -34,7 +39,7 @@ class UserRegisterView(generics.CreateAPIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class UserProfileView(generics.RetrieveUpdateAPIView):
+class UserProfileView(ReplicaReadMixin, generics.RetrieveUpdateAPIView):
     '''
     - Method: GET to retrieve the profile, PUT/PATCH to update the profile
     - Permissions: Only authenticated users can access this endpoint
@@ -43,15 +48,37 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
         - 200: Returns the user profile details upon a successful GET request
         - 201: Returns the updated profile details upon a successful PUT/PATCH request
         - 400: Returns validation errors in case of an invalid request
+    - Changing the weight recomputes calories burned for all of the user's finished workouts, then
+      rebuilds their rollups. This runs synchronously in the update's transaction while the profile
+      row is locked, so its cost grows with the user's history (one bulk UPDATE per 2000 workouts
+      plus the rollup rebuild); the weight is the only profile field calories depend on, so other
+      updates never trigger it.
+    - The profile is always read from the database, not from the copy cached with the JWT user
+      (which can be stale in other processes): GETs follow the replica routing, so a user reads
+      their own update, and updates lock the stored row so concurrent updates never write back
+      stale fields.
     '''
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     serializer_class = ProfileSerializer
     queryset = Profile.objects.all()
 
     def get_object(self):
-        queryset = self.filter_queryset(self.get_queryset())
-        if queryset:
-            object = queryset.get(pk=self.request.user.id)
-            return object
-        return Response({'Error': "User profile does not exist!"}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        queryset = Profile.objects.filter(user=self.request.user)
+        if self.request.method not in SAFE_METHODS:
+            queryset = queryset.select_for_update()
+        try:
+            return queryset.get()
+        except Profile.DoesNotExist:
+            raise ValidationError({'Error': "User profile does not exist!"})
+
+    #read, compare and save the profile under the row lock
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().update(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        previous_weight = serializer.instance.weight
+        profile = serializer.save()
+        if profile.weight != previous_weight: #calories only depend on the weight
+            recompute_calories([profile.user_id])
@@ -0,0 +1,142 @@
+import math
+from bisect import bisect_left
+from itertools import accumulate
+
+# Track analytics computed column-wise over the stored trackpoints (see activity/tracks.py):
+# each pass maps a whole column (latitudes, times, ...) at once instead of building an object per
+# point, so a 100k-point ride is a handful of list passes. The passes are still O(n) Python
+# (comprehensions and builtins, no vectorized arithmetic): they avoid per-point objects and
+# attribute lookups, not the interpreter, so the cost stays linear in the number of points
+# (about 1 µs per point, see benchmarks/analytics.py).
+EARTH_RADIUS = 6371008.8 #mean earth radius in meters
+MOVING_SPEED = 0.5 #m/s, slower segments count as stopped
+DEFAULT_SPLIT = 1000 #meters
+MIN_SPLIT = 10 #meters, a shorter remainder is merged into the last split
+ELEVATION_THRESHOLD = 3 #meters, smaller elevation changes are GPS/barometer noise
+
+def segment_distances(lats, lons):
+    '''
+    Returns the haversine distance in meters of each segment between consecutive points
+    (one less than the number of points). Cosines are computed once per point, not per segment.
+    '''
+    phis = list(map(math.radians, lats))
+    lambdas = list(map(math.radians, lons))
+    cosines = list(map(math.cos, phis))
+    sin, asin, sqrt = math.sin, math.asin, math.sqrt
+    return [
+        2 * EARTH_RADIUS * asin(sqrt(min(sin((phi2 - phi1) / 2) ** 2 + cos1 * cos2 * sin((lambda2 - lambda1) / 2) ** 2, 1.0)))
+        for phi1, phi2, cos1, cos2, lambda1, lambda2
+        in zip(phis, phis[1:], cosines, cosines[1:], lambdas, lambdas[1:])
+    ]
+
+def haversine(lat1, lon1, lat2, lon2):
+    '''
+    Returns the haversine distance in meters between two points (degrees), for one-off segments
+    such as live samples.
+    '''
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(min(a, 1.0)))
+
+def path_distance(lats, lons):
+    '''
+    Returns the length in meters of the path through the given coordinates (degrees).
+    '''
+    return math.fsum(segment_distances(lats, lons))
+
+def compute_splits(seconds, distances, split_length=DEFAULT_SPLIT):
+    '''
+    Detects the points where every `split_length` meters is reached, interpolating the time
+    within the segment that crosses it.
+    Arguments:
+    - seconds: time of each point, in seconds from the first point.
+    - distances: cumulative distance at each point, starting at 0 (non-decreasing).
+    Returns:
+    - splits: Type list of dicts with the split number, distance, duration and pace (seconds/km).
+              The last split is partial when the total is not a multiple of split_length; a
+              remainder shorter than MIN_SPLIT is merged into the split before it instead.
+    '''
+    splits = []
+    total = distances[-1]
+    previous_time, previous_distance = 0.0, 0.0
+    index = 1
+    while previous_distance < total:
+        target = previous_distance + split_length
+        if total - target < MIN_SPLIT:
+            target = total
+        index = bisect_left(distances, target, index)
+        before, after = distances[index - 1], distances[index]
+        fraction = (target - before) / (after - before) if after > before else 1.0
+        time = seconds[index - 1] + fraction * (seconds[index] - seconds[index - 1])
+        duration, length = time - previous_time, target - previous_distance
+        splits.append({
+            'split': len(splits) + 1,
+            'distance': length,
+            'duration': duration,
+            'pace': duration * 1000 / length,
+        })
+        previous_time, previous_distance = time, target
+    return splits
+
+def elevation_step(reference, elevation, threshold=ELEVATION_THRESHOLD):
+    '''
+    Hysteresis over elevations: the change from the reference elevation (the last one counted)
+    only counts once it reaches `threshold` meters, so noise around a flat or steady section
+    does not add up.
+    Returns:
+    - (reference, change): the new reference and the change to count (0.0 when below threshold).
+    '''
+    if math.isnan(elevation):
+        return reference, 0.0
+    if math.isnan(reference):
+        return elevation, 0.0
+    change = elevation - reference
+    if abs(change) < threshold:
+        return reference, 0.0
+    return elevation, change
+
+def elevation_changes(elevations, threshold=ELEVATION_THRESHOLD):
+    '''
+    Returns the (gain, loss) in meters over the elevation column, skipping points without
+    an elevation (NaN) and changes below `threshold` (see elevation_step).
+    '''
+    reference, gain, loss = math.nan, [], []
+    for elevation in elevations:
+        reference, change = elevation_step(reference, elevation, threshold)
+        if change > 0:
+            gain.append(change)
+        elif change < 0:
+            loss.append(-change)
+    return math.fsum(gain), math.fsum(loss)
+
+def track_analytics(times, lats, lons, elevations=None, split_length=DEFAULT_SPLIT):
+    '''
+    Computes the analytics of a track from its columns (see tracks.workout_track), in a few
+    linear Python passes over the columns.
+    Arguments:
+    - times: epoch milliseconds, sorted.
+    - lats, lons: coordinates in degrees.
+    - elevations: meters, NaN when unknown (optional).
+    Returns:
+    - analytics: Type dict with distance (m), elapsed and moving time (s), average pace over the
+                 moving time (s/km), max speed (m/s), elevation gain and loss (m) and the splits.
+    '''
+    segments = segment_distances(lats, lons)
+    seconds = [(time - times[0]) / 1000 for time in times]
+    intervals = [b - a for a, b in zip(seconds, seconds[1:])]
+    speeds = [distance / interval if interval > 0 else 0.0 for distance, interval in zip(segments, intervals)]
+    cumulative = list(accumulate(segments, initial=0.0))
+
+    distance = cumulative[-1]
+    moving_time = math.fsum(interval for interval, speed in zip(intervals, speeds) if speed >= MOVING_SPEED)
+    gain, loss = elevation_changes(elevations) if elevations is not None else (0.0, 0.0)
+    return {
+        'distance': distance,
+        'elapsed_time': seconds[-1],
+        'moving_time': moving_time,
+        'average_pace': moving_time * 1000 / distance if distance else None,
+        'max_speed': max(speeds, default=0.0),
+        'elevation_gain': gain,
+        'elevation_loss': loss,
+        'splits': compute_splits(seconds, cumulative, split_length) if distance else [],
+    }
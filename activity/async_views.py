@@ -0,0 +1,115 @@
+from abc import ABCMeta, abstractmethod
+from django.http import Http404, HttpResponse
+from django.views import View
+from django_filters.utils import translate_validation
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from accounts.authentication import aauthenticate
+from fitness_api.renderers import FastJSONRenderer
+from .filters import WorkoutFilter
+from .metrics import parse_metrics_params, acompute_metrics
+from .models import Workout
+from .pagination import WORKOUT_LIST_ORDERING
+from .serializers import WORKOUT_LIST_FIELDS, workout_list_representation
+from .tracks import parse_route_params, route_representation
+
+class AsyncAPIView(View, metaclass=ABCMeta):
+    '''
+    Base class for async (ASGI) read endpoints. Requests are authenticated with a JWT resolved
+    through the async ORM, and responses and errors are rendered like the DRF views, so an async
+    endpoint returns the same payloads as its sync counterpart without holding a worker thread
+    while it waits on the database.
+    Subclasses must implement handle (an abstract method, so a view without it cannot be instantiated).
+    '''
+    http_method_names = ['get']
+    renderer = FastJSONRenderer()
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            request.user = await aauthenticate(request)
+            if request.user is None:
+                raise NotAuthenticated()
+            data, status_code = await self.handle(request, **kwargs)
+        except Http404 as exc:
+            data, status_code = {'detail': str(exc)}, status.HTTP_404_NOT_FOUND
+        except APIException as exc:
+            # same body as DRF's exception handler
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            status_code = exc.status_code
+        response = HttpResponse(self.renderer.render(data), status=status_code, content_type='application/json')
+        if status_code == status.HTTP_401_UNAUTHORIZED:
+            response['WWW-Authenticate'] = 'Bearer realm="api"'
+        return response
+
+    @abstractmethod
+    async def handle(self, request, **kwargs):
+        '''
+        Returns the (data, status_code) of the response, or raises an APIException / Http404.
+        '''
+
+class AsyncWorkoutListView(AsyncAPIView):
+    '''
+    Async version of WorkoutListView: same filters (WorkoutFilter) and page number pagination,
+    ordered by (date, id), newest first (WORKOUT_LIST_ORDERING).
+    - pagination=cursor is not supported; the parameter is ignored and pages are always numbered.
+    '''
+    page_size = api_settings.PAGE_SIZE
+
+    async def handle(self, request, **kwargs):
+        filterset = WorkoutFilter(request.GET, queryset=Workout.objects.filter(user_id=request.user), request=request)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        queryset = filterset.qs.order_by(*WORKOUT_LIST_ORDERING).values_list(*WORKOUT_LIST_FIELDS)
+
+        try:
+            page = int(request.GET.get('page', 1))
+        except ValueError:
+            raise NotFound("Invalid page.")
+        count = await queryset.acount()
+        offset = (page - 1) * self.page_size
+        if page < 1 or (page > 1 and offset >= count):
+            raise NotFound("Invalid page.")
+        rows = [row async for row in queryset[offset:offset + self.page_size]]
+
+        url = request.build_absolute_uri()
+        next_link = replace_query_param(url, 'page', page + 1) if offset + self.page_size < count else None
+        if page == 1:
+            previous_link = None
+        elif page == 2:
+            previous_link = remove_query_param(url, 'page')
+        else:
+            previous_link = replace_query_param(url, 'page', page - 1)
+        return {
+            'count': count,
+            'next': next_link,
+            'previous': previous_link,
+            'results': workout_list_representation(rows),
+        }, status.HTTP_200_OK
+
+class AsyncWorkoutDetailView(AsyncAPIView):
+    '''
+    Async version of WorkoutDetailView (same resolution / tolerance route parameters).
+    '''
+    async def handle(self, request, pk, **kwargs):
+        route_field, tolerance = parse_route_params(request.GET)
+        fields = WORKOUT_LIST_FIELDS + ((route_field,) if route_field else ())
+        queryset = Workout.objects.filter(user_id=request.user).values_list(*fields)
+        try:
+            row = await queryset.aget(pk=pk)
+        except Workout.DoesNotExist:
+            raise NotFound("No Workout matches the given query.")
+        data = workout_list_representation([row[:len(WORKOUT_LIST_FIELDS)]])[0]
+        if route_field:
+            data['route'] = route_representation(row[-1], tolerance)
+        return data, status.HTTP_200_OK
+
+class AsyncWorkoutMetricsView(AsyncAPIView):
+    '''
+    Async version of WorkoutMetricsView (same parameters and response), computed with the
+    async ORM (aaggregate / async iteration). Results are not read from the metrics cache.
+    '''
+    async def handle(self, request, **kwargs):
+        start_date, end_date, group_by = parse_metrics_params(request.GET)
+        return await acompute_metrics(request.user, start_date, end_date, group_by)
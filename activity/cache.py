@@ -0,0 +1,136 @@
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from fitness_api.db_routers import pin_to_primary
+
+# Per-user metrics cache. Entries are keyed by (user, version, start_date, end_date, group_by);
+# every Workout write bumps the user's version, so stale entries are never read again and
+# simply expire. Only used when the cache is shared between processes (METRICS_CACHE_ENABLED).
+METRICS_CACHE_ALIAS = 'metrics'
+KEY_PREFIX = 'workout-metrics'
+
+def metrics_cache():
+    return caches[METRICS_CACHE_ALIAS]
+
+def _version_key(user_id):
+    return f'{KEY_PREFIX}:version:{user_id}'
+
+def _new_version():
+    # versions restart from the clock when a counter is evicted, so they never reuse an old value
+    return time.time_ns()
+
+def get_metrics_version(user_id):
+    '''
+    Returns the current metrics version of a user (user=None for the global version,
+    bumped when all users' workouts are rewritten at once).
+    '''
+    cache = metrics_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+def bump_metrics_version(user_id=None):
+    '''
+    Invalidates the cached metrics of a user (or of all users when user_id is None).
+    '''
+    cache = metrics_cache()
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError: #counter was evicted
+        cache.set(key, _new_version(), timeout=None)
+
+def _last_modified_key(user_id):
+    return f'{KEY_PREFIX}:last-modified:{user_id}'
+
+def _workouts_changed(user_id):
+    pin_to_primary(user_id)
+    if settings.METRICS_CACHE_ENABLED:
+        bump_metrics_version(user_id)
+        metrics_cache().set(_last_modified_key(user_id), time.time(), timeout=None)
+
+def mark_workouts_changed(user_id=None):
+    '''
+    Records that a user's workouts changed (or all users' when user_id is None):
+    invalidates their cached metrics, moves their last-modified marker and keeps their
+    reads on the primary database for a few seconds (read-your-writes).
+    The markers move once the current transaction commits (right away outside of one): moved
+    before, a concurrent read could see the new version with the old rows and cache or ETag
+    them as current until the next write.
+    '''
+    transaction.on_commit(lambda: _workouts_changed(user_id))
+
+def get_last_modified(user_id):
+    '''
+    Returns the time (epoch seconds) the user's workouts last changed. When the marker was
+    evicted it restarts from now, which only costs clients one full response.
+    '''
+    cache = metrics_cache()
+    keys = [_last_modified_key(None), _last_modified_key(user_id)]
+    markers = cache.get_many(keys)
+    if _last_modified_key(user_id) not in markers:
+        cache.add(_last_modified_key(user_id), time.time(), timeout=None)
+        markers = cache.get_many(keys)
+    return max(markers.values())
+
+def workout_validators(user_id):
+    '''
+    Returns the (etag, last_modified) validators of a user's workout data for conditional GETs.
+    The ETag is built from the metrics versions; last_modified is None while the latest change
+    is less than a second old, since HTTP dates cannot tell two changes within a second apart.
+    Both are None when the metrics cache is not shared (see METRICS_CACHE_ENABLED).
+    '''
+    if not settings.METRICS_CACHE_ENABLED:
+        return None, None
+    etag = f'"{get_metrics_version(None)}.{get_metrics_version(user_id)}"'
+    last_modified = get_last_modified(user_id)
+    if time.time() - last_modified < 1:
+        return etag, None
+    return etag, int(last_modified)
+
+def _count(event):
+    cache = metrics_cache()
+    key = f'{KEY_PREFIX}:{event}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+def metrics_cache_stats():
+    '''
+    Returns the hit/miss counters of the metrics cache.
+    '''
+    cache = metrics_cache()
+    hits = cache.get(f'{KEY_PREFIX}:hits', 0)
+    misses = cache.get(f'{KEY_PREFIX}:misses', 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else None,
+    }
+
+def get_or_compute_metrics(user_id, params, compute):
+    '''
+    Returns the cached metrics result of a user for the given params (start_date, end_date, group_by),
+    calling compute() and caching its result on a miss (always calling it when the metrics cache
+    is not shared, see METRICS_CACHE_ENABLED).
+    '''
+    if not settings.METRICS_CACHE_ENABLED:
+        return compute()
+    cache = metrics_cache()
+    versions = f'{get_metrics_version(None)}.{get_metrics_version(user_id)}'
+    key = ':'.join([KEY_PREFIX, str(user_id), versions] + [str(param) for param in params])
+    result = cache.get(key)
+    if result is not None:
+        _count('hits')
+        return result
+    _count('misses')
+    result = compute()
+    cache.set(key, result, settings.METRICS_CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.db.models import F
+from .models import Workout
+from .rollups import rebuild_rollups
+from .cache import mark_workouts_changed
+from .utils import chunked
+
+def calculate_calories_batch(durations, activity_types, weights, elevation_gains=None):
+    '''
+    Column-wise version of Workout.calculate_calories for many workouts at once.
+    Arguments:
+    - durations: workout durations in seconds (the moving time for tracked workouts).
+    - activity_types: activity type of each workout.
+    - weights: the owner's weight for each workout (None falls back to 1, like the per-instance method).
+    - elevation_gains: meters climbed by each workout (optional, None for untracked workouts).
+    Returns:
+    - calories_burned: Type list of Float, in the order of the inputs. The MET lookup is resolved
+      once per column and the formula is evaluated in the same order as calculate_calories,
+      so results are identical to the per-instance method.
+    '''
+    met_values = [Workout.MET_VALUES.get(activity_type, 1.0) for activity_type in activity_types]
+    weights = [1 if weight is None else weight for weight in weights]
+    minutes = [seconds / 60 for seconds in durations]
+    calories = [met_value * 3.5 * weight * duration / 200 for met_value, weight, duration in zip(met_values, weights, minutes)]
+    if elevation_gains is not None:
+        calories = [value + Workout.CLIMB_CALORIES * weight * gain if gain else value
+                    for value, weight, gain in zip(calories, weights, elevation_gains)]
+    return calories
+
+def recompute_calories(user_ids=None, batch_size=2000):
+    '''
+    Recomputes calories burned for all finished workouts, or only those of the given user ids,
+    e.g. after a user changed their weight. Weights are joined in the same query as the
+    workouts and results are written back with bulk_update, one batch at a time.
+    Returns:
+    - count: Type Int, the number of workouts updated.
+    '''
+    workouts = (Workout.objects
+                .filter(start_time__isnull=False, end_time__isnull=False)
+                .only('id', 'activity_type', 'start_time', 'end_time', 'moving_time', 'elevation_gain')
+                .annotate(weight=F('user_id__profile__weight'))
+                .order_by('id'))
+    if user_ids is not None:
+        workouts = workouts.filter(user_id__in=user_ids)
+
+    count = 0
+    for batch in chunked(workouts.iterator(chunk_size=batch_size), batch_size):
+        calories = calculate_calories_batch(
+            [(workout.moving_time if workout.moving_time is not None else workout.end_time - workout.start_time).total_seconds()
+             for workout in batch],
+            [workout.activity_type for workout in batch],
+            [workout.weight for workout in batch],
+            [workout.elevation_gain for workout in batch])
+        for workout, calories_burned in zip(batch, calories):
+            workout.calories_burned = calories_burned
+        with transaction.atomic():
+            Workout.objects.bulk_update(batch, ['calories_burned'])
+        count += len(batch)
+
+    rebuild_rollups(user_ids) #bulk_update skips the rollup and cache signals
+    for user_id in user_ids or [None]:
+        mark_workouts_changed(user_id)
+    return count
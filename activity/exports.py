@@ -0,0 +1,77 @@
+import csv
+from rest_framework.utils.encoders import JSONEncoder
+from .serializers import WORKOUT_LIST_FIELDS, workout_list_representation
+from .utils import chunked
+
+class Echo:
+    '''
+    File-like object whose write returns the value, so csv.writer yields rows instead of buffering them.
+    '''
+    def write(self, value):
+        return value
+
+def export_rows(workouts, chunk_size=2000):
+    '''
+    Yields workouts as dicts with WorkoutListSerializer field semantics, fetching them from a
+    server-side cursor `chunk_size` rows at a time so memory stays flat.
+    '''
+    rows = workouts.values_list(*WORKOUT_LIST_FIELDS).iterator(chunk_size=chunk_size)
+    for chunk in chunked(rows, chunk_size):
+        yield from workout_list_representation(chunk)
+
+async def aexport_rows(workouts, chunk_size=2000):
+    '''
+    Async version of export_rows for ASGI, where a sync iterator would be read to the end before
+    the response starts.
+    '''
+    chunk = []
+    async for row in workouts.values_list(*WORKOUT_LIST_FIELDS).aiterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            for item in workout_list_representation(chunk):
+                yield item
+            chunk = []
+    for item in workout_list_representation(chunk):
+        yield item
+
+def csv_format():
+    '''
+    Returns the CSV header line and the function formatting one row as a line.
+    '''
+    fields = WORKOUT_LIST_FIELDS
+    writer = csv.writer(Echo())
+    return writer.writerow(fields), lambda row: writer.writerow([row[field] for field in fields])
+
+def ndjson_format():
+    '''
+    Returns no header and the function formatting one row as a JSON document on its own line,
+    encoded like the API's JSON responses.
+    '''
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    return None, lambda row: encoder.encode(row) + '\n'
+
+# export format: (content type, format function)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', csv_format),
+    'ndjson': ('application/x-ndjson', ndjson_format),
+}
+
+def export_stream(export_format, rows):
+    '''
+    Yields the lines of an export (see EXPORT_FORMATS) from export_rows().
+    '''
+    header, format_row = EXPORT_FORMATS[export_format][1]()
+    if header is not None:
+        yield header
+    for row in rows:
+        yield format_row(row)
+
+async def aexport_stream(export_format, rows):
+    '''
+    Async version of export_stream, from aexport_rows().
+    '''
+    header, format_row = EXPORT_FORMATS[export_format][1]()
+    if header is not None:
+        yield header
+    async for row in rows:
+        yield format_row(row)
@@ -1,9 +1,71 @@
 import django_filters
+from django import forms
+from django.contrib.gis.geos import Point, Polygon
+from django.contrib.gis.measure import D
 from .models import Workout
+
+DEFAULT_NEAR_RADIUS = 1000 #meters
+MAX_NEAR_RADIUS = 100000
+
+def _parse_floats(value, count, message):
+    parts = value.split(',')
+    if len(parts) != count:
+        raise forms.ValidationError(message)
+    try:
+        return [float(part) for part in parts]
+    except ValueError:
+        raise forms.ValidationError(message)
+
+class LatLonField(forms.CharField):
+    '''
+    Form field for a "lat,lon" point, cleaned to a WGS84 Point.
+    '''
+    def clean(self, value):
+        value = super().clean(value)
+        if not value:
+            return None
+        lat, lon = _parse_floats(value, 2, "Enter a point as lat,lon")
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise forms.ValidationError("Latitude must be between -90 and 90 and longitude between -180 and 180")
+        return Point(lon, lat, srid=4326)
+
+class BBoxField(forms.CharField):
+    '''
+    Form field for a "min_lon,min_lat,max_lon,max_lat" bounding box, cleaned to a WGS84 Polygon.
+    '''
+    def clean(self, value):
+        value = super().clean(value)
+        if not value:
+            return None
+        min_lon, min_lat, max_lon, max_lat = _parse_floats(value, 4, "Enter a bounding box as min_lon,min_lat,max_lon,max_lat")
+        if not (-180 <= min_lon < max_lon <= 180 and -90 <= min_lat < max_lat <= 90):
+            raise forms.ValidationError("Invalid bounding box")
+        bbox = Polygon.from_bbox((min_lon, min_lat, max_lon, max_lat))
+        bbox.srid = 4326
+        return bbox
+
+class LatLonFilter(django_filters.Filter):
+    field_class = LatLonField
+
+class BBoxFilter(django_filters.Filter):
+    field_class = BBoxField
+
 # Filterset class to filter by date range, duration, and activity type
+# near / bbox are answered by the GiST indexes on start_point and route
 class WorkoutFilter(django_filters.FilterSet):
     date_range = django_filters.DateFromToRangeFilter(field_name='date')
+    near = LatLonFilter(method='filter_near', label="Workouts that started within radius of lat,lon")
+    radius = django_filters.NumberFilter(method='filter_radius', min_value=1, max_value=MAX_NEAR_RADIUS, label="Radius in meters for near (default 1000)")
+    bbox = BBoxFilter(field_name='route', lookup_expr='intersects', label="Workouts whose route passes through min_lon,min_lat,max_lon,max_lat")
 
     class Meta:
         model = Workout
-        fields = ['activity_type', 'duration', 'date_range']
\ No newline at end of file
+        fields = ['activity_type', 'duration', 'date_range', 'near', 'radius', 'bbox']
+
+    def filter_near(self, queryset, name, value):
+        radius = self.form.cleaned_data.get('radius') or DEFAULT_NEAR_RADIUS
+        return queryset.filter(start_point__dwithin=(value, D(m=float(radius))))
+
+    #radius only applies to near
+    def filter_radius(self, queryset, name, value):
+        return queryset
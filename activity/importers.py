@@ -0,0 +1,214 @@
+import codecs
+import csv
+import hashlib
+import io
+import itertools
+import json
+import time
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .cache import mark_workouts_changed
+from .calories import calculate_calories_batch
+from .models import Workout, WorkoutImport
+from .rollups import add_workouts
+from .utils import chunked
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+ACTIVITY_TYPES = {activity_type for activity_type, _ in Workout.ACTIVITY_TYPE}
+MAX_REPORTED_ERRORS = 100
+
+class ImportFileError(ValueError):
+    '''
+    The file as a whole cannot be read as CSV/NDJSON (not UTF-8 text, NUL bytes, malformed CSV),
+    as opposed to a single invalid row.
+    '''
+
+def file_checksum(file):
+    '''
+    Returns the sha256 of a binary file, read in blocks, and rewinds it.
+    The same pass checks the file is UTF-8 text without NUL bytes, so such a file is rejected
+    before any row is imported.
+    Raises:
+    - ImportFileError: if the file is not UTF-8 text or contains NUL bytes.
+    '''
+    digest = hashlib.sha256()
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        for block in iter(lambda: file.read(64 * 1024), b''):
+            digest.update(block)
+            if b'\x00' in block:
+                raise ImportFileError("The file contains NUL bytes, it is not a text file")
+            decoder.decode(block)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise ImportFileError("The file is not UTF-8 text")
+    file.seek(0)
+    return digest.hexdigest()
+
+def parse_rows(file, file_format):
+    '''
+    Yields (line number, row dict) pairs from a binary CSV (with a header) or NDJSON file,
+    one row at a time. Unparsable NDJSON lines are yielded as None. A leading byte order mark
+    (spreadsheet exports) is skipped.
+    Raises:
+    - ImportFileError: if the file is not UTF-8 text or the CSV cannot be parsed past a line
+      (the rows yielded before it stay valid).
+    '''
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        if file_format == 'csv':
+            reader = csv.DictReader(text)
+            try:
+                for row in reader:
+                    yield reader.line_num, row
+            except csv.Error as error:
+                raise ImportFileError(f"line {reader.line_num}: malformed CSV ({error})")
+        else:
+            for line_number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_number, row if isinstance(row, dict) else None
+    except UnicodeDecodeError:
+        raise ImportFileError("The file is not UTF-8 text")
+    finally:
+        text.detach() #leave the underlying file open for the caller
+
+def _parse_time(value, field):
+    moment = parse_datetime(value) if isinstance(value, str) else None
+    if moment is None:
+        raise ValueError(f"{field}: invalid or missing datetime")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+def validate_row(row):
+    '''
+    Validates one imported row and returns the Workout fields it maps to.
+    Raises ValueError with a message when the row is invalid.
+    '''
+    if row is None:
+        raise ValueError("row is not a JSON object")
+    activity_type = row.get('activity_type')
+    if activity_type not in ACTIVITY_TYPES:
+        raise ValueError(f"activity_type: '{activity_type}' is not a valid choice")
+    start_time = _parse_time(row.get('start_time'), 'start_time')
+    end_time = _parse_time(row.get('end_time'), 'end_time')
+    if end_time < start_time:
+        raise ValueError("end_time: end time cannot be before start time")
+    distance = row.get('distance')
+    if distance in (None, ''):
+        distance = None
+    else:
+        try:
+            distance = float(distance)
+        except (TypeError, ValueError):
+            raise ValueError("distance: must be a number")
+    return {
+        'activity_type': activity_type,
+        'start_time': start_time,
+        'end_time': end_time,
+        'distance': distance,
+    }
+
+def _lock_checkpoint(checkpoint, rows_processed):
+    '''
+    Locks the checkpoint row for the current transaction. Returns it, or None when another run of
+    the same import moved it past `rows_processed` (or completed it) in the meantime.
+    '''
+    checkpoint = WorkoutImport.objects.select_for_update().get(pk=checkpoint.pk)
+    if checkpoint.status == 'completed' or checkpoint.rows_processed != rows_processed:
+        return None
+    return checkpoint
+
+def import_workouts(user, file, file_format, file_name='', chunk_size=1000):
+    '''
+    Imports workouts for a user from a binary CSV/NDJSON file with constant memory.
+
+    Rows are parsed lazily and handled `chunk_size` at a time: each chunk is validated, its
+    duration and calories are computed in batch, and it is inserted with bulk_create in its own
+    transaction together with the import checkpoint. Importing the same file again resumes after
+    the last committed chunk (or does nothing once the import completed).
+    Each chunk locks the checkpoint row and checks it is still where this run left it, so when
+    the same file is imported twice at once only one run inserts each chunk; the other stops and
+    reports the checkpoint as it found it.
+    A file that cannot be read (see ImportFileError) is rejected before anything is imported;
+    a CSV error further down stops the import after the chunks before it, like an interruption.
+
+    Returns:
+    - result: Type dict, the import summary (rows, errors, throughput in rows/sec).
+    Raises:
+    - ImportFileError: if the file cannot be read as CSV/NDJSON.
+    '''
+    checksum = file_checksum(file)
+    checkpoint, _ = WorkoutImport.objects.get_or_create(user=user, checksum=checksum, defaults={'file_name': file_name})
+    started = time.monotonic()
+    rows_read = 0
+    errors = []
+
+    if checkpoint.status != 'completed':
+        try:
+            weight = user.profile.weight
+        except ObjectDoesNotExist:
+            weight = None
+
+        rows = itertools.islice(parse_rows(file, file_format), checkpoint.rows_processed, None)
+        for chunk in chunked(rows, chunk_size):
+            workouts = []
+            for line_number, row in chunk:
+                try:
+                    fields = validate_row(row)
+                except ValueError as error:
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append({'line': line_number, 'error': str(error)})
+                    continue
+                workouts.append(Workout(user_id=user, date=fields['start_time'], **fields))
+
+            durations = [workout.end_time - workout.start_time for workout in workouts]
+            calories = calculate_calories_batch(
+                [duration.total_seconds() for duration in durations],
+                [workout.activity_type for workout in workouts],
+                [weight] * len(workouts))
+            for workout, duration, calories_burned in zip(workouts, durations, calories):
+                workout.duration = duration
+                workout.calories_burned = calories_burned
+
+            with transaction.atomic():
+                locked = _lock_checkpoint(checkpoint, checkpoint.rows_processed)
+                if locked is None:
+                    checkpoint.refresh_from_db() #another run of this import got there first
+                    break
+                checkpoint = locked
+                Workout.objects.bulk_create(workouts)
+                add_workouts(workouts)
+                checkpoint.rows_processed += len(chunk)
+                checkpoint.rows_imported += len(workouts)
+                checkpoint.rows_failed += len(chunk) - len(workouts)
+                checkpoint.save(update_fields=['rows_processed', 'rows_imported', 'rows_failed', 'updated'])
+            mark_workouts_changed(user.id)
+            rows_read += len(chunk)
+        else:
+            with transaction.atomic():
+                locked = _lock_checkpoint(checkpoint, checkpoint.rows_processed)
+                if locked is not None:
+                    checkpoint = locked
+                    checkpoint.status = 'completed'
+                    checkpoint.save(update_fields=['status', 'updated'])
+
+    elapsed = time.monotonic() - started
+    return {
+        'import_id': checkpoint.id,
+        'status': checkpoint.status,
+        'rows_processed': checkpoint.rows_processed,
+        'rows_imported': checkpoint.rows_imported,
+        'rows_failed': checkpoint.rows_failed,
+        'errors': errors,
+        'rows_read': rows_read, #rows read by this run (excludes rows skipped when resuming)
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows_read / elapsed, 1) if elapsed else None,
+    }
@@ -0,0 +1,288 @@
+import asyncio
+import json
+import math
+import re
+import time as clock
+import uuid
+from datetime import timedelta
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from accounts.authentication import aauthenticate_token
+from fitness_api.renderers import FastJSONRenderer, orjson
+from .analytics import MOVING_SPEED, elevation_step, haversine
+from .models import Workout
+from .tracks import parse_trackpoints, to_epoch_ms, from_epoch_ms
+
+LIVE_PATH = re.compile(r'^/ws/workouts/(?P<pk>\d+)/live/$')
+MAX_MESSAGE_SIZE = 64 * 1024 #bytes
+
+# WebSocket close codes (4000-4999 are application defined)
+CLOSE_NORMAL = 1000
+CLOSE_MESSAGE_TOO_BIG = 1009
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_NOT_FOUND = 4404
+CLOSE_IDLE = 4408
+CLOSE_FINISHED = 4409 #the workout is already finished
+CLOSE_IN_USE = 4423 #another live session is open for the workout
+
+renderer = FastJSONRenderer()
+
+class LiveSession:
+    '''
+    Running totals of a live workout, updated in O(1) per sample from the previous sample only
+    (no trackpoints are kept), so a process can hold thousands of sessions.
+    Totals start from what the workout already stores, so a device that reconnects carries on.
+    '''
+    __slots__ = ('workout', 'met_value', 'weight', 'start', 'samples', 'last_time', 'last_lat', 'last_lon',
+                 'last_ele', 'distance', 'moving_time', 'elevation_gain')
+
+    def __init__(self, workout, weight):
+        self.workout = workout
+        self.met_value = Workout.MET_VALUES.get(workout.activity_type, 1.0)
+        self.weight = 1 if weight is None else weight #same default as calculate_calories
+        self.start = to_epoch_ms(workout.start_time)
+        self.samples = 0
+        self.last_time = self.last_lat = self.last_lon = None
+        self.last_ele = math.nan
+        self.distance = workout.distance or 0.0
+        self.moving_time = workout.moving_time.total_seconds() if workout.moving_time else 0.0
+        self.elevation_gain = workout.elevation_gain or 0.0
+
+    def add(self, time, lat, lon, ele):
+        '''
+        Adds one sample (epoch ms, lat, lon, ele) to the totals. Samples not newer than the last
+        one are ignored. last_ele is the elevation_step reference, as in the stored track analytics.
+        '''
+        if self.last_time is not None:
+            if time <= self.last_time:
+                return
+            interval = (time - self.last_time) / 1000
+            distance = haversine(self.last_lat, self.last_lon, lat, lon)
+            self.distance += distance
+            if distance / interval >= MOVING_SPEED:
+                self.moving_time += interval
+        self.last_ele, change = elevation_step(self.last_ele, ele)
+        if change > 0:
+            self.elevation_gain += change
+        self.last_time, self.last_lat, self.last_lon = time, lat, lon
+        self.samples += 1
+
+    def calories(self):
+        # same formula as Workout.calculate_calories, on the running moving time and climb
+        calories = self.met_value * 3.5 * self.weight * (self.moving_time / 60) / 200
+        if self.elevation_gain:
+            calories += Workout.CLIMB_CALORIES * self.weight * self.elevation_gain
+        return calories
+
+    def totals(self):
+        return {
+            'workout': self.workout.id,
+            'samples': self.samples,
+            'elapsed_time': max(self.last_time - self.start, 0) / 1000 if self.last_time is not None else 0.0,
+            'distance': self.distance,
+            'moving_time': self.moving_time,
+            'elevation_gain': self.elevation_gain,
+            'calories_burned': self.calories(),
+        }
+
+def _database_sync_to_async(function):
+    '''
+    Runs blocking ORM code from the WebSocket handler in a worker thread. Outside of HTTP
+    requests nothing recycles connections, so stale ones are closed around each call.
+    Each call is self-contained (its own connection and transaction), so it runs in the thread
+    pool rather than the single thread-sensitive thread: sessions do not queue behind each other.
+    '''
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper, thread_sensitive=False)
+
+@_database_sync_to_async
+def load_workout(user, pk):
+    return (Workout.objects
+            .filter(user_id=user, pk=pk)
+            .select_related('user_id__profile')
+            .defer('route', 'route_times', 'route_elevations', 'route_medium', 'route_low')
+            .first())
+
+@_database_sync_to_async
+def flush_session(session, finish):
+    '''
+    Writes the running totals to the workout row. Finishing also sets end_time (the last sample,
+    or now without samples), duration and calories, like finishing through WorkoutUpdateView.
+    Saved with save() so the rollup and cache signals run.
+    The row is locked and re-read first: if it was finished meanwhile (e.g. through
+    WorkoutUpdateView) or deleted, nothing is written.
+    Returns:
+    - saved: Type bool, False when the workout was already finished or no longer exists.
+    '''
+    workout = session.workout
+    with transaction.atomic():
+        pending = (Workout.objects.select_for_update()
+                   .filter(pk=workout.pk, end_time__isnull=True)
+                   .values_list('pk', flat=True).first())
+        if pending is None:
+            return False
+        workout.distance = session.distance
+        workout.moving_time = timedelta(seconds=session.moving_time)
+        workout.elevation_gain = session.elevation_gain
+        fields = ['distance', 'moving_time', 'elevation_gain']
+        if finish:
+            workout.end_time = from_epoch_ms(session.last_time) if session.last_time is not None and session.last_time >= session.start else timezone.now()
+            workout.calories_burned = session.calories()
+            fields += ['end_time', 'duration', 'calories_burned']
+        workout.save(update_fields=fields)
+    return True
+
+class SessionLock:
+    '''
+    Cache lock allowing one live session per workout, so two connections cannot keep separate
+    totals and overwrite each other's. It expires after the idle timeout (plus a margin) unless
+    refreshed, so a crashed process does not hold it forever; it only spans processes when the
+    default cache is shared (CACHE_BACKEND).
+    '''
+    def __init__(self, workout_id):
+        self.key = f'live-session:{workout_id}'
+        self.token = uuid.uuid4().hex
+        self.timeout = settings.LIVE_SESSION_IDLE_TIMEOUT + 60
+        self.refreshed = 0.0
+
+    async def acquire(self):
+        if not await cache.aadd(self.key, self.token, self.timeout):
+            return False
+        self.refreshed = clock.monotonic()
+        return True
+
+    async def refresh(self):
+        # at most once per half timeout, not on every message
+        if clock.monotonic() - self.refreshed > self.timeout / 2:
+            await cache.atouch(self.key, self.timeout)
+            self.refreshed = clock.monotonic()
+
+    async def release(self):
+        if await cache.aget(self.key) == self.token:
+            await cache.adelete(self.key)
+
+def _scope_token(scope):
+    # browsers cannot set headers on WebSocket connections, so the JWT may also come as ?token=
+    for name, value in scope.get('headers', ()):
+        if name == b'authorization':
+            scheme, _, token = value.partition(b' ')
+            if scheme.lower() == b'bearer' and token:
+                return token
+    tokens = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('token')
+    return tokens[0] if tokens else None
+
+def _decode(message):
+    data = message.get('text')
+    if data is None:
+        data = message.get('bytes') or b''
+    if len(data) > MAX_MESSAGE_SIZE:
+        raise OverflowError
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+async def _send(send, data):
+    await send({'type': 'websocket.send', 'text': renderer.render(data).decode()})
+
+async def live_session_application(scope, receive, send):
+    '''
+    ASGI application for live workouts over a WebSocket, mounted by fitness_api/asgi.py at
+    ws/workouts/<pk>/live/ (<pk> is a pending workout created with workouts/new/).
+
+    Authentication:
+    - JWT in an "Authorization: Bearer" header or a ?token= query parameter.
+    Messages from the device (JSON text frames):
+    - a sample {"lat", "lon", "time", "ele"} (same format as the track upload), or a list of samples.
+    - {"type": "finish"} to finish the workout.
+    Messages from the server:
+    - {"type": "totals", ...} after every sample message: elapsed time, distance, moving time,
+      elevation gain and calories burned so far.
+    - {"type": "finished", ...} with the final totals, then the connection is closed.
+    - {"type": "error", "detail": ...} for an invalid message; the session stays open.
+    Only one session per workout can be open (see SessionLock), others are closed with CLOSE_IN_USE.
+    A workout finished elsewhere meanwhile is not overwritten, the session is closed with CLOSE_FINISHED.
+    Totals are kept in memory and written to the workout at finish, and also when the device
+    disconnects or stays idle for LIVE_SESSION_IDLE_TIMEOUT seconds (the workout stays pending).
+    '''
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    match = LIVE_PATH.match(scope['path'])
+    if match is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    token = _scope_token(scope)
+    try:
+        user = await aauthenticate_token(token) if token else None
+    except (InvalidToken, AuthenticationFailed):
+        user = None
+    if user is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        return
+    workout = await load_workout(user, int(match['pk']))
+    if workout is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    if workout.end_time is not None:
+        await send({'type': 'websocket.close', 'code': CLOSE_FINISHED})
+        return
+    lock = SessionLock(workout.id)
+    if not await lock.acquire():
+        await send({'type': 'websocket.close', 'code': CLOSE_IN_USE})
+        return
+
+    # users without a profile get the default weight (1 kg) instead of failing after accept
+    profile = getattr(workout.user_id, 'profile', None)
+    session = LiveSession(workout, profile.weight if profile is not None else None)
+    finished = False
+    close_code = CLOSE_NORMAL
+    try:
+        await send({'type': 'websocket.accept'})
+        while True:
+            try:
+                message = await asyncio.wait_for(receive(), settings.LIVE_SESSION_IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                close_code = CLOSE_IDLE
+                break
+            if message['type'] == 'websocket.disconnect':
+                return
+            await lock.refresh()
+            try:
+                data = _decode(message)
+            except OverflowError:
+                close_code = CLOSE_MESSAGE_TOO_BIG
+                break
+            except ValueError:
+                await _send(send, {'type': 'error', 'detail': "Invalid JSON"})
+                continue
+
+            if isinstance(data, dict) and data.get('type') == 'finish':
+                finished = True
+                if not await flush_session(session, finish=True):
+                    close_code = CLOSE_FINISHED
+                    break
+                await _send(send, {'type': 'finished', **session.totals()})
+                break
+            try:
+                samples = parse_trackpoints(data if isinstance(data, list) else [data])
+            except ValueError as error:
+                await _send(send, {'type': 'error', 'detail': str(error)})
+                continue
+            for sample in samples:
+                session.add(*sample)
+            await _send(send, {'type': 'totals', **session.totals()})
+        await send({'type': 'websocket.close', 'code': close_code})
+    finally:
+        try:
+            if not finished and session.samples:
+                await flush_session(session, finish=False)
+        finally:
+            await lock.release()
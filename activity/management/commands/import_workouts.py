@@ -0,0 +1,47 @@
+import os
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from activity.importers import IMPORT_FORMATS, ImportFileError, import_workouts
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    '''
+    Imports historical workouts for a user from a CSV (with a header) or NDJSON file.
+    Each row needs activity_type, start_time and end_time (ISO 8601), distance is optional.
+    Running the command again on an interrupted import resumes from its last checkpoint.
+
+    Usage:
+    - python manage.py import_workouts history.csv --user alice
+    - python manage.py import_workouts history.ndjson --user alice --chunk-size 5000
+    '''
+    help = "Import workouts from a CSV/NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import")
+        parser.add_argument('--user', required=True, help="Username of the workouts' owner")
+        parser.add_argument('--format', choices=IMPORT_FORMATS, dest='file_format', help="File format (defaults to the file extension)")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Rows validated and inserted per transaction")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist")
+
+        path = options['path']
+        file_format = options['file_format'] or path.rsplit('.', 1)[-1].lower()
+        if file_format not in IMPORT_FORMATS:
+            raise CommandError(f"Unknown file format, use --format with one of: {', '.join(IMPORT_FORMATS)}")
+
+        with open(path, 'rb') as file:
+            try:
+                result = import_workouts(user, file, file_format, file_name=os.path.basename(path), chunk_size=options['chunk_size'])
+            except ImportFileError as error:
+                raise CommandError(str(error))
+
+        for error in result['errors']:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Import {result['status']}: {result['rows_imported']} imported, {result['rows_failed']} failed, "
+            f"{result['rows_read']} rows read in {result['seconds']}s ({result['rows_per_second']} rows/sec)"))
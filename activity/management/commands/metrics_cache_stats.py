@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from activity.cache import metrics_cache_stats
+
+class Command(BaseCommand):
+    '''
+    Prints the hit/miss counters of the workout metrics cache.
+    Counters live in the metrics cache itself, so with a shared backend they cover all workers.
+    '''
+    help = "Show the workout metrics cache hit rate"
+
+    def handle(self, *args, **options):
+        stats = metrics_cache_stats()
+        hit_rate = f"{stats['hit_rate']:.1%}" if stats['hit_rate'] is not None else "n/a"
+        self.stdout.write(f"hits: {stats['hits']}  misses: {stats['misses']}  hit rate: {hit_rate}")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from activity.rollups import rebuild_rollups
+from activity.cache import mark_workouts_changed
+
+class Command(BaseCommand):
+    '''
+    Backfills or rebuilds the WorkoutDailyRollup table from raw workouts.
+
+    Usage:
+    - python manage.py rebuild_workout_rollups              (all users)
+    - python manage.py rebuild_workout_rollups --user 1 2   (only the given user ids)
+    '''
+    help = "Rebuild the daily workout rollups used by the metrics endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', nargs='+', type=int, dest='user_ids', help="Only rebuild rollups for these user ids")
+
+    def handle(self, *args, **options):
+        count = rebuild_rollups(options['user_ids'])
+        for user_id in options['user_ids'] or [None]:
+            mark_workouts_changed(user_id)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} daily rollup rows"))
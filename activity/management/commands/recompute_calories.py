@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from activity.calories import recompute_calories
+
+class Command(BaseCommand):
+    '''
+    Recomputes calories burned for finished workouts from the owners' current weight.
+
+    Usage:
+    - python manage.py recompute_calories              (all users)
+    - python manage.py recompute_calories --user 1 2   (only the given user ids)
+    '''
+    help = "Recompute calories burned for workouts in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', nargs='+', type=int, dest='user_ids', help="Only recompute workouts of these user ids")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Number of workouts updated per query")
+
+    def handle(self, *args, **options):
+        count = recompute_calories(options['user_ids'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Recomputed calories for {count} workouts"))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from activity.cache import mark_workouts_changed
+from activity.partitions import maintain_partitions
+from activity.rollups import rebuild_rollups
+
+class Command(BaseCommand):
+    '''
+    Maintains the monthly partitions of the workout table (PostgreSQL). Meant to run periodically
+    (e.g. daily from cron) so upcoming months always have a partition.
+
+    Usage:
+    - python manage.py workout_partitions                       (create partitions up to 3 months ahead)
+    - python manage.py workout_partitions --ahead 6
+    - python manage.py workout_partitions --retain 24           (also detach partitions older than 24 months)
+
+    Detached partitions stay in the database as standalone tables without the user foreign key,
+    so they can be dumped and dropped later; the daily rollups of their users are rebuilt so
+    metrics match the workouts still listed.
+    '''
+    help = "Create upcoming monthly workout partitions and detach old ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3, help="Months ahead of the current one to create partitions for")
+        parser.add_argument('--retain', type=int, help="Detach partitions of months older than this many months")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Workout partitions require PostgreSQL")
+        if options['ahead'] < 0 or (options['retain'] is not None and options['retain'] < 1):
+            raise CommandError("--ahead must be 0 or more and --retain 1 or more")
+        with transaction.atomic():
+            created, detached, user_ids = maintain_partitions(timezone.now().date(), options['ahead'], options['retain'])
+            if user_ids:
+                rebuild_rollups(user_ids)
+        for user_id in user_ids:
+            mark_workouts_changed(user_id)
+        for name in created:
+            self.stdout.write(f"Created {name}")
+        for name in detached:
+            self.stdout.write(f"Detached {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} partitions created, {len(detached)} detached"))
@@ -0,0 +1,198 @@
+from django.conf import settings
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, TruncWeek
+from django.utils.dateparse import parse_date
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from .models import Workout, WorkoutDailyRollup
+from .utils import seconds_to_HHMMSS
+
+# group_by options accepted by the metrics endpoint, mapped to the expression used as the bucket
+GROUP_BY_CHOICES = {
+    'day': lambda: TruncDate('date'),
+    'week': lambda: TruncWeek('date', output_field=DateField()),
+    'month': lambda: TruncMonth('date', output_field=DateField()),
+    'activity_type': lambda: F('activity_type'),
+}
+
+def metric_aggregates():
+    '''
+    Aggregates computed by the metrics engine. Pending workouts (no duration yet) are counted
+    with a conditional aggregate so the pending check rides on the same query as the totals.
+    '''
+    return {
+        'pending': Count('id', filter=Q(duration__isnull=True)),
+        'total_duration': Sum('duration'),
+        'total_distance': Sum('distance'),
+        'total_calories_burned': Sum('calories_burned'),
+    }
+
+# Same buckets and aggregates, answered from WorkoutDailyRollup rows
+ROLLUP_GROUP_BY_CHOICES = {
+    'day': lambda: F('day'),
+    'week': lambda: TruncWeek('day'),
+    'month': lambda: TruncMonth('day'),
+    'activity_type': lambda: F('activity_type'),
+}
+
+def rollup_aggregates():
+    '''
+    Aggregates matching metric_aggregates(), summed over pre-aggregated daily rollups.
+    '''
+    return {
+        'pending': Coalesce(Sum('pending_count'), 0),
+        'total_duration': Sum('total_duration'),
+        'total_distance': Sum('total_distance'),
+        'total_calories_burned': Sum('total_calories_burned'),
+    }
+
+def _add(a, b):
+    '''
+    Adds two aggregate values, treating None (no rows / all null) the way SQL SUM does.
+    '''
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a + b
+
+def summarize(rows):
+    '''
+    Folds grouped aggregate rows into overall totals.
+    Returns:
+    - totals: Type dict, same keys as metric_aggregates().
+    '''
+    totals = dict.fromkeys(metric_aggregates(), None)
+    totals['pending'] = 0
+    for row in rows:
+        for key in totals:
+            totals[key] = _add(totals[key], row[key])
+    return totals
+
+def metrics_queryset(queryset, group_by, aggregates=metric_aggregates, choices=GROUP_BY_CHOICES):
+    '''
+    Builds the grouped metrics query: one row per bucket, ordered by period.
+    '''
+    return (queryset
+            .annotate(period=choices[group_by]())
+            .values('period')
+            .annotate(**aggregates())
+            .order_by('period'))
+
+def _metrics(queryset, group_by, aggregates, choices):
+    '''
+    Computes pending count, total duration, distance and calories for a workout or rollup queryset
+    in one query, optionally broken down by group_by (see GROUP_BY_CHOICES).
+    Returns:
+    - totals: Type dict, the overall totals.
+    - breakdown: Type list of dicts (one per bucket), or None when group_by is not set.
+    '''
+    if group_by is None:
+        return queryset.aggregate(**aggregates()), None
+    breakdown = list(metrics_queryset(queryset, group_by, aggregates, choices))
+    return summarize(breakdown), breakdown
+
+async def _ametrics(queryset, group_by, aggregates, choices):
+    if group_by is None:
+        return await queryset.aaggregate(**aggregates()), None
+    breakdown = [row async for row in metrics_queryset(queryset, group_by, aggregates, choices)]
+    return summarize(breakdown), breakdown
+
+def parse_metrics_params(query_params):
+    '''
+    Validates the metrics query parameters.
+    Returns:
+    - (start_date, end_date, group_by): dates are None when not given, group_by is None when not set.
+    Raises:
+    - ValidationError: if a date or group_by is invalid.
+    '''
+    #get date range from query parameters
+    start_date = query_params.get('start_date')
+    end_date = query_params.get('end_date')
+    group_by = query_params.get('group_by') or None
+
+    #validate data inputs
+    if start_date:
+        start_date = parse_date(start_date)
+        if not start_date:
+            raise ValidationError({'start_date': "Invalid start date format"})
+    if end_date:
+        end_date = parse_date(end_date)
+        if not end_date:
+            raise ValidationError({'end_date': "Invalid start date format"})
+    if group_by and group_by not in GROUP_BY_CHOICES:
+        raise ValidationError({'group_by': f"Invalid group_by, choose from: {', '.join(GROUP_BY_CHOICES)}"})
+    return start_date, end_date, group_by
+
+def _metrics_source(user, start_date, end_date):
+    '''
+    Picks the queryset metrics are computed from, with the matching aggregates and buckets.
+    '''
+    if start_date and end_date and settings.WORKOUT_METRICS_USE_ROLLUPS:
+        # whole days: answer from the daily rollups, the days start_date..end_date-1
+        rollups = WorkoutDailyRollup.objects.filter(user=user, day__gte=start_date, day__lt=end_date)
+        return rollups, rollup_aggregates, ROLLUP_GROUP_BY_CHOICES
+    # filter workouts by the user within the date range: from start_date 00:00 up to, but
+    # excluding, end_date 00:00, the same days as the rollups
+    if start_date and end_date:
+        workouts = Workout.objects.filter(user_id=user, date__gte=start_date, date__lt=end_date)
+    else:
+        workouts = Workout.objects.filter(user_id=user, date__range=(start_date, end_date))
+    return workouts, metric_aggregates, GROUP_BY_CHOICES
+
+def _metrics_result(totals, breakdown, start_date, end_date, group_by):
+    '''
+    Builds the metrics response body and status code from computed totals.
+    '''
+    if totals['pending']:
+        return {"error": "Please update all pending workouts before running metrics"}, status.HTTP_400_BAD_REQUEST
+
+    response = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "total_duration": format_duration(totals['total_duration']),
+        "total_distance": totals['total_distance'],
+        "total_calories_burned": totals['total_calories_burned'],
+    }
+    if breakdown is not None:
+        response["group_by"] = group_by
+        response["breakdown"] = [format_bucket(row) for row in breakdown]
+    return response, status.HTTP_200_OK
+
+def compute_metrics(user, start_date, end_date, group_by=None):
+    '''
+    Computes the metrics response of a user over a date range (pending count, totals and
+    optional breakdown in one query), from the daily rollups when both dates are given.
+    Returns:
+    - (data, status_code): the response body and HTTP status.
+    '''
+    queryset, aggregates, choices = _metrics_source(user, start_date, end_date)
+    totals, breakdown = _metrics(queryset, group_by, aggregates, choices)
+    return _metrics_result(totals, breakdown, start_date, end_date, group_by)
+
+async def acompute_metrics(user, start_date, end_date, group_by=None):
+    '''
+    Async version of compute_metrics, using the async ORM.
+    '''
+    queryset, aggregates, choices = _metrics_source(user, start_date, end_date)
+    totals, breakdown = await _ametrics(queryset, group_by, aggregates, choices)
+    return _metrics_result(totals, breakdown, start_date, end_date, group_by)
+
+def format_duration(total_duration):
+    '''
+    Converts a summed timedelta to HH:MM:SS, "00:00:00" when there is nothing to sum.
+    '''
+    if total_duration:
+        return seconds_to_HHMMSS(total_duration.total_seconds())
+    return "00:00:00"
+
+def format_bucket(row):
+    '''
+    Formats one group_by bucket for the metrics response.
+    '''
+    return {
+        "period": row['period'],
+        "total_duration": format_duration(row['total_duration']),
+        "total_distance": row['total_distance'],
+        "total_calories_burned": row['total_calories_burned'],
+    }
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    Workout = apps.get_model('activity', 'Workout')
+    WorkoutDailyRollup = apps.get_model('activity', 'WorkoutDailyRollup')
+    rows = (Workout.objects
+            .annotate(day=TruncDate('date'))
+            .values('user_id', 'day', 'activity_type')
+            .annotate(
+                workout_count=Count('id'),
+                pending_count=Count('id', filter=Q(duration__isnull=True)),
+                total_duration=Sum('duration'),
+                total_distance=Sum('distance'),
+                total_calories_burned=Sum('calories_burned'))
+            .order_by())
+    WorkoutDailyRollup.objects.bulk_create((WorkoutDailyRollup(**row) for row in rows.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0005_alter_workout_activity_type'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkoutDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('activity_type', models.CharField(choices=[('Walking', 'Walking at moderate speed (4 km/h)'), ('Skipping', 'Jumping rope, light workout'), ('Running', 'Running at 9.6 km/h'), ('Cycling', 'Cycling at a moderate pace'), ('Weightlifting', 'Light/moderate effort Weight Training')], max_length=50)),
+                ('workout_count', models.IntegerField(default=0)),
+                ('pending_count', models.IntegerField(default=0)),
+                ('total_duration', models.DurationField(blank=True, null=True)),
+                ('total_distance', models.FloatField(blank=True, null=True)),
+                ('total_calories_burned', models.FloatField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='workout_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'day', 'activity_type'), name='unique_workout_daily_rollup')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
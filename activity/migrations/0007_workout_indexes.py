@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0006_workoutdailyrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(fields=['user_id', 'date'], name='workout_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(fields=['user_id', 'activity_type', 'date'], name='workout_user_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(condition=models.Q(('duration__isnull', True)), fields=['user_id', 'date'], name='workout_user_pending_idx'),
+        ),
+    ]
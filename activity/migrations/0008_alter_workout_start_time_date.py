@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0007_workout_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='workout',
+            name='start_time',
+            field=models.DateTimeField(default=django.utils.timezone.now, null=True),
+        ),
+        migrations.AlterField(
+            model_name='workout',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
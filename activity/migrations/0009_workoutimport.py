@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-18 11:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0008_alter_workout_start_time_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkoutImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checksum', models.CharField(max_length=64)),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('running', 'Import in progress or interrupted'), ('completed', 'All rows processed')], default='running', max_length=20)),
+                ('rows_processed', models.PositiveIntegerField(default=0)),
+                ('rows_imported', models.PositiveIntegerField(default=0)),
+                ('rows_failed', models.PositiveIntegerField(default=0)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='workout_imports', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'checksum'), name='unique_workout_import')],
+            },
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:00
+
+from datetime import date, timezone as dt_timezone
+
+from django.db import migrations
+from django.db.migrations.exceptions import IrreversibleError
+from django.utils import timezone
+
+# Copies of the partition helpers of activity/partitions.py as they were when this migration was
+# written, so later changes to the app code cannot change what it does.
+TABLE = 'activity_workout'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def partition_bounds(month):
+    return f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00+00') TO ('{add_months(month, 1):%Y-%m-%d} 00:00+00')"
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [TABLE])
+    return cursor.fetchone()[0] == 'p'
+
+
+def partition_workout_table(apps, schema_editor):
+    '''
+    Rebuilds activity_workout as a table range-partitioned by month on `date` (PostgreSQL only).
+    The primary key becomes (id, date), as PostgreSQL requires the partition key in it; ids keep
+    coming from a sequence, and the existing indexes and foreign keys are recreated on the new table.
+
+    This is an offline rewrite: the table is locked against writes (reads still work) while every
+    row is copied with INSERT ... SELECT and its indexes are rebuilt, all in the migration's
+    transaction, and the final swap takes an exclusive lock. The time is roughly that of copying
+    the table and building its indexes, so on large histories run it in a maintenance window with
+    the API stopped or read-only, and budget disk for a second copy of the table until it commits.
+    '''
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            return
+        # block writes until the copy replaces the table, so no row committed meanwhile is lost
+        cursor.execute(f"LOCK TABLE {TABLE} IN EXCLUSIVE MODE")
+
+        # indexes (except the primary key) and foreign keys to recreate
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p')",
+            [TABLE, TABLE])
+        index_definitions = [definition for definition, in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE])
+        foreign_keys = cursor.fetchall()
+        cursor.execute(f"SELECT min(date), max(date), max(id) FROM {TABLE}")
+        first_date, last_date, last_id = cursor.fetchone()
+
+        # monthly partitions covering the existing rows up to three months ahead, plus a default one
+        current = timezone.now().date().replace(day=1)
+        month = first_date.astimezone(dt_timezone.utc).date().replace(day=1) if first_date else current
+        last = max(last_date.astimezone(dt_timezone.utc).date().replace(day=1) if last_date else current, current)
+        new_table = f'{TABLE}_partitioned'
+        cursor.execute(f"CREATE TABLE {new_table} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE (date)")
+        while month <= add_months(last, 3):
+            cursor.execute(f"CREATE TABLE {partition_name(month)} PARTITION OF {new_table} {partition_bounds(month)}")
+            month = add_months(month, 1)
+        cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {new_table} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {new_table} SELECT * FROM {TABLE}")
+        cursor.execute(f"DROP TABLE {TABLE}")
+        cursor.execute(f"ALTER TABLE {new_table} RENAME TO {TABLE}")
+
+        cursor.execute(f"CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+        cursor.execute(f"SELECT setval('{TABLE}_id_seq', %s, %s)", [last_id or 1, last_id is not None])
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')")
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, date)")
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}")
+        for definition in index_definitions:
+            cursor.execute(definition)
+        cursor.execute(f"ANALYZE {TABLE}")
+
+
+def unpartition_workout_table(apps, schema_editor):
+    '''
+    Not supported: going back to 0009 would need the partitions (including any detached ones)
+    copied back into a plain table with its single-column primary key, another offline rewrite.
+    '''
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    raise IrreversibleError("0010_partition_workout cannot be reversed: activity_workout stays partitioned by month")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0009_workoutimport'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_workout_table, unpartition_workout_table),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-18 13:00
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0010_partition_workout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workout',
+            name='route',
+            field=django.contrib.gis.db.models.fields.LineStringField(blank=True, null=True, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='route_times',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
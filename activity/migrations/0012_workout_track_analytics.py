@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0011_workout_route'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workout',
+            name='route_elevations',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='moving_time',
+            field=models.DurationField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='elevation_gain',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:00
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+def simplify_existing_routes(apps, schema_editor):
+    Workout = apps.get_model('activity', 'Workout')
+    workouts = Workout.objects.filter(route__isnull=False).only('id', 'route')
+    for workout in workouts.iterator(chunk_size=500):
+        Workout.objects.filter(pk=workout.pk).update(
+            route_medium=workout.route.simplify(5 / 111320, preserve_topology=False),
+            route_low=workout.route.simplify(25 / 111320, preserve_topology=False))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0012_workout_track_analytics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workout',
+            name='route_medium',
+            field=django.contrib.gis.db.models.fields.LineStringField(blank=True, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='workout',
+            name='route_low',
+            field=django.contrib.gis.db.models.fields.LineStringField(blank=True, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.RunPython(simplify_existing_routes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 16:00
+
+import django.contrib.gis.db.models.fields
+from django.contrib.gis.geos import Point
+from django.db import migrations
+
+
+def set_start_points(apps, schema_editor):
+    Workout = apps.get_model('activity', 'Workout')
+    workouts = Workout.objects.filter(route__isnull=False, start_point__isnull=True).only('id', 'route')
+    for workout in workouts.iterator(chunk_size=500):
+        lon, lat = workout.route.coords[0]
+        Workout.objects.filter(pk=workout.pk).update(start_point=Point(lon, lat, srid=4326))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activity', '0013_workout_route_resolutions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workout',
+            name='start_point',
+            field=django.contrib.gis.db.models.fields.PointField(blank=True, geography=True, null=True, srid=4326),
+        ),
+        migrations.RunPython(set_start_points, migrations.RunPython.noop),
+    ]
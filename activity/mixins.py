@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from .cache import workout_validators
+
+class ConditionalGetMixin:
+    '''
+    Adds ETag / Last-Modified validators to GET responses of views serving a user's workout data.
+    Requests whose If-None-Match / If-Modified-Since still match get a 304 Not Modified before
+    the view runs any query or serializer. The validators come from the per-user marker that is
+    moved on every Workout write (see activity/cache.py); without a shared metrics cache there are
+    no validators and responses are always computed.
+    Views also using ReplicaReadMixin must list this mixin first: with validators on, their reads
+    stay on the primary.
+    '''
+    #responses are labelled (ETag, cached metrics) with versions moved when the primary commits: rows
+    #read from a lagging replica, or by a worker that missed the user's primary pin, would be
+    #labelled as current and served until the next write
+    def allow_replica_read(self, request):
+        return not settings.METRICS_CACHE_ENABLED and super().allow_replica_read(request)
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = workout_validators(request.user.id)
+        if etag is None:
+            return super().get(request, *args, **kwargs)
+        etag = f'{etag[:-1]}-{request.accepted_renderer.format}"' #one validator per representation
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
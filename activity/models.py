@@ -1,5 +1,6 @@
 from django.contrib.gis.db import models
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -10,16 +11,23 @@ class Workout(models.Model):
     Fields:
     - user_id: Foreign key linking the workout to a user.
     - activity_type: The type of workout activity (e.g., Walking, Running).
-    - start_time: The timestamp when the workout started (automatically set when the workout is created).
+    - start_time: The timestamp when the workout started (defaults to when the workout is created).
     - end_time: The timestamp when the workout ended.
     - duration: The total duration of the workout (calculated based on start_time and end_time).
     - distance: The distance covered during the workout (optional, for activities like running or cycling).
     - calories_burned: The total calories burned during the workout (calculated based on MET values).
-    - date: The date when the workout was created (automatically set when the workout is created).
+    - date: The date when the workout was created (defaults to when the workout is created).
+    - route: The GPS track as a LineString of (lon, lat) points (optional, see activity/tracks.py).
+    - route_times: The timestamps of the route points, delta-encoded (see activity/tracks.py).
+    - route_elevations: The elevations of the route points (see activity/tracks.py).
+    - route_medium, route_low: The route simplified for map clients, precomputed at ingest.
+    - start_point: The first point of the route, as a geography for radius queries in meters.
+    - moving_time: The time spent moving along the route, pauses excluded (set from the GPS track).
+    - elevation_gain: The total climb along the route in meters (set from the GPS track).
     
     Methods:
-    - calculate_calories: Calculates calories burned based on the user's weight, the workout duration, 
-                          and the activity's MET value.
+    - calculate_calories: Calculates calories burned based on the user's weight, the workout duration 
+                          (moving time for tracked workouts), the activity's MET value and the climb.
     '''
     ACTIVITY_TYPE = [
         ('Walking', "Walking at moderate speed (4 km/h)"),
@@ -28,15 +36,45 @@ class Workout(models.Model):
         ('Cycling', "Cycling at a moderate pace"),
         ('Weightlifting', "Light/moderate effort Weight Training"),
     ]
+
+    #set default MET values for activity types
+    MET_VALUES = {
+        "Walking": 3.0,
+        "Skipping": 10.0,
+        "Running": 9.8,
+        "Cycling": 6.0,
+        "Weightlifting": 4.7,
+    }
+
+    #kcal per kg of body weight per meter climbed: the work against gravity (9.81 J/kg/m)
+    #at ~25% muscular efficiency, 4184 J per kcal
+    CLIMB_CALORIES = 9.81 / (0.25 * 4184)
     
     user_id = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity')
     activity_type = models.CharField(max_length=50, choices=ACTIVITY_TYPE)
-    start_time = models.DateTimeField(auto_now_add=True, null=True)
+    start_time = models.DateTimeField(default=timezone.now, null=True) #settable for uploaded historical workouts
     end_time = models.DateTimeField(null=True, blank=True)
     duration = models.DurationField(null=True, blank=True) #duration of activity
     distance = models.FloatField(null=True, blank=True) #distance in meters                (refactor later)
     calories_burned = models.FloatField(null=True, blank=True) #calories burned
-    date = models.DateTimeField(auto_now_add=True)
+    date = models.DateTimeField(default=timezone.now)
+    route = models.LineStringField(srid=4326, null=True, blank=True) #GPS track, one row per workout instead of per point (GiST indexed)
+    route_times = models.BinaryField(null=True, blank=True) #timestamps of the route points
+    route_elevations = models.BinaryField(null=True, blank=True) #elevations of the route points
+    route_medium = models.LineStringField(srid=4326, null=True, blank=True, spatial_index=False) #route simplified to ~5 m
+    route_low = models.LineStringField(srid=4326, null=True, blank=True, spatial_index=False) #route simplified to ~25 m
+    start_point = models.PointField(geography=True, srid=4326, null=True, blank=True) #GiST indexed, see WorkoutFilter.near
+    moving_time = models.DurationField(null=True, blank=True) #time moving along the route
+    elevation_gain = models.FloatField(null=True, blank=True) #meters climbed along the route
+
+    class Meta:
+        # every view filters by user first, then by date / activity type (see WorkoutFilter)
+        indexes = [
+            models.Index(fields=['user_id', 'date'], name='workout_user_date_idx'),
+            models.Index(fields=['user_id', 'activity_type', 'date'], name='workout_user_type_date_idx'),
+            # pending workouts (not finished yet) checked before running metrics
+            models.Index(fields=['user_id', 'date'], name='workout_user_pending_idx', condition=models.Q(duration__isnull=True)),
+        ]
         
     def calculate_calories(self):
         '''
@@ -51,19 +89,63 @@ class Workout(models.Model):
             weight = 1 #default value for weight
 
         duration_in_seconds = (self.end_time - self.start_time).total_seconds() #calculate duration and convert to seconds
+        if self.moving_time is not None:
+            duration_in_seconds = self.moving_time.total_seconds() #tracked workouts: pauses burn no activity METs
 
-        #set default MET values for activity types
-        MET_VALUES = {
-            "Walking": 3.0,
-            "Skipping": 10.0,
-            "Running": 9.8,
-            "Cycling": 6.0,
-            "Weightlifting": 4.7,
-        }
-
-        met_value = MET_VALUES.get(self.activity_type, 1.0) #get MET values, else default MET value is 1.0
+        met_value = self.MET_VALUES.get(self.activity_type, 1.0) #get MET values, else default MET value is 1.0
         duration = duration_in_seconds / 60 #convert duration from seconds to minutes
 
         # Calculate calories burned using the MET formula
         calories_burned = met_value * 3.5 * weight * duration / 200
-        return calories_burned  
\ No newline at end of file
+        if self.elevation_gain:
+            calories_burned += self.CLIMB_CALORIES * weight * self.elevation_gain #work of climbing
+        return calories_burned
+
+class WorkoutDailyRollup(models.Model):
+    '''
+    Pre-aggregated workout totals per user, day and activity type.
+    Kept up to date incrementally by the Workout signals (see activity/rollups.py) so that
+    metrics over a date range cost O(days) instead of O(workouts).
+    Can be rebuilt from the raw workouts with `manage.py rebuild_workout_rollups`.
+    '''
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='workout_rollups')
+    day = models.DateField()
+    activity_type = models.CharField(max_length=50, choices=Workout.ACTIVITY_TYPE)
+    workout_count = models.IntegerField(default=0)
+    pending_count = models.IntegerField(default=0) #workouts without a duration yet
+    total_duration = models.DurationField(null=True, blank=True)
+    total_distance = models.FloatField(null=True, blank=True)
+    total_calories_burned = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'activity_type'], name='unique_workout_daily_rollup'),
+        ]
+
+
+class WorkoutImport(models.Model):
+    '''
+    Checkpoint of a bulk import of historical workouts from a CSV/NDJSON file.
+    Imports are identified by the user and the file checksum; rows_processed is advanced in the
+    same transaction as each inserted chunk, so an interrupted import resumes from the last chunk
+    when the same file is imported again.
+    '''
+    STATUS = [
+        ('running', "Import in progress or interrupted"),
+        ('completed', "All rows processed"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='workout_imports')
+    checksum = models.CharField(max_length=64) #sha256 of the file
+    file_name = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS, default='running')
+    rows_processed = models.PositiveIntegerField(default=0) #rows read, valid or not
+    rows_imported = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'checksum'], name='unique_workout_import'),
+        ]
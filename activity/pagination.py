@@ -0,0 +1,40 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+# Order of workout lists in every pagination mode (sync and async), newest first
+WORKOUT_LIST_ORDERING = ('-date', '-id')
+
+class WorkoutCursorPagination(CursorPagination):
+    '''
+    Keyset (cursor) pagination for workout lists, newest first, ordered by (date, id).
+
+    Each page is fetched with a `date < <cursor>` predicate and a LIMIT instead of an OFFSET,
+    so page N costs the same as page 1 (served by the (user_id, date) index).
+    Rows sharing the same date are separated by id and DRF's cursor offset.
+
+    The total count needs a COUNT(*) over the whole filtered set, so it is only included
+    when the request asks for it with `?count=true`.
+    '''
+    ordering = WORKOUT_LIST_ORDERING
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'true':
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.count is None:
+            return super().get_paginated_response(data)
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count'] = {'type': 'integer', 'example': 123}
+        return response_schema
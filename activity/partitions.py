@@ -0,0 +1,98 @@
+from datetime import date
+from django.db import connection, transaction
+
+# Monthly range partitions of the workout table on `date` (PostgreSQL only, see migration 0010).
+# Partitions are named activity_workout_pYYYYMM; rows outside every partition land in
+# activity_workout_default until their month's partition is created.
+TABLE = 'activity_workout'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+def add_months(month, count):
+    '''
+    Returns the first day of the month `count` months after (or before) `month`.
+    '''
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+def partition_bounds(month):
+    return f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00+00') TO ('{add_months(month, 1):%Y-%m-%d} 00:00+00')"
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [TABLE])
+    return cursor.fetchone()[0] == 'p'
+
+def list_partitions(cursor):
+    '''
+    Returns the first day of the month of every attached monthly partition.
+    '''
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = %s::regclass", [TABLE])
+    prefix = f'{TABLE}_p'
+    return sorted(
+        date(int(name[-6:-2]), int(name[-2:]), 1)
+        for name, in cursor.fetchall() if name.startswith(prefix) and name[len(prefix):].isdigit())
+
+def create_partition(cursor, month):
+    '''
+    Creates the partition of a month. Rows of that month already sitting in the default
+    partition are moved into it before it is attached.
+    '''
+    name = partition_name(month)
+    start, end = f'{month:%Y-%m-%d} 00:00+00', f'{add_months(month, 1):%Y-%m-%d} 00:00+00'
+    with transaction.atomic():
+        cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s)", [start, end])
+        if not cursor.fetchone()[0]:
+            cursor.execute(f"CREATE TABLE {name} PARTITION OF {TABLE} {partition_bounds(month)}")
+            return
+        cursor.execute(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= %s AND date < %s RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved", [start, end])
+        cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} {partition_bounds(month)}")
+
+def detach_partition(cursor, month):
+    '''
+    Detaches a month's partition. The table is kept as a standalone archive (to dump or drop by
+    hand) and its workouts no longer appear in the API. Its copy of the user foreign key is
+    dropped, otherwise deleting a user with archived workouts would fail on it.
+    Returns:
+    - user_ids: Type list of the ids of users with workouts in the detached month, whose daily
+                rollups must be rebuilt (see maintain_partitions).
+    '''
+    name = partition_name(month)
+    cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+    cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'", [name])
+    for constraint, in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE {name} DROP CONSTRAINT "{constraint}"')
+    cursor.execute(f"SELECT DISTINCT user_id_id FROM {name}")
+    return [user_id for user_id, in cursor.fetchall()]
+
+def maintain_partitions(today, months_ahead=3, retain_months=None):
+    '''
+    Creates the partitions from the current month up to `months_ahead` months ahead and, when
+    `retain_months` is set, detaches partitions of months older than that.
+    The caller must rebuild the rollups of the returned users (and invalidate their cached
+    metrics), so metrics stop counting detached workouts; see the workout_partitions command.
+    Returns:
+    - (created, detached, user_ids): Type lists of partition names and of affected user ids.
+    '''
+    current = today.replace(day=1)
+    created, detached, user_ids = [], [], set()
+    with connection.cursor() as cursor:
+        existing = set(list_partitions(cursor))
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if month not in existing:
+                create_partition(cursor, month)
+                created.append(partition_name(month))
+        if retain_months is not None:
+            oldest = add_months(current, -retain_months)
+            for month in sorted(existing):
+                if month < oldest:
+                    user_ids.update(detach_partition(cursor, month))
+                    detached.append(partition_name(month))
+    return created, detached, sorted(user_ids)
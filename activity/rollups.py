@@ -0,0 +1,127 @@
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count, F, Q, QuerySet, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .models import Workout, WorkoutDailyRollup
+
+# Workout fields a rollup row depends on, and their attribute names on an instance
+ROLLUP_FIELDS = ('user_id', 'date', 'activity_type', 'duration', 'distance', 'calories_burned')
+ROLLUP_ATTNAMES = {'user_id_id', 'date', 'activity_type', 'duration', 'distance', 'calories_burned'}
+
+# Rollup totals and the value they start from when a row is incremented
+ROLLUP_TOTALS = {
+    'workout_count': 0,
+    'pending_count': 0,
+    'total_duration': timedelta(0),
+    'total_distance': 0.0,
+    'total_calories_burned': 0.0,
+}
+
+def rollup_state(workout):
+    '''
+    Snapshots the workout values a rollup row depends on.
+    '''
+    return {
+        'user_id': workout.user_id_id,
+        'date': workout.date,
+        'activity_type': workout.activity_type,
+        'duration': workout.duration,
+        'distance': workout.distance,
+        'calories_burned': workout.calories_burned,
+    }
+
+def workout_contribution(state):
+    '''
+    Returns the (key, values) a single workout snapshot (see rollup_state) adds to its daily
+    rollup row, where key is (user id, day, activity type).
+    '''
+    key = (state['user_id'], timezone.localtime(state['date']).date(), state['activity_type'])
+    values = {
+        'workout_count': 1,
+        'pending_count': 1 if state['duration'] is None else 0,
+        'total_duration': state['duration'],
+        'total_distance': state['distance'],
+        'total_calories_burned': state['calories_burned'],
+    }
+    return key, values
+
+def apply_contributions(changes):
+    '''
+    Applies workout contributions to the rollup table.
+    Arguments:
+    - changes: iterable of (state, sign) pairs, where state is a rollup_state() snapshot and
+               sign is 1 to add a workout and -1 to remove it.
+    Changes hitting the same rollup row are merged so each row is written once. Rows left empty
+    are deleted; an update finding its row deleted meanwhile recreates it, so no contribution is lost.
+    '''
+    merged = {}
+    for state, sign in changes:
+        key, values = workout_contribution(state)
+        totals = merged.setdefault(key, {})
+        for field, value in values.items():
+            if value is None:
+                continue
+            value = value * sign
+            totals[field] = totals[field] + value if field in totals else value
+
+    with transaction.atomic():
+        for (user_id, day, activity_type), totals in merged.items():
+            if not any(totals.values()):
+                continue #changes cancel out (e.g. an edit that kept the same totals)
+            updates = {
+                field: Coalesce(F(field), Value(ROLLUP_TOTALS[field])) + Value(value)
+                for field, value in totals.items()
+            }
+            while True:
+                rollup, _ = WorkoutDailyRollup.objects.get_or_create(user_id=user_id, day=day, activity_type=activity_type)
+                rows = WorkoutDailyRollup.objects.filter(pk=rollup.pk)
+                if rows.update(**updates):
+                    break
+                #a concurrent removal emptied and deleted the row after it was read: create it again
+            if totals.get('workout_count', 0) < 0:
+                rows.filter(workout_count__lte=0).delete() #drop rows left empty
+
+def add_workouts(workouts):
+    '''
+    Adds workouts that were written without signals (e.g. bulk_create) to the rollups.
+    '''
+    apply_contributions((rollup_state(workout), 1) for workout in workouts)
+
+def is_workout_deletion(origin):
+    '''
+    Checks whether a delete was started on workouts themselves. Deletes cascading from a user
+    also remove that user's rollups, so they must not be decremented.
+    '''
+    if isinstance(origin, QuerySet):
+        return origin.model is Workout
+    return isinstance(origin, Workout)
+
+def rebuild_rollups(user_ids=None):
+    '''
+    Recomputes the rollup table from raw workouts, for all users or only the given user ids.
+    Returns:
+    - count: Type Int, the number of rollup rows written.
+    '''
+    workouts = Workout.objects.all()
+    rollups = WorkoutDailyRollup.objects.all()
+    if user_ids is not None:
+        workouts = workouts.filter(user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+
+    rows = (workouts
+            .annotate(day=TruncDate('date'))
+            .values('user_id', 'day', 'activity_type')
+            .annotate(
+                workout_count=Count('id'),
+                pending_count=Count('id', filter=Q(duration__isnull=True)),
+                total_duration=Sum('duration'),
+                total_distance=Sum('distance'),
+                total_calories_burned=Sum('calories_burned'))
+            .order_by())
+
+    with transaction.atomic():
+        rollups.delete()
+        created = WorkoutDailyRollup.objects.bulk_create(
+            (WorkoutDailyRollup(**row) for row in rows.iterator()), batch_size=1000)
+    return len(created)
@@ -1,3 +1,5 @@
+from django.utils import timezone
+from django.utils.duration import duration_string
 from rest_framework import serializers
 from .models import Workout
 
@@ -16,8 +18,10 @@ class WorkoutSerializer(serializers.ModelSerializer):
             'duration',
             'distance',
             'calories_burned', 
+            'moving_time',
+            'elevation_gain',
             'date']
-        read_only_fields = ['duration', 'calories_burned', 'end_time'] # No manual edits can be done during creates & updates
+        read_only_fields = ['duration', 'calories_burned', 'end_time', 'start_time', 'moving_time', 'elevation_gain', 'date'] # No manual edits can be done during creates & updates
 
         def validate(self, data):
             if self.context['request'].method == "POST" or self.context['request'].method == "PUT":
@@ -32,6 +36,29 @@ class WorkoutSerializer(serializers.ModelSerializer):
                 instance.save()
                 return instance
 
+class WorkoutBulkSerializer(serializers.ModelSerializer):
+    '''
+    This serializer validates one finished workout of a batch upload (e.g. a wearable sync).
+    Unlike WorkoutSerializer, start and end time come from the client; duration and
+    calories burned are computed on insert.
+    '''
+    class Meta:
+        model = Workout
+        fields = [
+            'activity_type',
+            'start_time',
+            'end_time',
+            'distance']
+        extra_kwargs = {
+            'start_time': {'required': True, 'allow_null': False},
+            'end_time': {'required': True, 'allow_null': False},
+        }
+
+    def validate(self, data):
+        if data['end_time'] < data['start_time']:
+            raise serializers.ValidationError({'end_time': "end time cannot be before start time!"})
+        return data
+
 class WorkoutListSerializer(serializers.ModelSerializer):
     '''
     This serializer is used to display a summary of workout entries in list and detail views. 
@@ -46,4 +73,36 @@ class WorkoutListSerializer(serializers.ModelSerializer):
             'duration',
             'distance', 
             'calories_burned', 
-            'date']
\ No newline at end of file
+            'date']
+
+def _datetime_representation(value):
+    # same as DRF's DateTimeField: convert to the current timezone, ISO 8601 with a 'Z' for UTC
+    value = value.astimezone(timezone.get_current_timezone()).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+# WorkoutListSerializer fields and the converter matching each field's to_representation
+WORKOUT_LIST_CONVERTERS = (
+    ('id', int),
+    ('activity_type', str),
+    ('duration', duration_string),
+    ('distance', float),
+    ('calories_burned', float),
+    ('date', _datetime_representation),
+)
+WORKOUT_LIST_FIELDS = tuple(field for field, _ in WORKOUT_LIST_CONVERTERS)
+
+def workout_list_representation(rows):
+    '''
+    Fast path for WorkoutListSerializer(many=True).data on hot read endpoints.
+    Takes `.values_list(*WORKOUT_LIST_FIELDS)` rows instead of model instances and builds the dicts
+    with precomputed per-field converters, skipping DRF's per-field dispatch. The output is identical
+    to WorkoutListSerializer's (same keys, order, None handling and formatting).
+    '''
+    converters = [converter for _, converter in WORKOUT_LIST_CONVERTERS]
+    return [
+        {field: None if value is None else converter(value)
+         for field, converter, value in zip(WORKOUT_LIST_FIELDS, converters, row)}
+        for row in rows
+    ]
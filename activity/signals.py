@@ -1,10 +1,49 @@
 from .models import Workout
-from django.db.models.signals import pre_save, post_save
+from .cache import mark_workouts_changed
+from .rollups import ROLLUP_FIELDS, ROLLUP_ATTNAMES, rollup_state, apply_contributions, is_workout_deletion
+from django.db.models.signals import pre_save, post_save, post_delete, post_init
 from django.dispatch import receiver
 from django.utils import timezone
 
+# This signal remembers what a workout loaded from the database contributes to the daily rollups,
+# so saving it later does not need to re-read the stored row
+@receiver(post_init, sender=Workout)
+def RememberWorkoutRollup(sender, instance, **kwargs):
+    instance._rollup_previous = None
+    if instance.pk is not None and not ROLLUP_ATTNAMES & instance.get_deferred_fields():
+        instance._rollup_previous = rollup_state(instance)
+
 # This signal calculates the duration of a workout when it's updated
 @receiver(pre_save, sender=Workout)
 def EndWorkout(sender, instance, **kwargs):
     if instance.end_time:
-        instance.duration = instance.end_time - instance.start_time
\ No newline at end of file
+        instance.duration = instance.end_time - instance.start_time
+    # instances loaded with deferred fields have no snapshot: read the stored row
+    if instance.pk and instance._rollup_previous is None:
+        previous = Workout.objects.only(*ROLLUP_FIELDS).filter(pk=instance.pk).first()
+        instance._rollup_previous = rollup_state(previous) if previous else None
+
+# This signal moves the workout's totals into the daily rollups once it's saved
+@receiver(post_save, sender=Workout)
+def UpdateWorkoutRollup(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    state = rollup_state(instance)
+    changes = [(state, 1)]
+    if instance._rollup_previous is not None:
+        changes.append((instance._rollup_previous, -1))
+    apply_contributions(changes)
+    instance._rollup_previous = state
+
+# This signal removes a deleted workout from the daily rollups
+@receiver(post_delete, sender=Workout)
+def RemoveWorkoutRollup(sender, instance, origin=None, **kwargs):
+    if is_workout_deletion(origin):
+        apply_contributions([(rollup_state(instance), -1)])
+
+# This signal invalidates the user's cached metrics and conditional GET validators whenever
+# one of their workouts changes
+@receiver(post_save, sender=Workout)
+@receiver(post_delete, sender=Workout)
+def InvalidateWorkoutMetrics(sender, instance, **kwargs):
+    mark_workouts_changed(instance.user_id_id)
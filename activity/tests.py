@@ -1,12 +1,1018 @@
-#from django.test import TestCase
-from django.utils.dateparse import parse_date
-from datetime import datetime
+import asyncio
+import io
+import json
+import re
+from datetime import date, datetime, time, timedelta
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import LineString, Point
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.authentication import user_cache
+from fitness_api.db_routers import ReplicaRouter, _read_database, pin_to_primary
+from .analytics import haversine, track_analytics
+from .cache import METRICS_CACHE_ALIAS, get_metrics_version
+from .calories import calculate_calories_batch, recompute_calories
+from .filters import WorkoutFilter
+from .importers import import_workouts
+from .live import (CLOSE_IN_USE, CLOSE_NORMAL, CLOSE_UNAUTHORIZED, LiveSession, SessionLock, flush_session,
+                   live_session_application)
+from .metrics import GROUP_BY_CHOICES, _metrics_source, compute_metrics, metrics_queryset
+from .models import Workout, WorkoutDailyRollup, WorkoutImport
+from .rollups import add_workouts, rebuild_rollups
+from .serializers import WORKOUT_LIST_FIELDS, WorkoutListSerializer, workout_list_representation
+from .tracks import MAX_POINT_TIME, parse_trackpoints
+from .views import WorkoutBulkCreateView
 
-# Create your tests here.
+User = get_user_model()
 
-date = "2024-10-02"
-convert = parse_date(date)
+# Query budgets of the workout endpoints. Requests are authenticated with force_authenticate and a
+# user loaded with its profile (what CachedJWTAuthentication caches), so the counts only cover the
+# views. Tests run inside a transaction, so every transaction.atomic() block of a view also counts
+# a SAVEPOINT and a RELEASE SAVEPOINT, and get_or_create a SAVEPOINT pair around its INSERT.
+# Rollup bookkeeping for a workout whose daily rollup row exists (see activity/rollups.py):
+# SAVEPOINT, SELECT rollup, UPDATE rollup, RELEASE
+ROLLUP_UPDATE_QUERIES = 4
 
-date_ = datetime(convert.year, convert.month, convert.day)
+def create_workout(user, start_time, **fields):
+    '''
+    Creates a finished one-hour run (through save(), so its rollup row is written) at start_time.
+    '''
+    fields = {
+        'activity_type': 'Running',
+        'end_time': start_time + timedelta(hours=1),
+        'distance': 5000.0,
+        'date': start_time,
+        **fields,
+    }
+    return Workout.objects.create(user_id=user, start_time=start_time, **fields)
 
-print(date_)
\ No newline at end of file
+@override_settings(SECURE_SSL_REDIRECT=False, DATABASE_REPLICAS=[], METRICS_CACHE_ENABLED=False)
+class WorkoutTestCase(APITestCase):
+    '''
+    A user with one finished workout today, and the client authenticated as that user.
+    '''
+    def setUp(self):
+        user = User.objects.create_user(username='runner', password='secret-password')
+        self.user = User.objects.select_related('profile').get(pk=user.pk)
+        self.today = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        self.workout = create_workout(self.user, self.today)
+        self.client.force_authenticate(user=self.user)
+
+class WorkoutWriteQueryTests(WorkoutTestCase):
+    def test_create(self):
+        # INSERT workout + rollup update
+        with self.assertNumQueries(1 + ROLLUP_UPDATE_QUERIES):
+            response = self.client.post(reverse('workout-list-create'), {'activity_type': 'Running', 'distance': 3000}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_bulk_create_does_not_scale_with_batch_size(self):
+        # SAVEPOINT, one INSERT for the batch, rollup update (one per day and type), RELEASE
+        for size in (2, 50):
+            items = [{
+                'activity_type': 'Running',
+                'start_time': (self.today + timedelta(minutes=index)).isoformat(),
+                'end_time': (self.today + timedelta(minutes=index + 30)).isoformat(),
+                'distance': 1000 + index,
+            } for index in range(size)]
+            with self.assertNumQueries(2 + ROLLUP_UPDATE_QUERIES + 1):
+                response = self.client.post(reverse('workout-bulk-create'), items, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(len(response.data), size)
+
+    def _import(self, rows):
+        lines = ['activity_type,start_time,end_time,distance']
+        lines += [
+            f'Running,{self.today + timedelta(minutes=index)},{self.today + timedelta(minutes=index + 30)},{1000 + index}'
+            for index in range(rows)]
+        upload = SimpleUploadedFile(f'history-{rows}.csv', '\n'.join(lines).encode(), content_type='text/csv')
+        return self.client.post(reverse('workout-import'), {'file': upload}, format='multipart')
+
+    def test_import_does_not_scale_with_rows(self):
+        # checkpoint get_or_create (SELECT, SAVEPOINT, INSERT, RELEASE)
+        # + chunk (SAVEPOINT, lock checkpoint, INSERT workouts, rollup update, UPDATE checkpoint, RELEASE)
+        # + completion (SAVEPOINT, lock checkpoint, UPDATE checkpoint, RELEASE)
+        for rows in (3, 30):
+            with self.assertNumQueries(4 + 5 + ROLLUP_UPDATE_QUERIES + 4):
+                response = self._import(rows)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['rows_imported'], rows)
+
+    def test_import_of_a_completed_file_only_reads_the_checkpoint(self):
+        self._import(3)
+        with self.assertNumQueries(1):
+            response = self._import(3)
+        self.assertEqual(response.data['rows_read'], 0)
+
+    def test_put_finishes_a_pending_workout(self):
+        pending = create_workout(self.user, self.today + timedelta(hours=2), end_time=None)
+        # SELECT workout with the owner's profile, UPDATE workout, rollup update
+        with self.assertNumQueries(2 + ROLLUP_UPDATE_QUERIES):
+            response = self.client.put(reverse('workout-update', args=[pending.pk]), {'distance': 6000}, format='json')
+        self.assertEqual(response.status_code, 200)
+        pending.refresh_from_db()
+        self.assertIsNotNone(pending.duration)
+
+    def test_patch(self):
+        with self.assertNumQueries(2 + ROLLUP_UPDATE_QUERIES):
+            response = self.client.patch(reverse('workout-update', args=[self.workout.pk]), {'distance': 7000}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_track_upload(self):
+        start = self.today.timestamp()
+        points = [{'lat': 52.5 + index * 0.0005, 'lon': 13.4, 'time': start + index * 10, 'ele': 30.0 + index} for index in range(50)]
+        # SELECT workout with profile, UPDATE workout, rollup update
+        with self.assertNumQueries(2 + ROLLUP_UPDATE_QUERIES):
+            response = self.client.post(reverse('workout-track', args=[self.workout.pk]), {'points': points}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['points'], 50)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('workout-track', args=[self.workout.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_delete(self):
+        # SELECT workout, DELETE workout, rollup update and DELETE of the emptied rollup row
+        with self.assertNumQueries(2 + ROLLUP_UPDATE_QUERIES + 1):
+            response = self.client.delete(reverse('workout-delete', args=[self.workout.pk]))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(WorkoutDailyRollup.objects.filter(user=self.user).exists())
+
+class WorkoutBulkCreateTests(WorkoutTestCase):
+    def item(self, minutes=0, **fields):
+        return {
+            'activity_type': 'Running',
+            'start_time': (self.today + timedelta(minutes=minutes)).isoformat(),
+            'end_time': (self.today + timedelta(minutes=minutes + 30)).isoformat(),
+            'distance': 1000,
+            **fields,
+        }
+
+    def test_errors_are_reported_per_item(self):
+        items = [
+            self.item(0),
+            self.item(10, activity_type='Swimming'),
+            self.item(20, end_time=self.today.isoformat()),
+            {key: value for key, value in self.item(30).items() if key != 'start_time'},
+            self.item(40),
+        ]
+        rollups = list(WorkoutDailyRollup.objects.filter(user_id=self.user).values())
+        response = self.client.post(reverse('workout-bulk-create'), items, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.data), len(items))
+        self.assertEqual(response.data[0], {})
+        self.assertEqual(list(response.data[1]), ['activity_type'])
+        self.assertEqual(response.data[2], {'end_time': ["end time cannot be before start time!"]})
+        self.assertEqual(list(response.data[3]), ['start_time'])
+        self.assertEqual(response.data[4], {})
+        # nothing is saved, not even the valid items
+        self.assertEqual(Workout.objects.filter(user_id=self.user).count(), 1)
+        self.assertEqual(list(WorkoutDailyRollup.objects.filter(user_id=self.user).values()), rollups)
+
+    def test_empty_and_oversized_batches_are_rejected(self):
+        for items in ([], [self.item(index) for index in range(WorkoutBulkCreateView.max_batch_size + 1)]):
+            with self.subTest(size=len(items)):
+                response = self.client.post(reverse('workout-bulk-create'), items, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('non_field_errors', response.data)
+        self.assertEqual(Workout.objects.filter(user_id=self.user).count(), 1)
+
+class WorkoutImportTests(WorkoutTestCase):
+    def csv_content(self, rows):
+        lines = ['activity_type,start_time,end_time,distance']
+        lines += [
+            f'Running,{(self.today - timedelta(days=index + 1)).isoformat()},{(self.today - timedelta(days=index + 1, minutes=-30)).isoformat()},{1000 + index}'
+            for index in range(rows)]
+        return '\n'.join(lines).encode()
+
+    def upload(self, content, name='history.csv'):
+        upload = SimpleUploadedFile(name, content, content_type='text/csv')
+        return self.client.post(reverse('workout-import'), {'file': upload}, format='multipart')
+
+    def imported_workouts(self):
+        return Workout.objects.filter(user_id=self.user).exclude(pk=self.workout.pk)
+
+    def test_interrupted_import_resumes_without_duplicates(self):
+        content = self.csv_content(7)
+        chunks = []
+        def interrupt_second_chunk(workouts):
+            chunks.append(len(workouts))
+            if len(chunks) == 2:
+                raise RuntimeError("interrupted")
+            add_workouts(workouts)
+        with mock.patch('activity.importers.add_workouts', side_effect=interrupt_second_chunk):
+            with self.assertRaises(RuntimeError):
+                import_workouts(self.user, io.BytesIO(content), 'csv', chunk_size=3)
+        checkpoint = WorkoutImport.objects.get(user=self.user)
+        self.assertEqual((checkpoint.status, checkpoint.rows_processed, checkpoint.rows_imported), ('running', 3, 3))
+        self.assertEqual(self.imported_workouts().count(), 3) #the interrupted chunk was rolled back
+
+        result = import_workouts(self.user, io.BytesIO(content), 'csv', chunk_size=3)
+        self.assertEqual((result['status'], result['rows_read'], result['rows_imported']), ('completed', 4, 7))
+        workouts = self.imported_workouts()
+        self.assertEqual(workouts.count(), 7)
+        self.assertEqual(workouts.values('start_time').distinct().count(), 7)
+        self.assertEqual(WorkoutDailyRollup.objects.filter(user=self.user).count(), 8) #one per day, with today's
+
+    def test_invalid_rows_are_reported(self):
+        content = self.csv_content(2) + b'\nSwimming,not-a-date,,\nRunning,2024-01-02T10:00:00,2024-01-02T09:00:00,'
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['rows_imported'], response.data['rows_failed']), (2, 2))
+        self.assertEqual([error['line'] for error in response.data['errors']], [4, 5])
+
+    def test_file_that_is_not_utf8_is_rejected(self):
+        content = self.csv_content(2) + '\nRunning,2024-01-02T10:00:00,2024-01-02T11:00:00,1000 # Köln'.encode('latin-1')
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('file', response.data)
+        self.assertFalse(WorkoutImport.objects.exists())
+        self.assertEqual(self.imported_workouts().count(), 0)
+
+    def test_file_with_nul_bytes_is_rejected(self):
+        response = self.upload(self.csv_content(2).replace(b'Running', b'Run\x00ning', 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.imported_workouts().count(), 0)
+
+    def test_malformed_csv_is_rejected(self):
+        content = self.csv_content(1) + b'\nRunning,"' + b'x' * (200 * 1024) + b'",,' #over csv.field_size_limit()
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('line', response.data['file'][0])
+
+class WorkoutTrackTests(WorkoutTestCase):
+    def upload(self, times):
+        points = [{'lat': 52.5 + index * 0.0005, 'lon': 13.4, 'time': time} for index, time in enumerate(times)]
+        return self.client.post(reverse('workout-track', args=[self.workout.pk]), {'points': points}, format='json')
+
+    def test_times_outside_the_datetime_range_are_rejected(self):
+        start = self.today.timestamp()
+        for time in (1e17, -1, '0001-01-01T00:00:00Z', MAX_POINT_TIME / 1000 + 1):
+            with self.subTest(time=time):
+                response = self.upload([start, time])
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('point 1: time', response.data['points'][0])
+
+    def test_gap_too_large_to_encode_is_rejected(self):
+        start = self.today.timestamp()
+        response = self.upload([start, start + 50 * 24 * 3600])
+        self.assertEqual(response.status_code, 400)
+
+    def test_bounds_are_accepted(self):
+        self.assertEqual(parse_trackpoints([{'lat': 0, 'lon': 0, 'time': 0}])[0][0], 0)
+        self.assertEqual(parse_trackpoints([{'lat': 0, 'lon': 0, 'time': '9999-12-31T23:59:59Z'}])[0][0], MAX_POINT_TIME)
+
+class WorkoutRepresentationTests(WorkoutTestCase):
+    '''
+    The fast path (workout_list_representation over values_list rows) renders byte for byte
+    what WorkoutListSerializer renders for the same workouts.
+    '''
+    def setUp(self):
+        super().setUp()
+        start = self.today.replace(microsecond=123456)
+        for index, (activity_type, _) in enumerate(Workout.ACTIVITY_TYPE):
+            day = start - timedelta(days=index + 1)
+            create_workout(self.user, day, activity_type=activity_type, distance=None) #null distance
+            create_workout(self.user, day, activity_type=activity_type, end_time=day, distance=0.0) #zero duration
+            create_workout(self.user, day, activity_type=activity_type, end_time=day + timedelta(days=1, seconds=1.5),
+                           distance=1234.5, calories_burned=321.25) #over a day, with microseconds
+            create_workout(self.user, day, activity_type=activity_type, end_time=None) #pending: no duration
+
+    def assertSameRendering(self):
+        workouts = Workout.objects.filter(user_id=self.user).order_by('id')
+        expected = WorkoutListSerializer(workouts, many=True).data
+        fast = workout_list_representation(workouts.values_list(*WORKOUT_LIST_FIELDS))
+        self.assertEqual(fast, [dict(item) for item in expected])
+        self.assertEqual(JSONRenderer().render(fast), JSONRenderer().render(expected))
+
+    def test_same_as_the_serializer(self):
+        self.assertSameRendering()
+
+    def test_same_as_the_serializer_in_another_timezone(self):
+        for zone in ('Europe/Berlin', 'America/St_Johns', 'Asia/Kolkata'):
+            with self.subTest(zone=zone), timezone.override(zone):
+                self.assertSameRendering()
+
+    def test_views_serve_the_fast_path(self):
+        response = self.client.get(reverse('workout-detail', args=[self.workout.pk]))
+        self.assertEqual(response.data, dict(WorkoutListSerializer(Workout.objects.get(pk=self.workout.pk)).data))
+
+class WorkoutReadQueryTests(WorkoutTestCase):
+    def setUp(self):
+        super().setUp()
+        for index in range(1, 15):
+            create_workout(self.user, self.today - timedelta(days=index))
+
+    def test_list_page_pagination(self):
+        # COUNT + page
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('workout-list'), {'page': 2})
+        self.assertEqual(response.data['count'], 15)
+
+    def test_list_cursor_pagination(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('workout-list'), {'pagination': 'cursor'})
+        self.assertEqual(len(response.data['results']), 10)
+        with self.assertNumQueries(1):
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 5)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('workout-list'), {'pagination': 'cursor', 'count': 'true'})
+        self.assertEqual(response.data['count'], 15)
+
+    def test_list_modes_share_the_ordering(self):
+        tied = [create_workout(self.user, self.today).pk for _ in range(2)]
+        expected = list(Workout.objects.filter(user_id=self.user).order_by('-date', '-id').values_list('id', flat=True)[:10])
+        self.assertEqual(expected[:3], sorted(tied + [self.workout.pk], reverse=True))
+        page = self.client.get(reverse('workout-list')).data['results']
+        cursor = self.client.get(reverse('workout-list'), {'pagination': 'cursor'}).data['results']
+        self.client.force_authenticate(user=None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        asynchronous = self.client.get(reverse('async-workout-list')).json()['results']
+        for results in (page, cursor, asynchronous):
+            self.assertEqual([workout['id'] for workout in results], expected)
+
+    def test_list_filters(self):
+        with self.assertNumQueries(2):
+            self.client.get(reverse('workout-list'), {'activity_type': 'Running', 'date_range_after': self.today.date() - timedelta(days=3)})
+
+    def test_export(self):
+        # one server-side cursor, whatever the history size; rows are fetched as the response streams
+        for export_format in ('csv', 'ndjson'):
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse('workout-export', args=[export_format]))
+                content = b''.join(response.streaming_content)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(str(self.workout.pk).encode(), content)
+
+    def test_detail(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('workout-detail', args=[self.workout.pk]))
+        self.assertEqual(response.data['id'], self.workout.pk)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('workout-detail', args=[self.workout.pk]), {'resolution': 'low'})
+        self.assertIsNone(response.data['route'])
+
+    def test_metrics(self):
+        url = reverse('workout-metrics')
+        end_date = self.today.date() + timedelta(days=1)
+        # rollups (both dates), raw workouts (open range), with and without a breakdown: one query each
+        for params in ({'start_date': self.today.date() - timedelta(days=30), 'end_date': end_date},
+                       {'start_date': self.today.date() - timedelta(days=30), 'end_date': end_date, 'group_by': 'week'},
+                       {'group_by': 'activity_type'}):
+            with self.assertNumQueries(1):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+
+class WorkoutCursorPaginationTests(WorkoutTestCase):
+    '''
+    Cursor pages over workouts sharing the same date: every workout is listed once, in
+    (date, id) order newest first, whichever way the links are followed.
+    '''
+    def setUp(self):
+        super().setUp()
+        for index in range(24):
+            create_workout(self.user, self.today - timedelta(days=index % 3)) #8 workouts per date, 9 today
+        self.expected = list(Workout.objects.filter(user_id=self.user).order_by('-date', '-id').values_list('id', flat=True))
+
+    def ids(self, response):
+        return [workout['id'] for workout in response.data['results']]
+
+    def test_next_links_list_every_workout_once(self):
+        response = self.client.get(reverse('workout-list'), {'pagination': 'cursor', 'count': 'true'})
+        self.assertIsNone(response.data['previous'])
+        pages = [self.ids(response)]
+        while response.data['next']:
+            self.assertIn('count=true', response.data['next'])
+            response = self.client.get(response.data['next'])
+            self.assertEqual(response.data['count'], 25)
+            self.assertIsNotNone(response.data['previous'])
+            pages.append(self.ids(response))
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([workout for page in pages for workout in page], self.expected)
+
+    def test_previous_links_return_the_same_pages(self):
+        response = self.client.get(reverse('workout-list'), {'pagination': 'cursor'})
+        forward = [self.ids(response)]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            forward.append(self.ids(response))
+        backward = [self.ids(response)]
+        while response.data['previous']:
+            response = self.client.get(response.data['previous'])
+            backward.append(self.ids(response))
+        self.assertEqual(backward[::-1], forward)
+        self.assertIsNone(response.data['previous'])
+
+    def test_tied_dates_continue_on_the_next_page(self):
+        # the first page ends inside the 8 workouts of yesterday
+        first = self.client.get(reverse('workout-list'), {'pagination': 'cursor'})
+        second = self.client.get(first.data['next'])
+        tied = Workout.objects.filter(pk__in=[self.ids(first)[-1], self.ids(second)[0]]).values_list('date', flat=True)
+        self.assertEqual(len(set(tied)), 1)
+        self.assertEqual(self.ids(first)[-1], self.expected[9])
+        self.assertEqual(self.ids(second)[0], self.expected[10])
+
+@override_settings(METRICS_CACHE_ENABLED=True)
+class WorkoutCachedReadQueryTests(WorkoutTestCase):
+    '''
+    With a shared metrics cache (locmem stands in for it here), repeated reads cost no query.
+    '''
+    def setUp(self):
+        caches[METRICS_CACHE_ALIAS].clear()
+        super().setUp()
+
+    def test_metrics_cache_hit(self):
+        url = reverse('workout-metrics')
+        with self.assertNumQueries(1):
+            self.client.get(url, {'group_by': 'day'})
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'group_by': 'day'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get(self):
+        for url in (reverse('workout-list'), reverse('workout-detail', args=[self.workout.pk]), reverse('workout-metrics')):
+            etag = self.client.get(url)['ETag']
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+    def test_write_invalidates_validators(self):
+        url = reverse('workout-list')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('workout-update', args=[self.workout.pk]), {'distance': 7000}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_version_moves_when_the_write_commits(self):
+        version = get_metrics_version(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.workout.distance = 7000.0
+                self.workout.save()
+                self.assertEqual(get_metrics_version(self.user.id), version)
+            self.assertEqual(get_metrics_version(self.user.id), version) #outer transaction still open
+        self.assertNotEqual(get_metrics_version(self.user.id), version)
+
+@override_settings(DATABASE_REPLICAS=['replica_test'])
+class ReplicaRoutingTests(WorkoutTestCase):
+    '''
+    Reads routed to the replica alias that mirrors the primary in tests (see settings). It is a
+    separate connection, so it does not see the rows created in the test's uncommitted transaction:
+    an empty list means the read went to the replica.
+    '''
+    databases = {'default', 'replica_test'}
+
+    def setUp(self):
+        cache.clear() #primary pins
+        super().setUp()
+
+    def list_count(self, **params):
+        response = self.client.get(reverse('workout-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['count']
+
+    def test_reads_go_to_the_replica(self):
+        self.assertEqual(self.list_count(), 0)
+
+    def test_recent_writer_reads_from_the_primary(self):
+        pin_to_primary(self.user.pk)
+        self.assertEqual(self.list_count(), 1)
+
+    def test_writes_go_to_the_primary(self):
+        response = self.client.patch(reverse('workout-update', args=[self.workout.pk]), {'distance': 7000}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Workout.objects.get(pk=self.workout.pk).distance, 7000.0)
+
+    def test_read_database_is_reset_after_the_request(self):
+        self.list_count()
+        self.assertIsNone(_read_database.get())
+        response = self.client.get(reverse('workout-list'), {'pagination': 'unknown'}) #fails inside the view
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNone(_read_database.get())
+        self.assertEqual(Workout.objects.filter(user_id=self.user).count(), 1)
+
+    @override_settings(METRICS_CACHE_ENABLED=True)
+    def test_validated_reads_stay_on_the_primary(self):
+        caches[METRICS_CACHE_ALIAS].clear()
+        self.assertEqual(self.list_count(), 1)
+        response = self.client.get(reverse('workout-detail', args=[self.workout.pk]))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('workout-metrics'))
+        self.assertEqual(response.data['total_distance'], 5000.0)
+
+    def test_router(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Workout))
+        self.assertEqual(router.db_for_write(Workout), 'default')
+        self.assertFalse(router.allow_migrate('replica_test', 'activity'))
+        self.assertIsNone(router.allow_migrate('default', 'activity'))
+
+@override_settings(DATABASE_REPLICAS=[], METRICS_CACHE_ENABLED=False)
+class CalorieTests(TestCase):
+    '''
+    calculate_calories_batch and recompute_calories give exactly what Workout.calculate_calories gives.
+    '''
+    def setUp(self):
+        self.user = User.objects.select_related('profile').get(
+            pk=User.objects.create_user(username='runner', password='secret-password').pk)
+        self.start = timezone.now().replace(microsecond=0)
+
+    def workouts(self):
+        activity_types = [activity_type for activity_type, _ in Workout.ACTIVITY_TYPE] + ['Unknown']
+        return [Workout(user_id=self.user, activity_type=activity_type, date=self.start, start_time=self.start,
+                        end_time=self.start + timedelta(minutes=47, seconds=13),
+                        moving_time=moving_time, elevation_gain=elevation_gain)
+                for activity_type in activity_types
+                for moving_time in (None, timedelta(minutes=39, seconds=7, milliseconds=250))
+                for elevation_gain in (None, 0.0, 123.4)]
+
+    def test_batch_matches_the_instance_method(self):
+        for weight in (None, 72.5):
+            self.user.profile.weight = weight
+            workouts = self.workouts()
+            calories = calculate_calories_batch(
+                [(workout.moving_time or workout.end_time - workout.start_time).total_seconds() for workout in workouts],
+                [workout.activity_type for workout in workouts],
+                [weight] * len(workouts),
+                [workout.elevation_gain for workout in workouts])
+            for workout, value in zip(workouts, calories):
+                with self.subTest(weight=weight, activity_type=workout.activity_type,
+                                  moving_time=workout.moving_time, elevation_gain=workout.elevation_gain):
+                    self.assertEqual(value, workout.calculate_calories())
+
+    def test_batch_without_elevation(self):
+        workouts = [workout for workout in self.workouts() if workout.elevation_gain is None]
+        calories = calculate_calories_batch(
+            [(workout.moving_time or workout.end_time - workout.start_time).total_seconds() for workout in workouts],
+            [workout.activity_type for workout in workouts],
+            [self.user.profile.weight] * len(workouts))
+        self.assertEqual(calories, [workout.calculate_calories() for workout in workouts])
+
+    def test_recompute_matches_the_instance_method(self):
+        workouts = [workout for workout in self.workouts() if workout.activity_type != 'Unknown']
+        Workout.objects.bulk_create(workouts)
+        self.user.profile.weight = 64.3
+        self.user.profile.save()
+        self.assertEqual(recompute_calories([self.user.pk]), len(workouts))
+        stored = dict(Workout.objects.filter(user_id=self.user).values_list('id', 'calories_burned'))
+        for workout in workouts:
+            self.assertEqual(stored[workout.id], workout.calculate_calories())
+
+@override_settings(DATABASE_REPLICAS=[], METRICS_CACHE_ENABLED=False)
+class RollupSnapshotTests(TestCase):
+    '''
+    Workouts loaded from the database remember what they contribute to the rollups (post_init),
+    so saving them does not re-read the stored row.
+    '''
+    def setUp(self):
+        self.user = User.objects.create_user(username='runner', password='secret-password')
+        self.today = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        self.workout = create_workout(self.user, self.today)
+
+    def _workout_selects(self, queries):
+        return [query['sql'] for query in queries
+                if query['sql'].startswith('SELECT') and 'FROM "activity_workout"' in query['sql']]
+
+    def rollup(self):
+        return WorkoutDailyRollup.objects.get(user=self.user, activity_type='Running')
+
+    def test_new_workout_has_no_snapshot(self):
+        self.assertIsNone(Workout(user_id=self.user, activity_type='Running')._rollup_previous)
+
+    def test_loaded_workout_is_saved_without_reading_the_row(self):
+        workout = Workout.objects.get(pk=self.workout.pk)
+        self.assertEqual(workout._rollup_previous['distance'], 5000.0)
+        workout.distance = 7000.0
+        with CaptureQueriesContext(connection) as queries:
+            workout.save()
+        self.assertEqual(self._workout_selects(queries), [])
+        self.assertEqual(self.rollup().total_distance, 7000.0)
+
+    def test_deferred_workout_reads_the_row_on_save(self):
+        workout = Workout.objects.defer('distance').get(pk=self.workout.pk)
+        self.assertIsNone(workout._rollup_previous)
+        workout.calories_burned = 300.0
+        with CaptureQueriesContext(connection) as queries:
+            workout.save(update_fields=['calories_burned'])
+        self.assertNotEqual(self._workout_selects(queries), [])
+        rollup = self.rollup()
+        self.assertEqual((rollup.workout_count, rollup.total_distance, rollup.total_calories_burned), (1, 5000.0, 300.0))
+
+    def test_track_fields_deferred_keep_the_snapshot(self):
+        workout = Workout.objects.defer('route', 'route_times', 'route_elevations').get(pk=self.workout.pk)
+        self.assertIsNotNone(workout._rollup_previous)
+
+    def test_moving_a_workout_to_another_day(self):
+        workout = Workout.objects.get(pk=self.workout.pk)
+        workout.date = self.today - timedelta(days=1)
+        workout.save()
+        days = list(WorkoutDailyRollup.objects.filter(user=self.user).values_list('day', 'workout_count'))
+        self.assertEqual(days, [((self.today - timedelta(days=1)).date(), 1)])
+
+    def test_end_workout_sets_duration(self):
+        workout = create_workout(self.user, self.today, end_time=None)
+        self.assertEqual(self.rollup().pending_count, 1)
+        workout.end_time = self.today + timedelta(minutes=45)
+        workout.save()
+        self.assertEqual(workout.duration, timedelta(minutes=45))
+        self.assertEqual(self.rollup().pending_count, 0)
+
+    def test_contribution_survives_a_concurrently_deleted_row(self):
+        day = self.today - timedelta(days=3)
+        get_or_create = WorkoutDailyRollup.objects.get_or_create
+        lost = []
+        def lose_the_first_row(**kwargs):
+            rollup, created = get_or_create(**kwargs)
+            if not lost:
+                WorkoutDailyRollup.objects.filter(pk=rollup.pk).delete() #emptied by a concurrent removal
+                lost.append(rollup.pk)
+            return rollup, created
+        with mock.patch.object(WorkoutDailyRollup.objects, 'get_or_create', side_effect=lose_the_first_row):
+            create_workout(self.user, day, distance=1000.0)
+        rollup = WorkoutDailyRollup.objects.get(user=self.user, day=day.date(), activity_type='Running')
+        self.assertNotEqual(rollup.pk, lost[0])
+        self.assertEqual((rollup.workout_count, rollup.total_distance), (1, 1000.0))
+
+@override_settings(DATABASE_REPLICAS=[], METRICS_CACHE_ENABLED=False)
+class RollupMetricsTests(TestCase):
+    '''
+    Metrics answered from the daily rollups (kept up by the signals) equal the metrics computed
+    from the raw workouts, for every group_by. Workouts sit on both range bounds: one at
+    start_date 00:00 is in the range, one at end_date 00:00 is not.
+    '''
+    def setUp(self):
+        self.user = User.objects.create_user(username='runner', password='secret-password')
+        self.start_date = timezone.now().date() - timedelta(days=60)
+        self.end_date = self.start_date + timedelta(days=30)
+        start = timezone.make_aware(datetime.combine(self.start_date, time()))
+        end = timezone.make_aware(datetime.combine(self.end_date, time()))
+        activity_types = [activity_type for activity_type, _ in Workout.ACTIVITY_TYPE]
+        moments = [start, end] + [start + timedelta(hours=index * 19 - 48) for index in range(45)]
+        workouts = [create_workout(
+            self.user, moment, activity_type=activity_types[index % len(activity_types)],
+            distance=None if index % 6 == 5 else 1000.0 * (index % 7 + 1), calories_burned=100.0 + index)
+            for index, moment in enumerate(moments)]
+        self.in_range = [workout for workout in workouts if start <= workout.date < end]
+        # edits and deletes go through the rollup decrements too
+        moved = self.in_range.pop()
+        moved.date = start - timedelta(days=3)
+        moved.save()
+        self.in_range.pop().delete()
+
+    def metrics(self, group_by, use_rollups):
+        with self.settings(WORKOUT_METRICS_USE_ROLLUPS=use_rollups):
+            queryset, _, _ = _metrics_source(self.user, self.start_date, self.end_date)
+            self.assertIs(queryset.model, WorkoutDailyRollup if use_rollups else Workout)
+            return compute_metrics(self.user, self.start_date, self.end_date, group_by)
+
+    def test_rollups_match_raw_workouts(self):
+        for group_by in [None, *GROUP_BY_CHOICES]:
+            with self.subTest(group_by=group_by):
+                from_rollups = self.metrics(group_by, use_rollups=True)
+                self.assertEqual(from_rollups, self.metrics(group_by, use_rollups=False))
+                self.assertEqual(from_rollups[1], 200)
+
+    def test_end_date_is_excluded(self):
+        data, _ = self.metrics(None, use_rollups=False)
+        self.assertEqual(data['total_distance'], sum(workout.distance or 0 for workout in self.in_range))
+        self.assertEqual(data['total_calories_burned'], sum(workout.calories_burned for workout in self.in_range))
+
+class GroupByMetricsTests(TestCase):
+    '''
+    The buckets of every group_by, spelled out, from the raw workouts and from the rollups.
+    '''
+    def setUp(self):
+        self.user = User.objects.create_user(username='runner', password='secret-password')
+        for moment, activity_type, distance, calories_burned in (
+                ((2024, 1, 1, 10), 'Running', 5000.0, 100.0), #a Monday
+                ((2024, 1, 1, 18), 'Cycling', 20000.0, 300.0),
+                ((2024, 1, 3, 10), 'Running', 3000.0, 50.0),
+                ((2024, 1, 8, 10), 'Walking', 2000.0, 80.0),
+                ((2024, 2, 5, 10), 'Running', 4000.0, 90.0)):
+            create_workout(self.user, timezone.make_aware(datetime(*moment)), activity_type=activity_type,
+                           distance=distance, calories_burned=calories_burned)
+
+    def breakdown(self, group_by):
+        results = []
+        for use_rollups in (False, True):
+            with self.settings(WORKOUT_METRICS_USE_ROLLUPS=use_rollups):
+                data, status_code = compute_metrics(self.user, date(2024, 1, 1), date(2024, 3, 1), group_by)
+            self.assertEqual(status_code, 200)
+            self.assertEqual(data['group_by'], group_by)
+            results.append(data['breakdown'])
+        self.assertEqual(results[0], results[1])
+        return results[0]
+
+    def bucket(self, period, hours, distance, calories_burned):
+        return {'period': period, 'total_duration': f'{hours:02}:00:00',
+                'total_distance': distance, 'total_calories_burned': calories_burned}
+
+    def test_day(self):
+        self.assertEqual(self.breakdown('day'), [
+            self.bucket(date(2024, 1, 1), 2, 25000.0, 400.0),
+            self.bucket(date(2024, 1, 3), 1, 3000.0, 50.0),
+            self.bucket(date(2024, 1, 8), 1, 2000.0, 80.0),
+            self.bucket(date(2024, 2, 5), 1, 4000.0, 90.0),
+        ])
+
+    def test_week(self):
+        # weeks start on Monday
+        self.assertEqual(self.breakdown('week'), [
+            self.bucket(date(2024, 1, 1), 3, 28000.0, 450.0),
+            self.bucket(date(2024, 1, 8), 1, 2000.0, 80.0),
+            self.bucket(date(2024, 2, 5), 1, 4000.0, 90.0),
+        ])
+
+    def test_month(self):
+        self.assertEqual(self.breakdown('month'), [
+            self.bucket(date(2024, 1, 1), 4, 30000.0, 530.0),
+            self.bucket(date(2024, 2, 1), 1, 4000.0, 90.0),
+        ])
+
+    def test_activity_type(self):
+        self.assertEqual(self.breakdown('activity_type'), [
+            self.bucket('Cycling', 1, 20000.0, 300.0),
+            self.bucket('Running', 3, 12000.0, 240.0),
+            self.bucket('Walking', 1, 2000.0, 80.0),
+        ])
+
+    def test_without_group_by(self):
+        data, _ = compute_metrics(self.user, date(2024, 1, 1), date(2024, 3, 1))
+        self.assertNotIn('breakdown', data)
+        self.assertEqual(data['total_duration'], '05:00:00')
+
+@override_settings(DATABASE_REPLICAS=[])
+class QueryPlanTests(TestCase):
+    '''
+    The per-user workout queries are served by an index, never by a sequential scan: the list,
+    filter, cursor, raw metrics and pending queries by the composite and partial indexes of
+    migration 0007, the near / bbox filters by the GiST indexes on start_point and route.
+    The tables are seeded and analyzed, then plans are taken with enable_seqscan off: a test
+    database is small enough for the planner to prefer sequential scans anyway, while with them
+    off a "Seq Scan" node is only left where no index can answer the query.
+    '''
+    users, workouts_per_user = 50, 60
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(User(username=f'user{index}', password='!') for index in range(cls.users))
+        cls.user = users[0]
+        cls.today = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        activity_types = [activity_type for activity_type, _ in Workout.ACTIVITY_TYPE]
+        workouts = []
+        for user_index, user in enumerate(users):
+            for index in range(cls.workouts_per_user):
+                start_time = cls.today - timedelta(days=index * 2)
+                #one start point per degree cell, with a short route heading north-east
+                cell = user_index * cls.workouts_per_user + index
+                lon, lat = cell % 360 - 179.5, cell // 360 % 170 - 84.5
+                workouts.append(Workout(
+                    user_id=user, activity_type=activity_types[index % len(activity_types)], date=start_time,
+                    start_time=start_time, end_time=start_time + timedelta(hours=1), duration=timedelta(hours=1),
+                    distance=5000.0, calories_burned=500.0, start_point=Point(lon, lat, srid=4326),
+                    route=LineString((lon, lat), (lon + 0.01, lat + 0.01), srid=4326)))
+        Workout.objects.bulk_create(workouts, batch_size=1000)
+        rebuild_rollups()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE activity_workout')
+            cursor.execute('ANALYZE activity_workoutdailyrollup')
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off') #reverted with the test's savepoint
+
+    def assertNoSeqScan(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, plan)
+
+    def index_names(self, index):
+        # the index and its copies on the monthly partitions (named after the partition, see 0010)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relid::regclass::text FROM pg_partition_tree(%s::regclass)", [index])
+            return [name for name, in cursor.fetchall()]
+
+    def assertUsesIndex(self, queryset, *indexes):
+        '''
+        Asserts the plan scans one of the given indexes (from migration 0007), not only the
+        user_id foreign key index that every per-user query could fall back to.
+        '''
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, plan)
+        names = [name for index in indexes for name in self.index_names(index)]
+        self.assertTrue(any(re.search(rf'\b{re.escape(name)}\b', plan) for name in names), plan)
+
+    def workouts(self, **params):
+        filterset = WorkoutFilter(params, queryset=Workout.objects.filter(user_id=self.user))
+        self.assertTrue(filterset.is_valid(), filterset.errors)
+        return filterset.qs
+
+    def test_list(self):
+        workouts = self.workouts()
+        self.assertUsesIndex(workouts.order_by('-date', '-id').values_list(*WORKOUT_LIST_FIELDS)[:10], 'workout_user_date_idx')
+        self.assertNoSeqScan(workouts.values('id')) #page count, any index on user_id will do
+
+    def test_list_filters(self):
+        date_range = {'date_range_after': (self.today - timedelta(days=30)).date(), 'date_range_before': self.today.date()}
+        self.assertUsesIndex(self.workouts(activity_type='Running', **date_range).order_by('-date', '-id')[:10],
+                             'workout_user_type_date_idx', 'workout_user_date_idx')
+        self.assertUsesIndex(self.workouts(**date_range).order_by('-date', '-id')[:10], 'workout_user_date_idx')
+
+    def test_cursor_page(self):
+        self.assertUsesIndex(self.workouts().filter(date__lt=self.today - timedelta(days=40)).order_by('-date', '-id')[:11],
+                             'workout_user_date_idx')
+
+    def test_export(self):
+        self.assertNoSeqScan(self.workouts().order_by('date', 'id').values_list(*WORKOUT_LIST_FIELDS))
+
+    def test_detail(self):
+        workout = Workout.objects.filter(user_id=self.user).first()
+        self.assertNoSeqScan(Workout.objects.filter(user_id=self.user, pk=workout.pk).values_list(*WORKOUT_LIST_FIELDS))
+
+    def test_metrics(self):
+        start_date, end_date = (self.today - timedelta(days=60)).date(), self.today.date()
+        with self.settings(WORKOUT_METRICS_USE_ROLLUPS=True):
+            queryset, aggregates, choices = _metrics_source(self.user, start_date, end_date)
+        self.assertNoSeqScan(metrics_queryset(queryset, 'day', aggregates, choices)) #unique (user, day, type) index
+        with self.settings(WORKOUT_METRICS_USE_ROLLUPS=False):
+            queryset, aggregates, choices = _metrics_source(self.user, start_date, end_date)
+        self.assertUsesIndex(metrics_queryset(queryset, 'day', aggregates, choices), 'workout_user_date_idx')
+
+    def test_pending_workouts(self):
+        self.assertUsesIndex(Workout.objects.filter(user_id=self.user, duration__isnull=True).values('id'), 'workout_user_pending_idx')
+
+    def assertSpatialIndexScan(self, queryset, column):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, plan)
+        self.assertTrue(any('Index' in line and column in line for line in plan.splitlines()), plan)
+
+    def spatial_workouts(self, **params):
+        # the spatial predicate alone, so the plan cannot answer it from the user index instead
+        filterset = WorkoutFilter(params, queryset=Workout.objects.all())
+        self.assertTrue(filterset.is_valid(), filterset.errors)
+        return filterset.qs
+
+    def test_near_uses_the_start_point_index(self):
+        self.assertSpatialIndexScan(self.spatial_workouts(near='-84.5,-179.5', radius=5000), 'start_point')
+        self.assertNoSeqScan(self.workouts(near='-84.5,-179.5', radius=5000))
+
+    def test_bbox_uses_the_route_index(self):
+        self.assertSpatialIndexScan(self.spatial_workouts(bbox='-180,-85,-170,-80'), 'route')
+        self.assertNoSeqScan(self.workouts(bbox='-180,-85,-170,-80'))
+
+@override_settings(DATABASE_REPLICAS=[], METRICS_CACHE_ENABLED=False)
+class LiveSessionTests(TransactionTestCase):
+    '''
+    Live sessions (activity/live.py). Their database calls run in worker threads with their own
+    connections, so data is committed rather than kept in a test transaction.
+    '''
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        user = User.objects.create_user(username='runner', password='secret-password')
+        user.profile.weight = 70.0
+        user.profile.save()
+        self.user = User.objects.select_related('profile').get(pk=user.pk)
+        self.start = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+        self.workout = create_workout(self.user, self.start, end_time=None, distance=None)
+        self.path = f'/ws/workouts/{self.workout.pk}/live/'
+
+    def samples(self, count=120):
+        # a run north at ~3 m/s with a stop in the middle, climbing 1 m every 10 seconds
+        start, samples, lat = self.start.timestamp(), [], 52.5
+        for index in range(count):
+            if not 40 <= index < 60:
+                lat += 0.000027
+            samples.append({'lat': lat, 'lon': 13.4, 'time': start + index, 'ele': 30.0 + index / 10})
+        return samples
+
+    def connect(self, messages, token=None, query_string=b''):
+        '''
+        Runs a session that receives `messages` after connecting; returns what the server sent.
+        '''
+        if token is None:
+            token = str(AccessToken.for_user(self.user))
+        scope = {'type': 'websocket', 'path': self.path, 'query_string': query_string,
+                 'headers': [(b'authorization', f'Bearer {token}'.encode())] if token else []}
+        received = asyncio.Queue()
+        sent = []
+        async def send(message):
+            sent.append(message)
+        async def run():
+            for message in [{'type': 'websocket.connect'}, *messages]:
+                received.put_nowait(message)
+            await live_session_application(scope, received.get, send)
+        async_to_sync(run)()
+        return sent
+
+    def text(self, data):
+        return {'type': 'websocket.receive', 'text': JSONRenderer().render(data).decode()}
+
+    def test_totals_match_the_track_analytics(self):
+        samples = parse_trackpoints(self.samples())
+        session = LiveSession(self.workout, 70.0)
+        for sample in samples:
+            session.add(*sample)
+        session.add(*samples[10]) #older than the last sample: ignored
+        analytics = track_analytics(*zip(*samples))
+        totals = session.totals()
+        self.assertEqual(totals['samples'], len(samples))
+        self.assertEqual(totals['elapsed_time'], analytics['elapsed_time'])
+        self.assertAlmostEqual(totals['distance'], analytics['distance'], places=6)
+        self.assertAlmostEqual(totals['moving_time'], analytics['moving_time'], places=6)
+        self.assertAlmostEqual(totals['elevation_gain'], analytics['elevation_gain'], places=6)
+        self.workout.end_time = self.start + timedelta(seconds=totals['elapsed_time'])
+        self.workout.moving_time = timedelta(seconds=session.moving_time)
+        self.workout.elevation_gain = session.elevation_gain
+        self.assertAlmostEqual(totals['calories_burned'], self.workout.calculate_calories(), places=6)
+
+    def test_totals_continue_from_the_stored_workout(self):
+        self.workout.distance, self.workout.moving_time, self.workout.elevation_gain = 1000.0, timedelta(minutes=5), 10.0
+        session = LiveSession(self.workout, 70.0)
+        for sample in parse_trackpoints(self.samples(2)):
+            session.add(*sample)
+        first, second = self.samples(2)
+        self.assertAlmostEqual(session.distance, 1000.0 + haversine(first['lat'], first['lon'], second['lat'], second['lon']), places=6)
+        self.assertEqual(session.moving_time, 301.0)
+        self.assertEqual(session.elevation_gain, 10.0)
+
+    def test_finish_saves_once_and_updates_rollups(self):
+        save = Workout.save
+        with mock.patch.object(Workout, 'save', autospec=True, side_effect=save) as saved:
+            sent = self.connect([self.text(self.samples()), self.text({'type': 'finish'}), {'type': 'websocket.disconnect'}])
+        self.assertEqual(saved.call_count, 1)
+        self.assertEqual(sent[0], {'type': 'websocket.accept'})
+        self.assertEqual(sent[-1], {'type': 'websocket.close', 'code': CLOSE_NORMAL})
+        finished = json.loads(sent[-2]['text'])
+        self.assertEqual(finished['type'], 'finished')
+
+        workout = Workout.objects.get(pk=self.workout.pk)
+        self.assertEqual(workout.end_time, self.start + timedelta(seconds=119))
+        self.assertIsNotNone(workout.duration)
+        self.assertAlmostEqual(workout.distance, finished['distance'])
+        self.assertAlmostEqual(workout.calories_burned, finished['calories_burned'])
+        rollup = WorkoutDailyRollup.objects.get(user_id=self.user)
+        self.assertEqual((rollup.workout_count, rollup.pending_count), (1, 0))
+        self.assertAlmostEqual(rollup.total_distance, workout.distance)
+        self.assertAlmostEqual(rollup.total_calories_burned, workout.calories_burned)
+
+    def test_disconnect_saves_the_totals_once(self):
+        save = Workout.save
+        with mock.patch.object(Workout, 'save', autospec=True, side_effect=save) as saved:
+            self.connect([self.text(self.samples()), {'type': 'websocket.disconnect'}])
+        self.assertEqual(saved.call_count, 1)
+        workout = Workout.objects.get(pk=self.workout.pk)
+        self.assertIsNone(workout.end_time)
+        self.assertGreater(workout.distance, 0)
+        rollup = WorkoutDailyRollup.objects.get(user_id=self.user)
+        self.assertEqual((rollup.workout_count, rollup.pending_count), (1, 1))
+        self.assertAlmostEqual(rollup.total_distance, workout.distance)
+
+    def test_second_session_is_refused_while_the_lock_is_held(self):
+        lock = SessionLock(self.workout.pk)
+        self.assertTrue(async_to_sync(lock.acquire)())
+        try:
+            with mock.patch.object(Workout, 'save', autospec=True) as saved:
+                sent = self.connect([self.text(self.samples()), self.text({'type': 'finish'})])
+        finally:
+            async_to_sync(lock.release)()
+        self.assertEqual(sent, [{'type': 'websocket.close', 'code': CLOSE_IN_USE}])
+        saved.assert_not_called()
+        self.assertIsNone(Workout.objects.get(pk=self.workout.pk).end_time)
+
+    def test_flush_skips_a_workout_finished_elsewhere(self):
+        session = LiveSession(Workout.objects.select_related('user_id__profile').get(pk=self.workout.pk), 70.0)
+        for sample in parse_trackpoints(self.samples(10)):
+            session.add(*sample)
+        end_time = self.start + timedelta(minutes=30)
+        Workout.objects.filter(pk=self.workout.pk).update(end_time=end_time)
+        self.assertFalse(async_to_sync(flush_session)(session, finish=True))
+        workout = Workout.objects.get(pk=self.workout.pk)
+        self.assertEqual((workout.end_time, workout.distance), (end_time, None))
+
+    def test_invalid_tokens_are_refused(self):
+        expired = AccessToken.for_user(self.user)
+        expired.set_exp(lifetime=-timedelta(seconds=1))
+        for label, token, query_string in (
+                ('header', 'not-a-jwt', b''),
+                ('query', '', b'token=not-a-jwt'),
+                ('expired header', str(expired), b''),
+                ('expired query', '', f'token={expired}'.encode()),
+                ('missing', '', b'')):
+            with self.subTest(label):
+                sent = self.connect([], token=token, query_string=query_string)
+                self.assertEqual(sent, [{'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED}])
+
+    def test_query_token_is_accepted(self):
+        token = str(AccessToken.for_user(self.user))
+        sent = self.connect([{'type': 'websocket.disconnect'}], token='', query_string=f'token={token}'.encode())
+        self.assertEqual(sent, [{'type': 'websocket.accept'}])
@@ -0,0 +1,248 @@
+import math
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.contrib.gis.geos import LineString, Point
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from .analytics import DEFAULT_SPLIT, track_analytics
+
+# GPS tracks are stored on the workout row itself rather than one row per point:
+# - route: a LineString of (lon, lat) in WGS84 (srid 4326)
+# - route_times: the point timestamps, delta-encoded (see encode_times)
+# - route_elevations: the point elevations as float32, NaN where unknown (see encode_elevations)
+MAX_TRACK_POINTS = 100000
+
+# Route resolutions served by the detail endpoints: model field and the Douglas-Peucker tolerance
+# (meters) it was simplified with at ingest, finest first
+ROUTE_RESOLUTIONS = {
+    'full': ('route', 0),
+    'medium': ('route_medium', 5),
+    'low': ('route_low', 25),
+}
+MAX_ROUTE_TOLERANCE = 1000 #meters
+METERS_PER_DEGREE = 111320 #of latitude; longitude degrees are shorter, so tolerances err on the fine side
+_TIMES_HEADER = struct.Struct('<q') #epoch milliseconds of the first point
+_MAX_TIME_DELTA = 2 ** 32 - 1 #deltas are stored as unsigned 32-bit milliseconds (~49 days)
+# point times accepted at upload, in epoch milliseconds: from 1970 to the end of year 9999 (the
+# datetime range), so every stored time converts back to a datetime
+MIN_POINT_TIME = 0
+MAX_POINT_TIME = round(datetime(9999, 12, 31, 23, 59, 59, tzinfo=dt_timezone.utc).timestamp() * 1000)
+
+def encode_times(times):
+    '''
+    Encodes sorted epoch-millisecond timestamps as the first timestamp followed by the
+    differences between consecutive points, as little-endian unsigned 32-bit integers
+    (8 bytes + 4 bytes per point, instead of a timestamp column per point).
+    '''
+    deltas = array('I', (b - a for a, b in zip(times, times[1:])))
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+    return _TIMES_HEADER.pack(times[0]) + deltas.tobytes()
+
+def decode_times(blob):
+    '''
+    Decodes route_times back to the list of epoch-millisecond timestamps.
+    '''
+    blob = bytes(blob)
+    current, = _TIMES_HEADER.unpack_from(blob)
+    deltas = array('I')
+    deltas.frombytes(blob[_TIMES_HEADER.size:])
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+    times = [current]
+    for delta in deltas:
+        current += delta
+        times.append(current)
+    return times
+
+def encode_elevations(elevations):
+    '''
+    Encodes elevations (meters, NaN when unknown) as little-endian 32-bit floats.
+    '''
+    values = array('f', elevations)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+def decode_elevations(blob):
+    values = array('f')
+    values.frombytes(bytes(blob))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tolist()
+
+def to_epoch_ms(moment):
+    return round(moment.timestamp() * 1000)
+
+def from_epoch_ms(value):
+    return datetime.fromtimestamp(value / 1000, tz=dt_timezone.utc)
+
+def _parse_point_time(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+        time = round(value * 1000) #epoch seconds
+    else:
+        moment = parse_datetime(value) if isinstance(value, str) else None
+        if moment is None:
+            raise ValueError("time: must be an ISO 8601 datetime or epoch seconds")
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        time = to_epoch_ms(moment)
+    if not MIN_POINT_TIME <= time <= MAX_POINT_TIME:
+        raise ValueError("time: must be between 1970 and 9999")
+    return time
+
+def _parse_coordinate(point, field, limit):
+    value = point.get(field)
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not -limit <= value <= limit:
+        raise ValueError(f"{field}: must be a number between -{limit} and {limit}")
+    return float(value)
+
+def _parse_elevation(point):
+    value = point.get('ele')
+    if value is None:
+        return math.nan
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not math.isfinite(value):
+        raise ValueError("ele: must be a number")
+    return float(value)
+
+def parse_trackpoints(points):
+    '''
+    Validates uploaded trackpoints, a list of {"lat", "lon", "time", "ele"} objects
+    (ele, the elevation in meters, is optional).
+    Returns:
+    - points: Type list of (epoch ms, lat, lon, ele) tuples in upload order, ele is NaN when not given.
+    Raises:
+    - ValueError: with the index of the first invalid point.
+    '''
+    if not isinstance(points, list) or not points:
+        raise ValueError("must be a non-empty list of points")
+    if len(points) > MAX_TRACK_POINTS:
+        raise ValueError(f"at most {MAX_TRACK_POINTS} points per track")
+    parsed = []
+    for index, point in enumerate(points):
+        try:
+            if not isinstance(point, dict):
+                raise ValueError("must be an object with lat, lon and time")
+            parsed.append((_parse_point_time(point.get('time')),
+                           _parse_coordinate(point, 'lat', 90),
+                           _parse_coordinate(point, 'lon', 180),
+                           _parse_elevation(point)))
+        except ValueError as error:
+            raise ValueError(f"point {index}: {error}")
+    return parsed
+
+def workout_track(workout):
+    '''
+    Returns the stored track of a workout as a list of (epoch ms, lat, lon, ele) tuples, sorted by time.
+    '''
+    if workout.route is None or not workout.route_times:
+        return []
+    times = decode_times(workout.route_times)
+    elevations = decode_elevations(workout.route_elevations) if workout.route_elevations else [math.nan] * len(times)
+    return [(time, lat, lon, ele) for time, (lon, lat), ele in zip(times, workout.route.coords, elevations)]
+
+def analyze_track(track, split_length=DEFAULT_SPLIT):
+    '''
+    Runs the track analytics (see activity/analytics.py) over a workout_track() list.
+    '''
+    times, lats, lons, elevations = zip(*track)
+    return track_analytics(times, lats, lons, elevations, split_length)
+
+def simplify_route(route, tolerance):
+    '''
+    Simplifies a route with Douglas-Peucker (GEOS) so no removed point is more than `tolerance`
+    meters away from the simplified line. The first and last points are always kept.
+    '''
+    return route.simplify(tolerance / METERS_PER_DEGREE, preserve_topology=False)
+
+def parse_route_params(query_params):
+    '''
+    Validates the route parameters of the detail endpoints:
+    - resolution: one of ROUTE_RESOLUTIONS.
+    - tolerance: meters; served from the precomputed level with exactly that tolerance, otherwise
+      the full route is simplified with it on the fly (simplifying an already simplified level
+      again would stack both errors beyond the tolerance).
+    Returns:
+    - (field, tolerance): the model field to read and the tolerance to simplify it with
+      (None when the precomputed level is used as is). field is None when no route is requested.
+    Raises:
+    - ValidationError: if a parameter is invalid or both are given.
+    '''
+    resolution = query_params.get('resolution')
+    tolerance = query_params.get('tolerance')
+    if resolution and tolerance:
+        raise ValidationError({'resolution': "Use either resolution or tolerance, not both"})
+    if resolution:
+        if resolution not in ROUTE_RESOLUTIONS:
+            raise ValidationError({'resolution': f"Invalid resolution, choose from: {', '.join(ROUTE_RESOLUTIONS)}"})
+        return ROUTE_RESOLUTIONS[resolution][0], None
+    if tolerance:
+        try:
+            tolerance = float(tolerance)
+        except ValueError:
+            tolerance = None
+        if tolerance is None or not 0 <= tolerance <= MAX_ROUTE_TOLERANCE:
+            raise ValidationError({'tolerance': f"Tolerance must be a number of meters between 0 and {MAX_ROUTE_TOLERANCE}"})
+        for field, level in ROUTE_RESOLUTIONS.values():
+            if level == tolerance:
+                return field, None
+        return 'route', tolerance
+    return None, None
+
+def route_representation(route, tolerance=None):
+    '''
+    Returns a route as a GeoJSON LineString ([lon, lat] coordinates), simplified with
+    `tolerance` meters when given, or None when the workout has no track.
+    '''
+    if route is None:
+        return None
+    if tolerance is not None:
+        route = simplify_route(route, tolerance)
+    return {'type': 'LineString', 'coordinates': route.coords}
+
+def store_track(workout, points):
+    '''
+    Merges uploaded points into the workout's track (points at an already stored time replace it)
+    and re-encodes the route, precomputing its simplified resolutions (see ROUTE_RESOLUTIONS).
+    The workout is then fed from the track analytics:
+    - start_point, distance from the track, moving_time and elevation_gain.
+    - start_time from the first point and, for finished workouts, end_time from the last point
+      (duration follows in the EndWorkout signal), with calories recomputed.
+    Does not save the workout.
+    Returns:
+    - (track, analytics): the merged workout_track() list and its analytics.
+    Raises:
+    - ValueError: if the merged track has fewer than 2 points, more than MAX_TRACK_POINTS,
+                  or a gap between points too large to encode.
+    '''
+    merged = {point[0]: point for point in workout_track(workout)}
+    merged.update((point[0], point) for point in points)
+    track = sorted(merged.values())
+    if len(track) < 2:
+        raise ValueError("a track needs at least 2 points with distinct times")
+    if len(track) > MAX_TRACK_POINTS:
+        raise ValueError(f"at most {MAX_TRACK_POINTS} points per track")
+    times, lats, lons, elevations = zip(*track)
+    if any(b - a > _MAX_TIME_DELTA for a, b in zip(times, times[1:])):
+        raise ValueError("points of a track cannot be more than 49 days apart")
+
+    workout.route = LineString(list(zip(lons, lats)), srid=4326)
+    workout.start_point = Point(lons[0], lats[0], srid=4326)
+    workout.route_times = encode_times(times)
+    workout.route_elevations = encode_elevations(elevations)
+    for field, tolerance in ROUTE_RESOLUTIONS.values():
+        if tolerance:
+            setattr(workout, field, simplify_route(workout.route, tolerance))
+
+    analytics = analyze_track(track)
+    workout.distance = analytics['distance']
+    workout.moving_time = timedelta(seconds=analytics['moving_time'])
+    workout.elevation_gain = analytics['elevation_gain']
+    workout.start_time = from_epoch_ms(times[0])
+    if workout.end_time is not None:
+        workout.end_time = from_epoch_ms(times[-1])
+        workout.calories_burned = workout.calculate_calories()
+    return track, analytics
@@ -1,11 +1,19 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     path('workouts/new/', views.WorkoutCreateView.as_view(), name='workout-list-create'),
+    path('workouts/bulk/', views.WorkoutBulkCreateView.as_view(), name='workout-bulk-create'),
+    path('workouts/import/', views.WorkoutImportView.as_view(), name='workout-import'),
     path('workouts/', views.WorkoutListView.as_view(), name='workout-list'),
+    path('workouts/export/<str:export_format>/', views.WorkoutExportView.as_view(), name='workout-export'),
     path('workouts/<int:pk>/', views.WorkoutDetailView.as_view(), name='workout-detail'),
+    path('workouts/<int:pk>/track/', views.WorkoutTrackView.as_view(), name='workout-track'),
     path('workouts/<int:pk>/edit/', views.WorkoutUpdateView.as_view(), name='workout-update'),
     path('workouts/<int:pk>/delete/', views.WorkoutDeleteView.as_view(), name='workout-delete'),
     path('workouts/metrics/', views.WorkoutMetricsView.as_view(), name='workout-metrics'),
+    # async (ASGI) variants of the read endpoints
+    path('async/workouts/', async_views.AsyncWorkoutListView.as_view(), name='async-workout-list'),
+    path('async/workouts/<int:pk>/', async_views.AsyncWorkoutDetailView.as_view(), name='async-workout-detail'),
+    path('async/workouts/metrics/', async_views.AsyncWorkoutMetricsView.as_view(), name='async-workout-metrics'),
 ]
\ No newline at end of file
@@ -4,4 +4,17 @@ def seconds_to_HHMMSS(seconds):
     '''
     hours, remainder = divmod(seconds, 3600) # divide seconds by 3600, hours=quotient and remainder=remainder
     mins, sec = divmod(remainder, 60) # divide remainder by 60, mins=quotient and sec=remainder
-    return f"{int(hours):02}:{int(mins):02}:{int(sec):02}" #return format in HH:MM:SS
\ No newline at end of file
+    return f"{int(hours):02}:{int(mins):02}:{int(sec):02}" #return format in HH:MM:SS
+
+def chunked(iterable, size):
+    '''
+    Function: Yields lists of at most `size` items from an iterable without loading it all in memory
+    '''
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -1,15 +1,28 @@
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import get_user_model
-from django.utils.dateparse import parse_date
 from django.utils import timezone
-from django.db.models import Sum
+from django.db import transaction
+from django.utils.decorators import method_decorator
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from fitness_api.db_routers import ReplicaReadMixin
 from .filters import WorkoutFilter
-from .utils import seconds_to_HHMMSS
+from .mixins import ConditionalGetMixin
+from .pagination import WORKOUT_LIST_ORDERING, WorkoutCursorPagination
+from .metrics import GROUP_BY_CHOICES, parse_metrics_params, compute_metrics
 from .models import Workout
-from .serializers import WorkoutSerializer, WorkoutListSerializer
+from .serializers import WorkoutSerializer, WorkoutBulkSerializer, WorkoutListSerializer, WORKOUT_LIST_FIELDS, workout_list_representation
+from .rollups import add_workouts
+from .exports import EXPORT_FORMATS, export_rows, export_stream, aexport_rows, aexport_stream
+from .importers import IMPORT_FORMATS, ImportFileError, import_workouts
+from .tracks import (parse_trackpoints, store_track, workout_track, analyze_track, from_epoch_ms,
+                     ROUTE_RESOLUTIONS, parse_route_params, route_representation)
+from .cache import get_or_compute_metrics, mark_workouts_changed
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import ValidationError, NotFound
+from rest_framework.settings import api_settings
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
@@ -38,7 +51,80 @@ class WorkoutCreateView(generics.CreateAPIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-class WorkoutListView(generics.ListAPIView):
+class WorkoutBulkCreateView(generics.CreateAPIView):
+    '''
+    API endpoint that allows authenticated users to upload a batch of finished workouts at once
+    (e.g. a wearable sync) instead of one request per workout.
+    Permissions:
+    - Authenticated users only.
+    Description:
+    - Accepts a list of workouts with activity_type, start_time, end_time and distance.
+    - Duration and calories burned are computed in Python and all workouts are inserted with a
+      single bulk insert inside one transaction.
+    Responses:
+    - 201 Created: Returns the created workouts.
+    - 400 Bad Request: Nothing is saved; returns a list of errors with one entry per item
+      (empty for valid items).
+    '''
+    serializer_class = WorkoutBulkSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    max_batch_size = 1000
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data, many=True, allow_empty=False, max_length=self.max_batch_size)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        workouts = []
+        for item in serializer.validated_data:
+            workout = Workout(user_id=request.user, date=item['start_time'], **item)
+            workout.duration = workout.end_time - workout.start_time #bulk_create skips the EndWorkout signal
+            workout.calories_burned = workout.calculate_calories() #profile is loaded once and cached on request.user
+            workouts.append(workout)
+
+        with transaction.atomic():
+            Workout.objects.bulk_create(workouts, batch_size=500)
+            add_workouts(workouts) #bulk_create skips the rollup signals too
+        mark_workouts_changed(request.user.id)
+        return Response(WorkoutSerializer(workouts, many=True).data, status=status.HTTP_201_CREATED)
+
+class WorkoutImportView(generics.GenericAPIView):
+    '''
+    API endpoint that imports historical workouts from an uploaded CSV or NDJSON file
+    (e.g. when migrating from another tracker).
+    Permissions:
+    - Authenticated users only.
+    Request (multipart/form-data):
+    - file: CSV with a header row, or NDJSON. Each row needs activity_type, start_time and
+      end_time (ISO 8601); distance is optional.
+    - file_format (optional): csv or ndjson, defaults to the file extension.
+    Description:
+    - Rows are parsed and validated in chunks and inserted in bounded transactions, with duration
+      and calories computed in batch. Invalid rows are skipped and reported with their line number.
+    - Uploading the same file again resumes an interrupted import from its last checkpoint.
+    Responses:
+    - 200 OK: Returns the import summary, including throughput in rows/sec.
+    - 400 Bad Request: If no file is uploaded, the format is unknown or the file cannot be read
+      (not UTF-8 text, NUL bytes, malformed CSV).
+    '''
+    permission_classes = [permissions.IsAuthenticated]
+    chunk_size = 1000
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': "A CSV or NDJSON file is required"})
+        file_format = request.data.get('file_format') or upload.name.rsplit('.', 1)[-1].lower()
+        if file_format not in IMPORT_FORMATS:
+            raise ValidationError({'file_format': f"Invalid file format, choose from: {', '.join(IMPORT_FORMATS)}"})
+
+        try:
+            result = import_workouts(request.user, upload.file, file_format, file_name=upload.name, chunk_size=self.chunk_size)
+        except ImportFileError as error:
+            raise ValidationError({'file': str(error)})
+        return Response(result, status=status.HTTP_200_OK)
+
+class WorkoutListView(ConditionalGetMixin, ReplicaReadMixin, generics.ListAPIView):
     """
     List all workouts with optional filtering by activity type, workout name and date range.
 
@@ -47,6 +133,16 @@ class WorkoutListView(generics.ListAPIView):
     - workout_name: Filter workouts by workout names
     - date: Filter workouts by date ranges
 
+    Conditional GET:
+    - Responses carry ETag / Last-Modified validators; a matching If-None-Match or
+      If-Modified-Since returns 304 Not Modified without running the list query.
+
+    Pagination:
+    - pagination=page (default): page number pagination (?page=N), ordered by (date, id), newest first
+      like the cursor mode and AsyncWorkoutListView.
+    - pagination=cursor: keyset pagination ordered by (date, id), newest first. Follow the `next`
+      links; add count=true to include the total count.
+
     Permissions:
     - Only authenticated users can access this view.
     """
@@ -54,16 +150,91 @@ class WorkoutListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_class = WorkoutFilter #correction: Set filterset_fields to filter_class
+    pagination_classes = {
+        'page': api_settings.DEFAULT_PAGINATION_CLASS,
+        'cursor': WorkoutCursorPagination,
+    }
+
+    #select the pagination mode per request
+    @property
+    def pagination_class(self):
+        request = getattr(self, 'request', None)
+        mode = request.query_params.get('pagination', 'page') if request is not None else 'page'
+        if mode not in self.pagination_classes:
+            raise ValidationError({'pagination': f"Invalid pagination, choose from: {', '.join(self.pagination_classes)}"})
+        return self.pagination_classes[mode]
 
     #override get_query to list workouts filtered by the request.user
     def get_queryset(self):
-        return Workout.objects.filter(user_id=self.request.user)
+        return Workout.objects.filter(user_id=self.request.user).order_by(*WORKOUT_LIST_ORDERING)
+
+    #fetch plain rows and serialize them with the fast path (same output as WorkoutListSerializer)
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).values_list(*WORKOUT_LIST_FIELDS, named=True)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(workout_list_representation(page))
+        return Response(workout_list_representation(queryset))
+
+class WorkoutExportView(generics.GenericAPIView):
+    '''
+    Streams the authenticated user's full workout history as CSV (export/csv/) or NDJSON (export/ndjson/).
+
+    - Rows have the same fields and formatting as the workout list (WorkoutListSerializer).
+    - Accepts the same filters as the workout list (activity_type, duration, date_range).
+    - Rows are read through a server-side cursor and written as they are fetched,
+      so memory stays flat regardless of the history size. Under ASGI the stream is an async
+      iterator (Django reads a sync one to the end before sending it there).
+
+    Permissions:
+    - Only authenticated users can access this view.
+    '''
+    serializer_class = WorkoutListSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = WorkoutFilter
+    chunk_size = 2000
+
+    def get_queryset(self):
+        return Workout.objects.filter(user_id=self.request.user).order_by('date', 'id')
+
+    # the response is not rendered by DRF, so don't reject Accept headers like text/csv
+    def perform_content_negotiation(self, request, force=False):
+        return super().perform_content_negotiation(request, force=True)
 
-class WorkoutDetailView(generics.RetrieveAPIView):
+    def get(self, request, export_format, *args, **kwargs):
+        if export_format not in EXPORT_FORMATS:
+            raise NotFound(f"Unknown export format, choose from: {', '.join(EXPORT_FORMATS)}")
+        content_type = EXPORT_FORMATS[export_format][0]
+        workouts = self.filter_queryset(self.get_queryset())
+        if isinstance(request._request, ASGIRequest):
+            stream = aexport_stream(export_format, aexport_rows(workouts, self.chunk_size))
+        else:
+            stream = export_stream(export_format, export_rows(workouts, self.chunk_size))
+        response = StreamingHttpResponse(stream, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="workouts.{export_format}"'
+        return response
+
+# Make the route parameters available on Swagger UI
+@method_decorator(name='get', decorator=swagger_auto_schema(
+    manual_parameters=[
+        openapi.Parameter('resolution', openapi.IN_QUERY, description="Include the GPS route at this resolution", type=openapi.TYPE_STRING, enum=list(ROUTE_RESOLUTIONS)),
+        openapi.Parameter('tolerance', openapi.IN_QUERY, description="Include the GPS route simplified to this tolerance in meters", type=openapi.TYPE_NUMBER),
+    ]
+))
+class WorkoutDetailView(ConditionalGetMixin, ReplicaReadMixin, generics.RetrieveAPIView):
     '''
     This view allows authenticated users to access their workout details. 
     It supports retrieving a specific workout instance by its ID.
 
+    Responses carry ETag / Last-Modified validators for conditional GETs (304 Not Modified).
+
+    Route (GPS track):
+    - Not included by default. Map clients ask for only as many points as they need with either
+      resolution=full|medium|low (precomputed at upload, ~5 m and ~25 m for medium and low) or
+      tolerance=<meters> (the precomputed level when one matches it, otherwise the full route simplified on the fly).
+    - Returned as a GeoJSON LineString in "route", null when the workout has no track.
+
     Attributes:
         serializer_class: The serializer used for returning workout data.
         permission_classes: Permissions required to access this view.
@@ -75,6 +246,16 @@ class WorkoutDetailView(generics.RetrieveAPIView):
     def get_queryset(self):
         return Workout.objects.filter(user_id=self.request.user)
 
+    #fetch a plain row and serialize it with the fast path (same output as WorkoutListSerializer)
+    def retrieve(self, request, *args, **kwargs):
+        route_field, tolerance = parse_route_params(request.query_params)
+        fields = WORKOUT_LIST_FIELDS + ((route_field,) if route_field else ()) #requested route level, same query
+        row = get_object_or_404(self.get_queryset().values_list(*fields), pk=self.kwargs['pk'])
+        data = workout_list_representation([row[:len(WORKOUT_LIST_FIELDS)]])[0]
+        if route_field:
+            data['route'] = route_representation(row[-1], tolerance)
+        return Response(data)
+
 class WorkoutUpdateView(generics.RetrieveUpdateAPIView):
     '''
     - Allows users to retrieve and update details of a specific workout instance.
@@ -86,9 +267,12 @@ class WorkoutUpdateView(generics.RetrieveUpdateAPIView):
     serializer_class = WorkoutSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    # filter objects returned by the user_id
+    # filter objects returned by the user_id, loading the user's profile in the same query
+    # so calculate_calories does not fetch the user and profile lazily
     def get_queryset(self):
-        return Workout.objects.filter(user_id=self.request.user)
+        return (Workout.objects.filter(user_id=self.request.user)
+                .select_related('user_id__profile')
+                .defer('route', 'route_times', 'route_elevations', 'route_medium', 'route_low')) #tracks can be large and are not edited here
 
     def update(self, request, *args, **kwargs):
         activity = self.get_object() #get the instance model
@@ -105,6 +289,68 @@ class WorkoutUpdateView(generics.RetrieveUpdateAPIView):
                 serializer.save()
                 return Response(serializer.data, status=status.HTTP_200_OK)
 
+class WorkoutTrackView(ReplicaReadMixin, generics.GenericAPIView):
+    '''
+    API endpoint for the GPS track of a workout.
+    Permissions:
+    - Authenticated users only, for their own workouts.
+    Methods:
+    - GET: Returns the track analytics: distance, elapsed and moving time, average pace (s/km),
+      max speed, elevation gain and loss, and splits every `split` meters (default 1000).
+    - POST: Uploads trackpoints in batches. Request body:
+      - points: list of {"lat", "lon", "time", "ele"} objects, time as ISO 8601 or epoch seconds,
+        ele (elevation in meters) optional.
+    Description:
+    - Points are merged into the stored track (a point at an already stored time replaces it), so
+      a device can upload a long track in several batches.
+    - The track is stored compactly on the workout row (see activity/tracks.py) and feeds the
+      workout: distance, moving time, elevation gain and start/end time come from the track and
+      calories are recomputed from the moving time and the climb.
+    Responses:
+    - 200 OK: Returns the number of points, the track start and end and the analytics.
+    - 400 Bad Request: If a point or the split length is invalid; nothing is saved.
+    - 404 Not Found: On GET, if the workout has no track.
+    '''
+    permission_classes = [permissions.IsAuthenticated]
+    min_split, max_split = 100, 100000
+
+    def get_queryset(self):
+        return Workout.objects.filter(user_id=self.request.user).select_related('user_id__profile')
+
+    def track_response(self, workout, track, analytics):
+        return Response({
+            'id': workout.id,
+            'points': len(track),
+            'track_start': from_epoch_ms(track[0][0]),
+            'track_end': from_epoch_ms(track[-1][0]),
+            **analytics,
+        }, status=status.HTTP_200_OK)
+
+    def get(self, request, *args, **kwargs):
+        try:
+            split_length = float(request.query_params.get('split', 1000))
+        except ValueError:
+            split_length = None
+        if split_length is None or not self.min_split <= split_length <= self.max_split:
+            raise ValidationError({'split': f"Split must be a number of meters between {self.min_split} and {self.max_split}"})
+        workout = self.get_object()
+        track = workout_track(workout)
+        if not track:
+            raise NotFound("This workout has no GPS track")
+        return self.track_response(workout, track, analyze_track(track, split_length))
+
+    def post(self, request, *args, **kwargs):
+        workout = self.get_object()
+        points = request.data.get('points') if isinstance(request.data, dict) else None
+        try:
+            track, analytics = store_track(workout, parse_trackpoints(points))
+        except ValueError as error:
+            raise ValidationError({'points': str(error)})
+        workout.save(update_fields=[
+            'route', 'route_times', 'route_elevations', 'route_medium', 'route_low', 'start_point', 'distance', 'moving_time', 'elevation_gain',
+            'start_time', 'end_time', 'duration', 'calories_burned'])
+        return self.track_response(workout, track, analytics)
+
 class WorkoutDeleteView(generics.DestroyAPIView):
     '''
     - Requires authentication (user must be logged in).
@@ -119,7 +365,15 @@ class WorkoutDeleteView(generics.DestroyAPIView):
     def get_queryset(self):
         return Workout.objects.filter(user_id=self.request.user)
 
-class WorkoutMetricsView(generics.ListAPIView):
+# Make start_date, end_date and group_by parameters available on Swagger UI
+@method_decorator(name='get', decorator=swagger_auto_schema(
+    manual_parameters=[
+        openapi.Parameter('start_date', openapi.IN_QUERY, description="Start date for filtering workouts", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+        openapi.Parameter('end_date', openapi.IN_QUERY, description="End date for filtering workouts", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
+        openapi.Parameter('group_by', openapi.IN_QUERY, description="Break down totals by period or activity type", type=openapi.TYPE_STRING, enum=list(GROUP_BY_CHOICES)),
+    ]
+))
+class WorkoutMetricsView(ConditionalGetMixin, ReplicaReadMixin, generics.ListAPIView):
     '''
     Function:
     View summary of all activities (total duration, total distance covered, and total caloried burned)
@@ -128,63 +382,29 @@ class WorkoutMetricsView(generics.ListAPIView):
     Query Parameters:
     - start_date (str): Start date of the range in "YYYY-MM-DD" format.
     - end_date (str): End date of the range in "YYYY-MM-DD" format.
+    - group_by (str): Optional breakdown of the totals by day, week, month or activity_type.
 
     Responses:
-    - 200 OK: Returns total duration, distance, and calories burned for the given period.
+    - 200 OK: Returns total duration, distance, and calories burned for the given period
+              (plus a "breakdown" list when group_by is set).
     - 400 Bad Request: If the date range is invalid or there are pending workouts (missing duration).
     
     Permissions:
     - Requires authenticated users to access.
+
+    All metrics (pending check, totals and breakdown) are computed in a single query, against the
+    daily rollup table when both dates are given and against raw workouts otherwise.
+    Results are cached per user until one of the user's workouts changes (see activity/cache.py),
+    and clients revalidating with If-None-Match / If-Modified-Since get a 304 Not Modified.
     '''
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = WorkoutListSerializer
 
-    # Make start_date and end_date parameters available on Swagger UI
-    @swagger_auto_schema(
-        manual_parameters=[
-            openapi.Parameter('start_date', openapi.IN_QUERY, description="Start date for filtering workouts", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
-            openapi.Parameter('end_date', openapi.IN_QUERY, description="End date for filtering workouts", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE),
-        ]
-    )
-    def get(self, request, *args, **kwargs):
-        #get date range from query parameters
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-
-        #validate data inputs
-        if start_date:
-            start_date = parse_date(start_date)
-            if not start_date:
-                raise ValidationError({'start_date': "Invalid start date format"})
-        if end_date:
-            end_date = parse_date(end_date)
-            if not end_date:
-                raise ValidationError({'end_date': "Invalid start date format"})
-
-        # filter workouts by the user within the date range
-        workouts = Workout.objects.filter(user_id=request.user, date__range=(start_date, end_date))
-
-        if workouts.filter(duration__isnull=True).exists():
-            return Response({"error": "Please update all pending workouts before running metrics"}, status=status.HTTP_400_BAD_REQUEST)   
-        #calculate metrics
-        else:
-            total_duration = workouts.aggregate(total_duration=Sum('duration'))['total_duration']
-            total_distance = workouts.aggregate(total_distance=Sum('distance'))['total_distance']
-            total_calories_burned = workouts.aggregate(total_calories_burned=Sum('calories_burned'))['total_calories_burned']
-
-            if total_duration:
-                #covert total duration from timedelta to seconds
-                seconds = total_duration.total_seconds()
-                #convert seconds to HH:MM:SS format
-                readable_time_format = seconds_to_HHMMSS(seconds)
-            else:
-                readable_time_format = "00:00:00"
-
-            response = {
-                "start_date": start_date,
-                "end_date": end_date,
-                "total_duration": readable_time_format,
-                "total_distance": total_distance,
-                "total_calories_burned": total_calories_burned,
-            }
-            return Response(response, status=status.HTTP_200_OK)
\ No newline at end of file
+    def list(self, request, *args, **kwargs):
+        start_date, end_date, group_by = parse_metrics_params(request.query_params)
+
+        #serve repeated queries from the per-user metrics cache
+        data, status_code = get_or_compute_metrics(
+            request.user.id, (start_date, end_date, group_by),
+            lambda: compute_metrics(request.user, start_date, end_date, group_by))
+        return Response(data, status=status_code)
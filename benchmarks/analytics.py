@@ -0,0 +1,50 @@
+'''
+Track analytics over 1k, 10k and 100k points.
+
+Times activity.analytics.track_analytics directly on synthetic columns (a ride sampled every
+second, as in benchmarks.tracks), and each of its passes on its own, at every --sizes size.
+No database is needed. The passes are plain Python over whole columns, so the time is expected
+to grow linearly with the number of points.
+
+Usage:
+    python -m benchmarks.analytics --sizes 1000 10000 100000
+'''
+import argparse
+import math
+from itertools import accumulate
+from benchmarks.common import measure, report
+from activity.analytics import compute_splits, elevation_changes, segment_distances, track_analytics
+
+def synthetic_columns(count, start=1_700_000_000_000):
+    '''
+    The (times, lats, lons, elevations) columns of a ride around a 5 km loop sampled every
+    second, with a rolling elevation profile and a stop every 10 minutes.
+    '''
+    angles = [2 * math.pi * index / 1200 for index in range(count)]
+    stopped = [index % 600 < 30 for index in range(count)]
+    steps = list(accumulate((0.0 if stop else 1.0 for stop in stopped), initial=0.0))[1:]
+    times = [start + index * 1000 for index in range(count)]
+    lats = [52.52 + 0.0072 * math.sin(2 * math.pi * step / 1200) for step in steps]
+    lons = [13.405 + 0.0118 * math.cos(2 * math.pi * step / 1200) for step in steps]
+    elevations = [35.0 + 12 * math.sin(angle * 3) for angle in angles]
+    return times, lats, lons, elevations
+
+def main():
+    parser = argparse.ArgumentParser(description="Track analytics benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        times, lats, lons, elevations = synthetic_columns(size)
+        segments = segment_distances(lats, lons)
+        seconds = [(time - times[0]) / 1000 for time in times]
+        cumulative = list(accumulate(segments, initial=0.0))
+        print(f"{size} points")
+        report('  track_analytics', measure(lambda: track_analytics(times, lats, lons, elevations), args.repeat), size, 'points')
+        report('  segment distances', measure(lambda: segment_distances(lats, lons), args.repeat), size, 'points')
+        report('  elevation changes', measure(lambda: elevation_changes(elevations), args.repeat), size, 'points')
+        report('  splits', measure(lambda: compute_splits(seconds, cumulative), args.repeat), size, 'points')
+
+if __name__ == '__main__':
+    main()
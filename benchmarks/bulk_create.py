@@ -0,0 +1,56 @@
+'''
+Per-row vs bulk workout upload.
+
+Uploads the same number of workouts once with one POST workouts/new/ per workout
+(WorkoutCreateView) and once in POST workouts/bulk/ batches (WorkoutBulkCreateView), and prints
+the time, workouts/sec and queries of each. Per-row uploads create pending workouts, as the
+create endpoint takes no start/end times; the bulk ones are finished workouts with calories,
+so the comparison favours the per-row path.
+
+Usage:
+    python -m benchmarks.bulk_create --workouts 1000 --batch-size 500
+'''
+import argparse
+from datetime import timedelta
+from benchmarks.common import setup_django, benchmark_database, create_user, api_client, count_queries, measure, report
+
+setup_django()
+
+from django.urls import reverse # noqa: E402 (needs the apps loaded above)
+from django.utils import timezone # noqa: E402
+from activity.utils import chunked # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-row vs bulk workout upload")
+    parser.add_argument('--workouts', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=500, help="Workouts per bulk request (at most 1000)")
+    args = parser.parse_args()
+
+    with benchmark_database():
+        client = api_client(create_user('bulk-benchmark'))
+        start = timezone.now() - timedelta(days=30)
+        items = [{
+            'activity_type': 'Running',
+            'start_time': (start + timedelta(minutes=index)).isoformat(),
+            'end_time': (start + timedelta(minutes=index + 30)).isoformat(),
+            'distance': 5000.0,
+        } for index in range(args.workouts)]
+
+        def per_row():
+            for item in items:
+                response = client.post(reverse('workout-list-create'), {'activity_type': item['activity_type'], 'distance': item['distance']}, format='json')
+                assert response.status_code == 201, response.content
+
+        def bulk():
+            for batch in chunked(items, args.batch_size):
+                response = client.post(reverse('workout-bulk-create'), batch, format='json')
+                assert response.status_code == 201, response.content
+
+        print(f"{args.workouts} workouts")
+        for label, upload in (('per-row (workouts/new/)', per_row), (f'bulk (workouts/bulk/, {args.batch_size} per request)', bulk)):
+            with count_queries() as queries:
+                durations = measure(upload, repeat=1)
+            report(label, durations, args.workouts, 'workouts', len(queries))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+'''
+Helpers shared by the benchmark scripts.
+
+Run the scripts from the project root with the environment of the API (DATABASE_URL, ...), e.g.
+`python -m benchmarks.bulk_create`. Scripts that need data create a throwaway test database, like
+`manage.py test` does, and drop it at the end, so the configured database is never written to.
+'''
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fitness_api.settings')
+    import django
+    django.setup()
+
+@contextmanager
+def benchmark_database():
+    '''
+    Creates a test database for the duration of the block. Requests go through the test client
+    settings: plain HTTP and no read replicas.
+    '''
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    overrides = override_settings(SECURE_SSL_REDIRECT=False, DATABASE_REPLICAS=[])
+    overrides.enable()
+    try:
+        yield
+    finally:
+        overrides.disable()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+def create_user(username, password='benchmark-password', weight=70.0):
+    from django.contrib.auth import get_user_model
+    from accounts.models import Profile
+    user = get_user_model().objects.create_user(username=username, password=password)
+    Profile.objects.filter(user=user).update(weight=weight)
+    return get_user_model().objects.select_related('profile').get(pk=user.pk)
+
+def api_client(user):
+    '''
+    Returns a test API client sending a JWT of the user, so requests authenticate like real ones.
+    '''
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.tokens import AccessToken
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    return client
+
+@contextmanager
+def count_queries():
+    '''
+    Records the SQL of every query run on the default database in the block (with no limit,
+    unlike the test client's query log); yields the list.
+    '''
+    from django.db import connection
+    queries = []
+    def record(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+    with connection.execute_wrapper(record):
+        yield queries
+
+def measure(function, repeat=5):
+    '''
+    Calls function() `repeat` times and returns the durations in seconds.
+    '''
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+def report(label, durations, items=None, unit='rows', queries=None):
+    '''
+    Prints the median and best duration of a measurement, with the rate of `items` per second
+    and the number of queries when given.
+    '''
+    median = statistics.median(durations)
+    line = f'{label:<36} median {median * 1000:10.2f} ms  best {min(durations) * 1000:10.2f} ms'
+    if items is not None:
+        line += f'  {items / median:12,.0f} {unit}/s'
+    if queries is not None:
+        line += f'  {queries} queries'
+    print(line)
+
+# Load scripts drive a running server (gunicorn, uvicorn, ...) over HTTP. The settings redirect
+# plain HTTP to HTTPS and only allow the production host, so requests claim to come through the
+# TLS proxy (SECURE_PROXY_SSL_HEADER) and may carry an allowed Host header.
+def server_headers(host=None):
+    headers = {'X-Forwarded-Proto': 'https'}
+    if host:
+        headers['Host'] = host
+    return headers
+
+def server_token(base_url, username, password, headers):
+    '''
+    Registers the user on the server (a taken username is fine) and returns a JWT from auth/.
+    '''
+    import requests
+    requests.post(f'{base_url}/user/register/', json={'username': username, 'password': password, 'password2': password}, headers=headers)
+    response = requests.post(f'{base_url}/auth/', json={'username': username, 'password': password}, headers=headers)
+    response.raise_for_status()
+    return response.json()['access']
+
+def http_load(request, total, concurrency):
+    '''
+    Calls request(session, index) `total` times from `concurrency` threads, each with its own
+    keep-alive requests session, and returns (latencies in seconds, elapsed seconds, errors).
+    request returns the response; 4xx/5xx responses and exceptions count as errors.
+    '''
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    import requests
+    local = threading.local()
+
+    def call(index):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            failed = request(session, index).status_code >= 400
+        except requests.RequestException:
+            failed = True
+        return time.perf_counter() - start, failed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(call, range(total)))
+    elapsed = time.perf_counter() - start
+    return [latency for latency, _ in results], elapsed, sum(failed for _, failed in results)
+
+def report_load(label, latencies, elapsed, errors):
+    latencies = sorted(latencies)
+    def percentile(fraction):
+        return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000
+    print(f'{label:<36} {len(latencies) / elapsed:10,.1f} req/s  p50 {percentile(0.5):8.1f} ms  '
+          f'p95 {percentile(0.95):8.1f} ms  p99 {percentile(0.99):8.1f} ms  {errors} errors')
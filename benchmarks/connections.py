@@ -0,0 +1,62 @@
+'''
+Database connection setup cost and request latency per connection mode.
+
+1. In process: times SELECT 1 on a fresh connection (connect + query, what every request pays
+   with DATABASE_CONN_MAX_AGE=0) against SELECT 1 on a reused one. Read-only.
+2. With --url: loads a running server with concurrent GETs of the profile and workout list
+   endpoints and prints req/s and latency percentiles. Start the server once per mode and
+   compare the runs, e.g.:
+       DATABASE_CONN_MAX_AGE=0 gunicorn fitness_api.wsgi -w 4 --threads 8
+       DATABASE_CONN_MAX_AGE=60 gunicorn fitness_api.wsgi -w 4 --threads 8
+       DATABASE_POOL=True DATABASE_POOL_MAX_SIZE=8 gunicorn fitness_api.wsgi -w 4 --threads 8
+       DATABASE_POOL=True DATABASE_POOL_MAX_SIZE=8 uvicorn fitness_api.asgi:application --workers 4
+       python -m benchmarks.connections --url http://127.0.0.1:8000 --host fitness-tracker-api-83sd.onrender.com
+
+Usage:
+    python -m benchmarks.connections [--url URL] [--concurrency 32] [--requests 2000]
+'''
+import argparse
+from benchmarks.common import setup_django, measure, report, server_headers, server_token, http_load, report_load
+
+setup_django()
+
+from django.db import connection # noqa: E402 (needs the apps loaded above)
+
+def select_one():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+def fresh_connection():
+    connection.close()
+    select_one()
+
+def main():
+    parser = argparse.ArgumentParser(description="Connection setup cost and latency per connection mode")
+    parser.add_argument('--connections', type=int, default=50, help="Fresh connections to time in process")
+    parser.add_argument('--url', help="Base URL of a running server to load")
+    parser.add_argument('--host', help="Host header, one of ALLOWED_HOSTS")
+    parser.add_argument('--username', default='load-benchmark')
+    parser.add_argument('--password', default='load-benchmark-password')
+    parser.add_argument('--requests', type=int, default=2000, help="Requests per endpoint")
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    if connection.settings_dict['OPTIONS'].get('pool'):
+        print("DATABASE_POOL is on: closing returns connections to the pool, so both rows measure a pooled checkout")
+    report('SELECT 1 on a new connection', measure(fresh_connection, args.connections), 1, 'connections')
+    select_one()
+    report('SELECT 1 on a reused connection', measure(select_one, args.connections), 1, 'queries')
+    connection.close()
+
+    if args.url:
+        base = args.url.rstrip('/')
+        headers = server_headers(args.host)
+        headers['Authorization'] = f'Bearer {server_token(base, args.username, args.password, headers)}'
+        print(f"{args.requests} requests per endpoint, concurrency {args.concurrency}")
+        for label, path in (('profile', 'user/profile/update/'), ('workout list', 'api/workouts/')):
+            url = f'{base}/{path}'
+            report_load(label, *http_load(lambda session, index: session.get(url, headers=headers), args.requests, args.concurrency))
+
+if __name__ == '__main__':
+    main()
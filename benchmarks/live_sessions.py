@@ -0,0 +1,109 @@
+'''
+Load test of live workout sessions.
+
+Opens --sessions concurrent WebSocket sessions on the ASGI application of activity/live.py
+in process (no server or WebSocket client needed: each connection is driven through the ASGI
+receive/send callables). Every session sends --samples samples, one message each --interval
+seconds, then finishes its workout. Prints sessions opened and finished, messages/sec, the
+latency from a sample message to its totals reply, and the memory held per open session.
+
+Usage:
+    python -m benchmarks.live_sessions --sessions 5000 --samples 60 --interval 1
+'''
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+from benchmarks.common import setup_django, benchmark_database, create_user
+
+setup_django()
+
+from django.utils import timezone # noqa: E402 (needs the apps loaded above)
+from rest_framework_simplejwt.tokens import AccessToken # noqa: E402
+from activity.live import live_session_application # noqa: E402
+from activity.models import Workout # noqa: E402
+
+class Stats:
+    def __init__(self):
+        self.accepted = self.finished = self.messages = 0
+        self.latencies = []
+        self.close_codes = {}
+
+async def run_session(workout_id, token, start, args, stats):
+    '''
+    Drives one session through the ASGI callables and records its replies.
+    '''
+    scope = {
+        'type': 'websocket',
+        'path': f'/ws/workouts/{workout_id}/live/',
+        'headers': [(b'authorization', b'Bearer ' + token)],
+        'query_string': b'',
+    }
+    messages = [{'type': 'websocket.connect'}]
+    for index in range(args.samples):
+        sample = {'lat': 52.52 + index * 0.0001, 'lon': 13.405, 'time': start + index * args.interval, 'ele': 35.0}
+        messages.append({'type': 'websocket.receive', 'text': json.dumps(sample)})
+    messages.append({'type': 'websocket.receive', 'text': '{"type": "finish"}'})
+    sent_at = []
+
+    async def receive():
+        if len(sent_at) > 1:
+            await asyncio.sleep(args.interval)
+        if not messages:
+            return {'type': 'websocket.disconnect', 'code': 1000}
+        sent_at.append(time.perf_counter())
+        return messages.pop(0)
+
+    async def send(message):
+        if message['type'] == 'websocket.accept':
+            stats.accepted += 1
+        elif message['type'] == 'websocket.close':
+            stats.close_codes[message.get('code')] = stats.close_codes.get(message.get('code'), 0) + 1
+        elif message['type'] == 'websocket.send':
+            stats.messages += 1
+            stats.latencies.append(time.perf_counter() - sent_at[-1])
+            if json.loads(message['text'])['type'] == 'finished':
+                stats.finished += 1
+
+    await live_session_application(scope, receive, send)
+
+async def run_load(workout_ids, token, start, args):
+    stats = Stats()
+    tracemalloc.start()
+    began = time.perf_counter()
+    tasks = [asyncio.create_task(run_session(workout_id, token, start, args, stats)) for workout_id in workout_ids]
+    await asyncio.sleep(args.interval * args.samples / 2)
+    open_memory, _ = tracemalloc.get_traced_memory() #mid-run, every session open
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - began
+    tracemalloc.stop()
+    return stats, elapsed, open_memory
+
+def main():
+    parser = argparse.ArgumentParser(description="Live workout sessions load test")
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--samples', type=int, default=30, help="Sample messages per session")
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between the messages of a session")
+    args = parser.parse_args()
+
+    with benchmark_database():
+        user = create_user('live-benchmark')
+        now = timezone.now()
+        workouts = Workout.objects.bulk_create(
+            Workout(user_id=user, activity_type='Running', start_time=now - timedelta(seconds=1), date=now)
+            for _ in range(args.sessions))
+        token = str(AccessToken.for_user(user)).encode()
+        stats, elapsed, open_memory = asyncio.run(run_load([workout.id for workout in workouts], token, now.timestamp(), args))
+
+    latencies = sorted(stats.latencies) or [0.0]
+    print(f"{args.sessions} sessions x {args.samples} samples every {args.interval}s in {elapsed:.1f}s")
+    print(f"accepted {stats.accepted}, finished {stats.finished}, close codes {stats.close_codes}")
+    print(f"{stats.messages / elapsed:,.0f} replies/s, latency median {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p99 {latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000:.1f} ms")
+    print(f"{open_memory / 1024 / max(args.sessions, 1):.1f} KiB traced per open session")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+'''
+Load test of the sync (WSGI) vs async (ASGI) read endpoints against a running server.
+
+Sends the same number of concurrent GETs to the workout list, detail and metrics endpoints and
+to their async variants (api/async/...), and prints req/s and latency percentiles. Run it once
+against each deployment, e.g.:
+    gunicorn fitness_api.wsgi -w 4 -b 127.0.0.1:8000
+    uvicorn fitness_api.asgi:application --workers 4 --port 8001   (any ASGI server)
+    python -m benchmarks.load_asgi --url http://127.0.0.1:8000 --host fitness-tracker-api-83sd.onrender.com
+Under WSGI the async views run through Django's async adapter, so expect them to be slower
+there; under ASGI they should keep their throughput at higher concurrency.
+The benchmark user is registered through the API and given --seed workouts on the first run.
+'''
+import argparse
+from datetime import datetime, timedelta, timezone
+from benchmarks.common import server_headers, server_token, http_load, report_load
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async read endpoints under load")
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help="Base URL of the server")
+    parser.add_argument('--host', help="Host header, one of ALLOWED_HOSTS")
+    parser.add_argument('--username', default='load-benchmark')
+    parser.add_argument('--password', default='load-benchmark-password')
+    parser.add_argument('--requests', type=int, default=2000, help="Requests per endpoint")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=500, help="Workouts to create when the user has none")
+    args = parser.parse_args()
+
+    import requests
+    base = args.url.rstrip('/')
+    headers = server_headers(args.host)
+    headers['Authorization'] = f'Bearer {server_token(base, args.username, args.password, headers)}'
+
+    workouts = requests.get(f'{base}/api/workouts/', headers=headers).json()
+    if not workouts['count']:
+        start = datetime.now(timezone.utc) - timedelta(days=args.seed)
+        items = [{'activity_type': 'Running', 'start_time': (start + timedelta(days=index)).isoformat(),
+                  'end_time': (start + timedelta(days=index, minutes=40)).isoformat(), 'distance': 8000.0}
+                 for index in range(args.seed)]
+        for offset in range(0, len(items), 1000):
+            requests.post(f'{base}/api/workouts/bulk/', json=items[offset:offset + 1000], headers=headers).raise_for_status()
+        workouts = requests.get(f'{base}/api/workouts/', headers=headers).json()
+    pk = workouts['results'][0]['id']
+
+    endpoints = [
+        ('list', 'api/workouts/?page=2'),
+        ('detail', f'api/workouts/{pk}/'),
+        ('metrics', 'api/workouts/metrics/?group_by=month'),
+    ]
+    print(f"{args.requests} requests per endpoint, concurrency {args.concurrency}")
+    for label, path in endpoints:
+        for variant, prefix in (('sync', ''), ('async', 'async/')):
+            url = f"{base}/{path.replace('api/', 'api/' + prefix, 1)}"
+            result = http_load(lambda session, index: session.get(url, headers=headers), args.requests, args.concurrency)
+            report_load(f'{label} ({variant})', *result)
+
+if __name__ == '__main__':
+    main()
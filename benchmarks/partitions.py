@@ -0,0 +1,90 @@
+'''
+Partition pruning of the monthly workout partitions.
+
+Seeds --workouts workouts for --users users over the last --months months, one partition per
+month (see activity/partitions.py), and copies them into an unpartitioned table with the same
+indexes. For a few per-user queries it then prints the partitions the plan touches and the
+query latency against both tables, side by side. Queries bounded by date should touch one or
+two partitions; an unbounded one touches all of them. Needs PostgreSQL.
+
+Usage:
+    python -m benchmarks.partitions --months 24 --workouts 200000
+'''
+import argparse
+import re
+from datetime import timedelta
+from benchmarks.common import setup_django, benchmark_database, measure, report
+
+setup_django()
+
+from django.contrib.auth import get_user_model # noqa: E402 (needs the apps loaded above)
+from django.db import connection # noqa: E402
+from django.utils import timezone # noqa: E402
+from activity.models import Workout # noqa: E402
+from activity.partitions import TABLE, add_months, create_partition, is_partitioned, list_partitions # noqa: E402
+from activity.serializers import WORKOUT_LIST_FIELDS # noqa: E402
+
+PARTITION = re.compile(r'activity_workout_(p\d{6}|default)')
+FLAT_TABLE = f'{TABLE}_unpartitioned'
+
+def fetch(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+def main():
+    parser = argparse.ArgumentParser(description="Partition pruning of the workout table")
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--workouts', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        now = timezone.now()
+        current = now.date().replace(day=1)
+        with connection.cursor() as cursor:
+            if not is_partitioned(cursor):
+                raise SystemExit("activity_workout is not partitioned (PostgreSQL only, see migration 0010)")
+            existing = set(list_partitions(cursor))
+            for offset in range(1, args.months + 1):
+                month = add_months(current, -offset)
+                if month not in existing:
+                    create_partition(cursor, month)
+
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(username=f'partition-user-{index}', password='!') for index in range(args.users))
+        step = timedelta(days=30 * args.months) / args.workouts
+        Workout.objects.bulk_create((
+            Workout(user_id=users[index % args.users], activity_type='Running', date=now - step * index,
+                    start_time=now - step * index, end_time=now - step * index + timedelta(minutes=30),
+                    duration=timedelta(minutes=30), distance=5000.0, calories_burned=300.0)
+            for index in range(args.workouts)), batch_size=5000)
+        with connection.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {FLAT_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING INDEXES)")
+            cursor.execute(f"INSERT INTO {FLAT_TABLE} SELECT * FROM {TABLE}")
+            cursor.execute(f'ANALYZE {TABLE}')
+            cursor.execute(f'ANALYZE {FLAT_TABLE}')
+
+        user = users[0]
+        month_start = now - timedelta(days=45)
+        workouts = Workout.objects.filter(user_id=user)
+        queries = [
+            ('latest page', workouts.order_by('-date', '-id').values_list(*WORKOUT_LIST_FIELDS)[:10]),
+            ('one month range', workouts.filter(date__gte=month_start, date__lt=month_start + timedelta(days=30)).values_list(*WORKOUT_LIST_FIELDS)),
+            ('metrics last 90 days', workouts.filter(date__gte=now - timedelta(days=90)).values('activity_type').order_by()),
+            ('all history (no date bound)', workouts.values_list(*WORKOUT_LIST_FIELDS)),
+        ]
+        print(f"{args.workouts} workouts, {args.months + 1} monthly partitions vs one unpartitioned table")
+        for label, queryset in queries:
+            #same SQL on both tables, run through the cursor so only the query is timed
+            sql, params = queryset.query.sql_with_params()
+            flat_sql = sql.replace(f'"{TABLE}"', f'"{FLAT_TABLE}"')
+            plan = '\n'.join(line for line, in fetch(f'EXPLAIN {sql}', params))
+            partitions = len(set(PARTITION.findall(plan)))
+            print(label)
+            report(f'  partitioned ({partitions} partitions)', measure(lambda: fetch(sql, params), args.repeat))
+            report('  unpartitioned', measure(lambda: fetch(flat_sql, params), args.repeat))
+
+if __name__ == '__main__':
+    main()
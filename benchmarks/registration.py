@@ -0,0 +1,50 @@
+'''
+Registration and login throughput per password hasher profile.
+
+Registers --users users through POST user/register/ and logs each in through POST auth/, once
+per hasher profile of PASSWORD_HASHER_PROFILES, and prints requests/sec and the total queries.
+The strong profile is what production runs; hashing dominates its cost by design, so compare
+query counts against it and raw throughput against the fast profile.
+
+Usage:
+    python -m benchmarks.registration --users 200
+'''
+import argparse
+from benchmarks.common import setup_django, benchmark_database, count_queries, measure, report
+
+setup_django()
+
+from django.conf import settings # noqa: E402 (needs the apps loaded above)
+from django.test.utils import override_settings # noqa: E402
+from django.urls import reverse # noqa: E402
+from rest_framework.test import APIClient # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description="Registration and login throughput")
+    parser.add_argument('--users', type=int, default=200)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        client = APIClient()
+        print(f"{args.users} users per profile")
+        for profile, hashers in settings.PASSWORD_HASHER_PROFILES.items():
+            usernames = [f'{profile}-user-{index}' for index in range(args.users)]
+
+            def register():
+                for username in usernames:
+                    response = client.post(reverse('register'), {'username': username, 'password': 'benchmark-password', 'password2': 'benchmark-password'}, format='json')
+                    assert response.status_code == 201, response.content
+
+            def login():
+                for username in usernames:
+                    response = client.post(reverse('token_obtain_pair'), {'username': username, 'password': 'benchmark-password'}, format='json')
+                    assert response.status_code == 200, response.content
+
+            with override_settings(PASSWORD_HASHERS=hashers):
+                for label, function in (('register', register), ('login', login)):
+                    with count_queries() as queries:
+                        durations = measure(function, repeat=1)
+                    report(f'{label} ({profile} hashers)', durations, args.users, 'requests', len(queries))
+
+if __name__ == '__main__':
+    main()
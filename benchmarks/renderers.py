@@ -0,0 +1,51 @@
+'''
+DRF's JSONRenderer / JSONParser vs FastJSONRenderer / FastJSONParser.
+
+Renders a page of the workout list (from workout_list_representation) and parses a bulk upload
+body with each implementation, checks they agree and prints payloads/sec and MB/sec.
+No database is needed. Without orjson installed both sides run DRF's code.
+
+Usage:
+    python -m benchmarks.renderers --rows 1000
+'''
+import argparse
+import io
+from datetime import timedelta
+from benchmarks.common import setup_django, measure, report
+
+setup_django()
+
+from django.utils import timezone # noqa: E402 (needs the apps loaded above)
+from rest_framework.parsers import JSONParser # noqa: E402
+from rest_framework.renderers import JSONRenderer # noqa: E402
+from activity.serializers import workout_list_representation # noqa: E402
+from fitness_api.parsers import FastJSONParser # noqa: E402
+from fitness_api.renderers import FastJSONRenderer, orjson # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON renderer and parser benchmark")
+    parser.add_argument('--rows', type=int, default=1000, help="Workouts per payload")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    now = timezone.now()
+    rows = [(index, 'Cycling', timedelta(minutes=45, seconds=index % 60), 12345.6 + index, 420.25, now - timedelta(hours=index))
+            for index in range(args.rows)]
+    page = {'count': args.rows, 'next': None, 'previous': None, 'results': workout_list_representation(rows)}
+    body = JSONRenderer().render(page)
+    assert FastJSONRenderer().render(page) == body, "rendered output differs"
+    upload = JSONRenderer().render([
+        {'activity_type': 'Running', 'start_time': (now - timedelta(hours=index)).isoformat(),
+         'end_time': now.isoformat(), 'distance': 5000.0 + index} for index in range(args.rows)])
+    assert FastJSONParser().parse(io.BytesIO(upload)) == JSONParser().parse(io.BytesIO(upload)), "parsed data differs"
+
+    print(f"{args.rows} workouts per payload, {len(body) / 1e6:.2f} MB rendered, orjson {'installed' if orjson else 'not installed'}")
+    for label, renderer in (('render JSONRenderer', JSONRenderer()), ('render FastJSONRenderer', FastJSONRenderer())):
+        durations = measure(lambda: renderer.render(page), args.repeat)
+        report(label, durations, len(body) / 1e6, 'MB')
+    for label, json_parser in (('parse JSONParser', JSONParser()), ('parse FastJSONParser', FastJSONParser())):
+        durations = measure(lambda: json_parser.parse(io.BytesIO(upload)), args.repeat)
+        report(label, durations, len(upload) / 1e6, 'MB')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+'''
+Route payloads per resolution and tolerance.
+
+Stores a synthetic --points point track (see benchmarks/tracks.py) and fetches the workout
+detail with each precomputed resolution and a few tolerances, printing the number of route
+points, the payload size and the latency. Tolerances matching a precomputed level are served
+from it; the others simplify the full route on each request.
+
+Usage:
+    python -m benchmarks.routes --points 10000
+'''
+import argparse
+from datetime import timedelta
+from benchmarks.common import setup_django, benchmark_database, create_user, api_client, measure, report
+from benchmarks.tracks import synthetic_track
+
+setup_django()
+
+from django.urls import reverse # noqa: E402 (needs the apps loaded above)
+from django.utils import timezone # noqa: E402
+from activity.models import Workout # noqa: E402
+from activity.tracks import ROUTE_RESOLUTIONS # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description="Route payloads per resolution and tolerance")
+    parser.add_argument('--points', type=int, default=10000)
+    parser.add_argument('--tolerances', default='1,5,10,25,50', help="Comma separated tolerances in meters")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        user = create_user('route-benchmark')
+        client = api_client(user)
+        start = timezone.now() - timedelta(days=1)
+        workout = Workout.objects.create(user_id=user, activity_type='Cycling', start_time=start,
+                                         end_time=start + timedelta(seconds=args.points), date=start)
+        response = client.post(reverse('workout-track', args=[workout.pk]), {'points': synthetic_track(args.points, start.timestamp())}, format='json')
+        assert response.status_code == 200, response.content
+
+        url = reverse('workout-detail', args=[workout.pk])
+        params = [{}] + [{'resolution': resolution} for resolution in ROUTE_RESOLUTIONS]
+        params += [{'tolerance': tolerance} for tolerance in args.tolerances.split(',')]
+        print(f"{args.points} points")
+        for query in params:
+            response = client.get(url, query)
+            assert response.status_code == 200, response.content
+            route = response.data.get('route')
+            points = len(route['coordinates']) if route else 0
+            label = ', '.join(f'{key}={value}' for key, value in query.items()) or 'no route'
+            durations = measure(lambda: client.get(url, query), args.repeat)
+            report(f'{label}: {points} points, {len(response.content) / 1024:.1f} KiB', durations)
+
+if __name__ == '__main__':
+    main()
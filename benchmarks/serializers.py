@@ -0,0 +1,40 @@
+'''
+WorkoutListSerializer vs the workout_list_representation fast path.
+
+Serializes the same in-memory workouts with WorkoutListSerializer(many=True) and with
+workout_list_representation over the values_list rows the list, detail and export views fetch,
+and prints rows/sec (their outputs are checked to be identical by activity/tests.py).
+No database is needed.
+
+Usage:
+    python -m benchmarks.serializers --rows 10000
+'''
+import argparse
+from datetime import timedelta
+from benchmarks.common import setup_django, measure, report
+
+setup_django()
+
+from django.utils import timezone # noqa: E402 (needs the apps loaded above)
+from activity.models import Workout # noqa: E402
+from activity.serializers import WorkoutListSerializer, WORKOUT_LIST_FIELDS, workout_list_representation # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description="WorkoutListSerializer vs the fast path")
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    now = timezone.now()
+    workouts = [Workout(
+        id=index, activity_type='Running', duration=timedelta(minutes=30 + index % 60),
+        distance=5000.0 + index, calories_burned=None if index % 10 == 0 else 350.5 + index,
+        date=now - timedelta(hours=index)) for index in range(args.rows)]
+    rows = [tuple(getattr(workout, field) for field in WORKOUT_LIST_FIELDS) for workout in workouts]
+
+    print(f"{args.rows} workouts")
+    report('WorkoutListSerializer(many=True)', measure(lambda: WorkoutListSerializer(workouts, many=True).data, args.repeat), args.rows)
+    report('workout_list_representation', measure(lambda: workout_list_representation(rows), args.repeat), args.rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+'''
+near / bbox workout filters with and without the GiST indexes.
+
+Seeds --workouts workouts for --users users, starting at random points of a --span degree wide
+area with a short route each, then times the near (start point within a radius) and bbox
+(route crossing a box) filters of the workout list, over all workouts and for one user. The
+GiST indexes on start_point and route are then dropped and the same filters timed again.
+Needs PostgreSQL with PostGIS.
+
+Usage:
+    python -m benchmarks.spatial --workouts 200000 --radius 2000
+'''
+import argparse
+import random
+from datetime import timedelta
+from benchmarks.common import setup_django, benchmark_database, measure, report
+
+setup_django()
+
+from django.contrib.auth import get_user_model # noqa: E402 (needs the apps loaded above)
+from django.contrib.gis.geos import LineString, Point # noqa: E402
+from django.db import connection # noqa: E402
+from django.utils import timezone # noqa: E402
+from activity.filters import WorkoutFilter # noqa: E402
+from activity.models import Workout # noqa: E402
+
+CENTER = (13.4, 52.5) #lon, lat
+
+def seed(users, count, span):
+    now = timezone.now()
+    random.seed(0)
+    workouts = []
+    for index in range(count):
+        lon = CENTER[0] + random.uniform(-span / 2, span / 2)
+        lat = CENTER[1] + random.uniform(-span / 2, span / 2)
+        route = [(lon + step * 0.0005, lat + step * 0.0003) for step in range(10)]
+        start = now - timedelta(hours=index)
+        workouts.append(Workout(
+            user_id=users[index % len(users)], activity_type='Running', date=start, start_time=start,
+            end_time=start + timedelta(minutes=30), duration=timedelta(minutes=30), distance=500.0,
+            calories_burned=50.0, start_point=Point(lon, lat, srid=4326), route=LineString(route, srid=4326)))
+    Workout.objects.bulk_create(workouts, batch_size=5000)
+
+def drop_spatial_indexes():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = 'activity_workout' "
+            "AND indexdef LIKE '%%USING gist%%'")
+        names = [name for name, in cursor.fetchall()]
+        for name in names:
+            cursor.execute(f'DROP INDEX "{name}"') #with its copies on the partitions
+        cursor.execute('ANALYZE activity_workout')
+    return names
+
+def main():
+    parser = argparse.ArgumentParser(description="near / bbox filters with and without the GiST indexes")
+    parser.add_argument('--workouts', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--span', type=float, default=1.0, help="Width of the seeded area in degrees")
+    parser.add_argument('--radius', type=int, default=1000, help="near radius in meters")
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(username=f'spatial-user-{index}', password='!') for index in range(args.users))
+        seed(users, args.workouts, args.span)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE activity_workout')
+
+        lon, lat = CENTER
+        box = 0.01
+        filters = [
+            (f'near {args.radius} m', {'near': f'{lat},{lon}', 'radius': args.radius}),
+            (f'bbox {box} deg', {'bbox': f'{lon},{lat},{lon + box},{lat + box}'}),
+        ]
+        scopes = [('all workouts', Workout.objects.all()), ('one user', Workout.objects.filter(user_id=users[0]))]
+
+        print(f"{args.workouts} workouts in a {args.span} degree area")
+        for indexes in ('with GiST indexes', 'without GiST indexes'):
+            if indexes.startswith('without'):
+                print(f"dropped {', '.join(drop_spatial_indexes())}")
+            for label, params in filters:
+                for scope, queryset in scopes:
+                    filterset = WorkoutFilter(params, queryset=queryset)
+                    assert filterset.is_valid(), filterset.errors
+                    rows = filterset.qs.values_list('id', flat=True)
+                    matches = len(list(rows))
+                    report(f'{indexes}, {label}, {scope}: {matches} rows', measure(lambda: list(rows.all()), args.repeat))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+'''
+GPS track ingest and analytics.
+
+Uploads a synthetic --points point track to a workout through POST workouts/<pk>/track/, once in
+a single request and once in --batch-size batches (each merged into the stored track), then
+times the analytics GET. Prints points/sec, queries, and the stored size per point.
+
+Usage:
+    python -m benchmarks.tracks --points 10000 --batch-size 1000
+'''
+import argparse
+import math
+from datetime import timedelta
+from benchmarks.common import setup_django, benchmark_database, create_user, api_client, count_queries, measure, report
+
+setup_django()
+
+from django.urls import reverse # noqa: E402 (needs the apps loaded above)
+from django.utils import timezone # noqa: E402
+from activity.models import Workout # noqa: E402
+
+def synthetic_track(count, start):
+    '''
+    A ride around a 5 km loop sampled every second, with a rolling elevation profile.
+    '''
+    points = []
+    for index in range(count):
+        angle = 2 * math.pi * index / 1200
+        points.append({
+            'lat': 52.52 + 0.0072 * math.sin(angle),
+            'lon': 13.405 + 0.0118 * math.cos(angle),
+            'time': start + index,
+            'ele': 35.0 + 12 * math.sin(angle * 3),
+        })
+    return points
+
+def main():
+    parser = argparse.ArgumentParser(description="GPS track ingest and analytics")
+    parser.add_argument('--points', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with benchmark_database():
+        user = create_user('track-benchmark')
+        client = api_client(user)
+        start = timezone.now() - timedelta(days=1)
+        points = synthetic_track(args.points, start.timestamp())
+        print(f"{args.points} points")
+
+        for label, batch_size in (('single request', args.points), (f'batches of {args.batch_size}', args.batch_size)):
+            workout = Workout.objects.create(user_id=user, activity_type='Cycling', start_time=start,
+                                             end_time=start + timedelta(seconds=args.points), date=start)
+            url = reverse('workout-track', args=[workout.pk])
+
+            def upload():
+                for offset in range(0, args.points, batch_size):
+                    response = client.post(url, {'points': points[offset:offset + batch_size]}, format='json')
+                    assert response.status_code == 200, response.content
+
+            with count_queries() as queries:
+                durations = measure(upload, repeat=1)
+            report(f'upload, {label}', durations, args.points, 'points', len(queries))
+
+        workout.refresh_from_db()
+        stored = (len(workout.route.wkb) + len(workout.route_times) + len(workout.route_elevations)
+                  + len(workout.route_medium.wkb) + len(workout.route_low.wkb))
+        print(f"stored {stored / 1024:.0f} KiB, {stored / args.points:.1f} bytes per point "
+              f"(medium {workout.route_medium.num_points} points, low {workout.route_low.num_points} points)")
+        report('analytics GET', measure(lambda: client.get(url), args.repeat), args.points, 'points')
+
+if __name__ == '__main__':
+    main()
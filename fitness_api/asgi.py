@@ -2,6 +2,8 @@
 ASGI config for fit project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests go to Django; WebSocket connections go to the live workout sessions
+(activity/live.py), which need an ASGI server with WebSocket support (e.g. uvicorn or daphne).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -13,4 +15,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fitness_api.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from activity.live import live_session_application # noqa: E402 (needs the apps loaded above)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        return await live_session_application(scope, receive, send)
+    return await django_application(scope, receive, send)
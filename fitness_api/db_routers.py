@@ -0,0 +1,64 @@
+import random
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+# database alias reads go to while a replica-enabled view handles a request (None: primary)
+_read_database = ContextVar('read_database', default=None)
+
+def _pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+def pin_to_primary(user_id):
+    '''
+    Sends the user's reads to the primary for REPLICA_STICKY_SECONDS after one of their writes,
+    so they read their own writes while the replicas catch up.
+    '''
+    if settings.DATABASE_REPLICAS and user_id is not None:
+        cache.set(_pin_key(user_id), True, timeout=settings.REPLICA_STICKY_SECONDS)
+
+def is_pinned_to_primary(user_id):
+    return bool(cache.get(_pin_key(user_id)))
+
+class ReplicaRouter:
+    '''
+    Routes reads of views using ReplicaReadMixin to a random read replica (DATABASE_REPLICAS),
+    everything else (all writes, and reads outside those views) to the primary ('default').
+    '''
+    def db_for_read(self, model, **hints):
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True # replicas hold the same data as the primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False # replicas are migrated through replication
+        return None
+
+class ReplicaReadMixin:
+    '''
+    Lets a DRF view's GET requests read from a replica. Requests of users who wrote recently
+    (see pin_to_primary) keep reading from the primary, and so do requests for which
+    allow_replica_read returns False.
+    '''
+    _replica_token = None
+
+    def allow_replica_read(self, request):
+        return True
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs) #authenticates against the primary
+        if (request.method in SAFE_METHODS and settings.DATABASE_REPLICAS and self.allow_replica_read(request)
+                and not is_pinned_to_primary(request.user.pk)):
+            self._replica_token = _read_database.set(random.choice(settings.DATABASE_REPLICAS))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._replica_token is not None:
+            _read_database.reset(self._replica_token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
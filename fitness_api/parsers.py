@@ -0,0 +1,22 @@
+import io
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from .renderers import orjson
+
+class FastJSONParser(JSONParser):
+    '''
+    Drop-in replacement for DRF's JSONParser that decodes UTF-8 bodies with orjson when it is
+    installed. Bodies orjson rejects are re-parsed by JSONParser, so accepted input and error
+    messages stay the same.
+    '''
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,56 @@
+import math
+import re
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError: #optional, falls back to DRF's stdlib json encoder
+    orjson = None
+
+# floats json writes in exponent notation (below 1e-4 or from 1e16) come out differently from
+# orjson (0.0000875 vs 8.75e-05, 1e16 vs 1e+16)
+EXPONENT_FLOAT = re.compile(rb'\d[eE][-+]?\d|(?<![\d.])0\.0000')
+
+def has_non_finite_float(data):
+    '''
+    Checks the lists and dicts of a payload for NaN or infinite floats.
+    '''
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+class FastJSONRenderer(JSONRenderer):
+    '''
+    Drop-in replacement for DRF's JSONRenderer that encodes with orjson when it is installed.
+
+    The output is identical to JSONRenderer (compact separators, unescaped unicode, escaped
+    U+2028/U+2029): datetimes, dates, times, timedeltas and anything else orjson does not handle
+    the same way are passed to DRF's own encoder. Payloads orjson cannot reproduce exactly
+    (indented output, huge ints, very small or large floats) are rendered by JSONRenderer.
+    NaN and infinite floats, which orjson writes as null, are left to JSONRenderer too, which
+    rejects them (strict JSON); they are only looked for when the output contains a null.
+    '''
+    options = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if EXPONENT_FLOAT.search(ret) or (b'null' in ret and has_non_finite_float(data)):
+            return super().render(data, accepted_media_type, renderer_context)
+        # same escaping as JSONRenderer for javascript compatibility
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
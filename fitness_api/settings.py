@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv
 import dj_database_url
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -62,7 +63,7 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'],
@@ -70,6 +71,17 @@ REST_FRAMEWORK = {
         'rest_framework.pagination.PageNumberPagination'
     ),
     'PAGE_SIZE': 10,
+    # orjson-backed JSON renderer/parser with the same output as DRF's (see fitness_api/renderers.py),
+    # use 'rest_framework.renderers.JSONRenderer' / 'rest_framework.parsers.JSONParser' to switch back
+    'DEFAULT_RENDERER_CLASSES': [
+        'fitness_api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'fitness_api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 
@@ -80,6 +92,15 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
 }
 
+# per-process cache of users resolved from JWTs (see accounts/authentication.py). Changes reach the
+# other processes through version stamps in the 'default' cache when it is shared (CACHE_BACKEND);
+# with the per-process default, TTL is how long they may keep authenticating a changed (e.g.
+# deactivated) user.
+JWT_USER_CACHE = {
+    'MAX_SIZE': int(os.getenv('JWT_USER_CACHE_MAX_SIZE', 1024)),
+    'TTL': int(os.getenv('JWT_USER_CACHE_TTL', 30)), #seconds
+}
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -126,10 +147,58 @@ WSGI_APPLICATION = 'fitness_api.wsgi.application'
 #     }
 # }
 
+# Connections are closed after each request by default, as Django requires under ASGI (the app is
+# served by uvicorn, where async views and live sessions run their queries in changing threads, so
+# persistent connections would pile up instead of being reused). Reuse them with the pool below;
+# WSGI-only deployments may instead opt in to persistent connections with DATABASE_CONN_MAX_AGE
+# (seconds), checked before reuse when DATABASE_CONN_HEALTH_CHECKS is on.
 DATABASES = {
-    'default': dj_database_url.parse(os.getenv('DATABASE_URL'))
+    'default': dj_database_url.parse(
+        os.getenv('DATABASE_URL'),
+        conn_max_age=int(os.getenv('DATABASE_CONN_MAX_AGE', 0)),
+        conn_health_checks=os.getenv('DATABASE_CONN_HEALTH_CHECKS', 'True') == 'True',
+    )
 }
 
+# Native connection pool (Django 5.1 with psycopg 3): the way to reuse connections under ASGI,
+# also applied to the replicas below. Replaces persistent connections when enabled.
+DATABASE_POOL_OPTIONS = None
+if os.getenv('DATABASE_POOL', 'False') == 'True':
+    DATABASE_POOL_OPTIONS = {
+        'min_size': int(os.getenv('DATABASE_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.getenv('DATABASE_POOL_MAX_SIZE', 10)),
+        'timeout': int(os.getenv('DATABASE_POOL_TIMEOUT', 10)), #seconds to wait for a free connection
+    }
+    DATABASES['default']['CONN_MAX_AGE'] = 0 # required by the pool
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = dict(DATABASE_POOL_OPTIONS)
+
+# Read replicas: DATABASE_REPLICA_URLS is a comma separated list of database URLs. GET requests of
+# the workout track and profile views read from a random replica, except for users who wrote in the
+# last REPLICA_STICKY_SECONDS (see fitness_api/db_routers.py). So do the workout list/detail/metrics
+# views unless METRICS_CACHE_ENABLED is on: their cached and ETagged responses are then read from
+# the primary, whatever the replica lag.
+DATABASE_REPLICAS = []
+for index, url in enumerate(url for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()):
+    alias = f'replica_{index}'
+    DATABASES[alias] = dj_database_url.parse(
+        url.strip(),
+        conn_max_age=DATABASES['default']['CONN_MAX_AGE'],
+        conn_health_checks=DATABASES['default']['CONN_HEALTH_CHECKS'],
+        test_options={'MIRROR': 'default'},
+    )
+    if DATABASE_POOL_OPTIONS is not None:
+        DATABASES[alias].setdefault('OPTIONS', {})['pool'] = dict(DATABASE_POOL_OPTIONS)
+    DATABASE_REPLICAS.append(alias)
+
+# `manage.py test` gets a replica alias mirroring the primary (TEST MIRROR: a second connection to
+# the test database, which only sees committed rows), so tests can exercise the routing without a
+# replica server by listing it in DATABASE_REPLICAS.
+if sys.argv[1:2] == ['test']:
+    DATABASES['replica_test'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['fitness_api.db_routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -149,6 +218,26 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# PASSWORD_HASHER_PROFILE=fast puts a cheap hasher first for tests and load benchmarks (registration
+# and login cost dominated by hashing). Never use it in production: passwords checked under it are
+# re-hashed with the cheap hasher.
+PASSWORD_HASHER_PROFILES = {
+    'strong': [
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+        'django.contrib.auth.hashers.Argon2PasswordHasher',
+        'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+        'django.contrib.auth.hashers.ScryptPasswordHasher',
+    ],
+    'fast': [
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    ],
+}
+PASSWORD_HASHERS = PASSWORD_HASHER_PROFILES[os.getenv('PASSWORD_HASHER_PROFILE', 'strong')]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -185,3 +274,42 @@ SWAGGER_SETTINGS = {
     },
     'USE_SESSION_AUTH': False,
 }
+
+# Caches
+# The 'default' cache holds the read replica stickiness markers; like the 'metrics' cache it should
+# point at a shared backend in production (CACHE_BACKEND/CACHE_LOCATION).
+# The 'metrics' cache holds per-user workout metrics and their version counters. It defaults to
+# local memory (per process); set METRICS_CACHE_BACKEND/METRICS_CACHE_LOCATION to a shared backend
+# in production, e.g. django.core.cache.backends.redis.RedisCache and redis://host:6379/1.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    'metrics': {
+        'BACKEND': os.getenv('METRICS_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('METRICS_CACHE_LOCATION', 'workout-metrics'),
+    },
+}
+METRICS_CACHE_TIMEOUT = int(os.getenv('METRICS_CACHE_TIMEOUT', 300)) #seconds
+
+# Cached metrics and the ETag / Last-Modified validators of conditional GETs depend on version
+# markers moved by every workout write, which every process must see. They are only enabled when
+# the 'metrics' cache is shared between processes: with a per-process backend a write handled by
+# one worker would leave the others serving stale metrics and 304s. METRICS_CACHE_ENABLED=True
+# forces them on (e.g. a single-process deployment), False turns them off.
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+METRICS_CACHE_ENABLED = os.getenv(
+    'METRICS_CACHE_ENABLED', str(CACHES['metrics']['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS)) == 'True'
+
+# Answer WorkoutMetricsView from the WorkoutDailyRollup table when the range covers whole days.
+# The rollups are backfilled by migration 0006 and can be rebuilt with `python manage.py rebuild_workout_rollups`.
+WORKOUT_METRICS_USE_ROLLUPS = os.getenv('WORKOUT_METRICS_USE_ROLLUPS', 'True') == 'True'
+
+# Live workout sessions (WebSocket, see activity/live.py) idle for this long are saved and closed.
+# The one-session-per-workout lock lives in the default cache, so it only holds across ASGI
+# workers with a shared CACHE_BACKEND.
+LIVE_SESSION_IDLE_TIMEOUT = int(os.getenv('LIVE_SESSION_IDLE_TIMEOUT', 300)) #seconds
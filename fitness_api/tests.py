@@ -0,0 +1,92 @@
+import io
+import uuid
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+
+class FastJSONRendererTests(SimpleTestCase):
+    '''
+    FastJSONRenderer renders exactly what JSONRenderer renders, and rejects what it rejects.
+    '''
+    def assertSameRendering(self, data, accepted_media_type=None, renderer_context=None):
+        expected = JSONRenderer().render(data, accepted_media_type, renderer_context)
+        self.assertEqual(FastJSONRenderer().render(data, accepted_media_type, renderer_context), expected)
+
+    def test_workout_page(self):
+        moment = datetime(2024, 5, 17, 6, 30, 15, 250000, tzinfo=dt_timezone.utc)
+        page = {'count': 2, 'next': 'https://example.com/workouts/?page=2', 'previous': None, 'results': [
+            {'id': 1, 'activity_type': 'Running', 'duration': '00:45:00', 'distance': 5000.0,
+             'calories_burned': 350.25, 'date': '2024-05-17T06:30:15.250000Z'},
+            {'id': 2, 'activity_type': 'Cycling', 'duration': None, 'distance': None,
+             'calories_burned': None, 'date': moment},
+        ]}
+        self.assertSameRendering(page)
+        self.assertSameRendering(ReturnDict(page, serializer=None))
+        self.assertSameRendering(ReturnList(page['results'], serializer=None))
+
+    def test_types_passed_to_the_drf_encoder(self):
+        self.assertSameRendering({
+            'datetime': datetime(2024, 5, 17, 6, 30, tzinfo=dt_timezone(timedelta(hours=2))),
+            'naive': datetime(2024, 5, 17, 6, 30),
+            'date': date(2024, 5, 17),
+            'time': time(6, 30, 15, 500),
+            'timedelta': timedelta(hours=1, microseconds=5),
+            'decimal': Decimal('12.50'),
+            'uuid': uuid.UUID(int=1),
+            'lazy': gettext_lazy("Running"),
+            'tuple': (1, 2),
+        })
+
+    def test_strings(self):
+        self.assertSameRendering({'text': 'K\u00f6ln \u2028 \u2029 "quoted" \\ \n tab\t \U0001f3c3', 'key \u00e9': '/'})
+
+    def test_numbers(self):
+        for value in (0, -1, 2 ** 63 - 1, 2 ** 70, 0.1, 1e-5, 0.0000875, 1e16, 123456789.123, -0.0, 1.5e300, True):
+            with self.subTest(value=value):
+                self.assertSameRendering({'value': value})
+
+    def test_non_string_keys(self):
+        self.assertSameRendering({1: 'one', 2.5: 'two and a half', True: 'yes'})
+
+    def test_indent(self):
+        self.assertSameRendering({'results': [1, 2]}, 'application/json; indent=4')
+        self.assertSameRendering({'results': [1, 2]}, None, {'indent': 2})
+
+    def test_none(self):
+        self.assertSameRendering(None)
+
+    def test_non_finite_floats_are_rejected(self):
+        for value in (float('nan'), float('inf'), float('-inf')):
+            with self.subTest(value=value):
+                data = {'next': None, 'results': [{'distance': value}]}
+                with self.assertRaises(ValueError):
+                    JSONRenderer().render(data)
+                with self.assertRaises(ValueError):
+                    FastJSONRenderer().render(data)
+
+class FastJSONParserTests(SimpleTestCase):
+    def parse(self, parser, body):
+        return parser.parse(io.BytesIO(body), 'application/json', {})
+
+    def test_same_data(self):
+        for body in (b'[{"activity_type": "Running", "distance": 5000.5, "time": 1715927415}]',
+                     b'{"text": "K\\u00f6ln \xf0\x9f\x8f\x83", "nested": {"list": [1, 2.5, null, true]}}',
+                     b'12345678901234567890123'):
+            with self.subTest(body=body):
+                self.assertEqual(self.parse(FastJSONParser(), body), self.parse(JSONParser(), body))
+
+    def test_same_errors(self):
+        for body in (b'{"activity_type": ', b'[NaN]', b'\xff'):
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError) as expected:
+                    self.parse(JSONParser(), body)
+                with self.assertRaises(ParseError) as fast:
+                    self.parse(FastJSONParser(), body)
+                self.assertEqual(str(fast.exception), str(expected.exception))